@@ -0,0 +1,73 @@
+import argparse
+import json
+
+
+threshold = 1.2  # во сколько раз может вырасти медиана замера, прежде чем это считается регрессией
+noise_ms = 2.0  # разница медиан меньше этой считается шумом
+
+
+def compare(baseline, results, threshold=threshold, noise_ms=noise_ms):
+    """
+    Сравнить два результата benchmarks.run по медианам замеров
+
+    :param baseline: словарь с результатами, с которыми сравнивается
+    :param results: словарь с новыми результатами
+    :param threshold: во сколько раз медиана может вырасти
+    :param noise_ms: разница медиан в миллисекундах, которая не считается ни регрессией, ни ускорением
+    :return: список кортежей (название замера, старая медиана, новая медиана, отношение, оценка), оценка - одно из
+        "регрессия", "ускорение", "" (без изменений), "новый" и "пропал"
+    """
+    old, new = baseline["results"], results["results"]
+    rows = []
+
+    for name in sorted(old.keys() | new.keys()):
+        if name not in old:
+            rows.append((name, None, new[name]["median_ms"], None, "новый"))
+            continue
+        if name not in new:
+            rows.append((name, old[name]["median_ms"], None, None, "пропал"))
+            continue
+
+        before, after = old[name]["median_ms"], new[name]["median_ms"]
+        ratio = after / before if before else float("inf")
+        status = ""
+        if abs(after - before) >= noise_ms:
+            if ratio > threshold:
+                status = "регрессия"
+            elif ratio < 1 / threshold:
+                status = "ускорение"
+        rows.append((name, before, after, ratio, status))
+
+    return rows
+
+
+def main(arguments=None):
+    """Сравнение из командной строки: python -m benchmarks.compare baseline.json results.json"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare",
+                                     description="Сравнение результатов замеров производительности")
+    parser.add_argument("baseline", help="JSON с прежними результатами")
+    parser.add_argument("results", help="JSON с новыми результатами")
+    parser.add_argument("--threshold", type=float, default=threshold,
+                        help=f"во сколько раз может вырасти медиана (по умолчанию {threshold})")
+    parser.add_argument("--noise", type=float, default=noise_ms, dest="noise_ms",
+                        help=f"разница в миллисекундах, которая не учитывается (по умолчанию {noise_ms})")
+    arguments = parser.parse_args(arguments)
+
+    with open(arguments.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(arguments.results, encoding="utf-8") as file:
+        results = json.load(file)
+
+    rows = compare(baseline, results, arguments.threshold, arguments.noise_ms)
+    print(f"{'замер':<48} {'было, мс':>10} {'стало, мс':>10} {'отношение':>10}")
+    for name, before, after, ratio, status in rows:
+        before, after, ratio = ("" if value is None else f"{value:.2f}" for value in (before, after, ratio))
+        print(f"{name:<48} {before:>10} {after:>10} {ratio:>10} {status}")
+
+    # Регрессии видны по коду возврата, поэтому сравнение можно запускать перед выпуском автоматически
+    if any(row[4] == "регрессия" for row in rows):
+        parser.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import date
+
+import numpy as np
+
+from core.database import AccountRepository, CurrencyRateRepository, TransactionRepository, connect, default_path, \
+    migrate
+
+
+chunk_size = 100000  # сколько транзакций генерируется и добавляется за один раз
+
+# Таблицы, которые очищаются в копии db.sqlite перед генерацией. Порядок - такой, чтобы не нарушались внешние ключи
+cleared_tables = ("'transaction'", "monthly_totals", "currency_rate", "account", "category", "currency",
+                  "sqlite_sequence")
+
+currencies = (("Российский рубль", "RUB"), ("Доллар США", "USD"), ("Евро", "EUR"), ("Иена", "JPY"))
+category_names = ("Развлечения", "Медикаменты", "Вещи быта", "Интернет и связь", "Транспорт", "Квартира", "Работа",
+                  "Еда")
+
+# Из этих слов собираются заметки, по ним же ищут сценарии поиска
+note_words = ("кофе", "такси", "продукты", "аптека", "кино", "зарплата", "подписка", "ресторан", "бензин", "связь",
+              "аренда", "подарок", "книги", "спорт", "ремонт", "кафе")
+note_places = ("у дома", "в центре", "онлайн", "на работе", "в отпуске", "по карте", "наличными", "с друзьями")
+
+INSERT_CURRENCY = "INSERT INTO currency(name, short_name) VALUES (?, ?)"
+INSERT_CATEGORY = "INSERT INTO category(name, color) VALUES (?, ?)"
+
+end = (date(2020, 12, 31) - date(1970, 1, 1)).days  # последний день истории, постоянный для воспроизводимости
+
+
+def parse_count(text):
+    """Количество транзакций из командной строки: 10000, 10k, 1M"""
+    multipliers = {"k": 10 ** 3, "m": 10 ** 6}
+    text = text.strip().lower()
+    try:
+        if text[-1:] in multipliers:
+            return int(float(text[:-1]) * multipliers[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается число, например 100k или 1M: {text}") from None
+
+
+def generate(path, transactions, accounts=20, categories=30, seed=1, years=5, progress=None):
+    """
+    Создать базу данных с синтетической историей транзакций. При одних и тех же параметрах (и одной версии numpy)
+    получается одна и та же база данных. Транзакции идут по дате, как если бы пользователь вёл учёт годами:
+    примерно каждая пятая - доход, у каждой десятой нет категории, у каждой пятидесятой - даты, у трети есть заметка.
+    Первые счета используются чаще остальных, часть счетов открыта в долларах и евро, а курсы этих валют к рублю
+    меняются раз в неделю. Суммы на счетах, итоги по месяцам и индекс заметок заполняются триггерами базы данных, как
+    при обычной работе программы
+
+    :param path: путь к файлу базы данных, существующий файл заменяется
+    :param transactions: количество транзакций
+    :param accounts: количество счетов
+    :param categories: количество категорий транзакций (не меньше стандартных)
+    :param seed: начальное значение генератора случайных чисел
+    :param years: за сколько лет история
+    :param progress: функция, которая получает количество уже добавленных транзакций
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    # База данных начинается с копии поставляемого db.sqlite и обновляется теми же миграциями, что и у пользователей,
+    # поэтому её схема всегда совпадает со схемой программы. Данные из копии удаляются
+    source = sqlite3.connect(f"file:{default_path}?mode=ro", uri=True)
+    copy = sqlite3.connect(path)
+    try:
+        source.backup(copy)
+    finally:
+        copy.close()
+        source.close()
+
+    rng = np.random.default_rng(seed)
+    db = connect(path)
+    try:
+        migrate(db)
+        db.execute("PRAGMA synchronous = OFF")  # базу данных всегда можно сгенерировать заново
+
+        with db:
+            for table in cleared_tables:
+                db.execute(f"DELETE FROM {table}")
+
+            db.executemany(INSERT_CURRENCY, currencies)
+
+            names = [*category_names, *(f"Категория {number}" for number in range(len(category_names) + 1,
+                                                                                    categories + 1))]
+            db.executemany(INSERT_CATEGORY, ((name, f"{color:06x}") for name, color in
+                                             zip(names, rng.integers(0, 1 << 24, len(names)).tolist())))
+
+            # Каждый четвёртый счёт, кроме первого, открыт в долларах или евро
+            account_currencies = ["RUB" if number % 4 else ("USD", "EUR")[number // 4 % 2]
+                                  for number in range(accounts)]
+            account_currencies[0] = "RUB"
+            db.executemany(AccountRepository.INSERT,
+                           ((f"Счёт {number + 1}", f"{color:06x}", currency, 0, 0) for number, (currency, color) in
+                            enumerate(zip(account_currencies, rng.integers(0, 1 << 24, accounts).tolist()))))
+
+            start = end - 365 * years
+            weeks = np.arange(start, end + 1, 7)
+            CurrencyRateRepository(db).add_many(
+                (day, currency, "RUB", round(rate, 4)) for currency, opening in (("USD", 65.0), ("EUR", 75.0))
+                for day, rate in zip(weeks.tolist(),
+                                     (opening * np.exp(np.cumsum(rng.normal(0, 0.01, len(weeks))))).tolist()))
+
+        account_ids = np.array([row[0] for row in db.execute("SELECT id FROM account ORDER BY id")])
+        category_ids = np.array([row[0] for row in db.execute("SELECT id FROM category ORDER BY id")])
+        # Вероятность счёта убывает с его номером: первые счета - основные
+        weights = 1 / np.arange(1, accounts + 1)
+        weights /= weights.sum()
+        notes = np.array([f"{word} {place}" for word in note_words for place in note_places], dtype=object)
+
+        for offset in range(0, transactions, chunk_size):
+            size = min(chunk_size, transactions - offset)
+
+            income = rng.random(size) < 0.2
+            money = np.where(income, rng.lognormal(10.5, 0.8, size), -rng.lognormal(7.5, 1.3, size))
+            money = np.clip(np.rint(money), -10 ** 9, 10 ** 9).astype(np.int64)
+            money[money == 0] = -1
+            days = start + (np.arange(offset, offset + size) * (end - start)) // max(transactions - 1, 1)
+
+            rows = zip(account_ids[rng.choice(accounts, size, p=weights)].tolist(),
+                       np.where(rng.random(size) < 0.1, None, category_ids[rng.integers(0, len(category_ids), size)])
+                       .tolist(),
+                       money.tolist(),
+                       np.where(rng.random(size) < 0.02, None, days).tolist(),
+                       np.where(rng.random(size) < 1 / 3, notes[rng.integers(0, len(notes), size)], None).tolist())
+
+            with db:
+                db.executemany(TransactionRepository.INSERT, rows)
+
+            if progress is not None:
+                progress(offset + size)
+
+        # Программа не делает ANALYZE, поэтому и здесь статистики для планировщика запросов нет
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        db.close()
+
+
+def main(arguments=None):
+    """Генерация из командной строки: python -m benchmarks.generate ledger.sqlite --transactions 1M"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate",
+                                     description="Синтетическая база данных для замеров производительности")
+    parser.add_argument("path", help="файл базы данных (существующий файл будет заменён)")
+    parser.add_argument("--transactions", type=parse_count, default=parse_count("100k"),
+                        help="количество транзакций: 10k, 100k, 1M, 10M (по умолчанию 100k)")
+    parser.add_argument("--accounts", type=int, default=20, help="количество счетов")
+    parser.add_argument("--categories", type=int, default=30, help="количество категорий")
+    parser.add_argument("--seed", type=int, default=1, help="начальное значение генератора случайных чисел")
+    arguments = parser.parse_args(arguments)
+
+    generate(arguments.path, arguments.transactions, arguments.accounts, arguments.categories, arguments.seed,
+             progress=lambda count: print(f"\rДобавлено транзакций: {count}", end="", file=sys.stderr))
+    print(file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
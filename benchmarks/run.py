@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+
+
+default_sizes = ("10k", "100k")
+default_repeat = 5
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Скрипт холодного запуска в отдельном процессе: время считается от импорта PyQt5 и программы до готового окна
+cold_startup_script = """
+import json, sys
+from time import perf_counter
+from benchmarks.run import wait
+start = perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+import main
+window = main.Main(sys.argv[1])
+window.show()
+app.processEvents()
+shown = perf_counter()
+wait(app, window)
+print(json.dumps({"window": shown - start, "ready": perf_counter() - start}))
+window.close()
+"""
+
+
+def label(count):
+    """Короткое название размера базы данных: 10k, 1M"""
+    for suffix, multiplier in (("M", 10 ** 6), ("k", 10 ** 3)):
+        if count >= multiplier and count % multiplier == 0:
+            return f"{count // multiplier}{suffix}"
+
+    return str(count)
+
+
+def wait(app, window, timeout=600):
+    """
+    Обработать события, пока не выполнятся все запросы к базе данных, которые поставила программа, в том числе
+    запросы, поставленные из функций обратного вызова. После этого обрабатываются отложенные события: перерисовка,
+    перестроение layout
+
+    :param app: QApplication
+    :param window: main.Main
+    :param timeout: сколько секунд ждать
+    """
+    from PyQt5.QtCore import QEventLoop
+
+    deadline = perf_counter() + timeout
+    app.processEvents()
+    while window.executor.requests:
+        if perf_counter() > deadline:
+            raise TimeoutError("Запросы к базе данных не выполнились")
+        app.processEvents(QEventLoop.AllEvents | QEventLoop.WaitForMoreEvents)
+    app.processEvents()
+
+
+@contextmanager
+def accepted(dialog, setup):
+    """
+    Вместо показа диалог сразу принимается с данными, которые ставит setup, как если бы их ввёл пользователь
+
+    :param dialog: класс диалога
+    :param setup: функция, которая получает диалог
+    """
+    def exec_(self):
+        setup(self)
+        return True
+
+    original = dialog.exec_
+    dialog.exec_ = exec_
+    try:
+        yield
+    finally:
+        dialog.exec_ = original
+
+
+class Benchmark:
+    def __init__(self, app, path, repeat):
+        """
+        Сценарии работы с программой на одной базе данных. Каждый сценарий - это действие пользователя, время которого
+        считается до тех пор, пока программа не выполнит все запросы и не обновит окно
+
+        :param app: QApplication
+        :param path: путь к базе данных, которую сценарии изменяют
+        :param repeat: сколько раз повторяется каждый сценарий
+        """
+        self.app = app
+        self.path = path
+        self.repeat = repeat
+        self.window = None
+        self.results = {}  # название замера -> список времени в секундах
+
+    @property
+    def page(self):
+        return self.window.centralWidget()
+
+    def wait(self):
+        wait(self.app, self.window)
+
+    def measure(self, name, action, prepare=None):
+        """
+        Замерить действие repeat раз
+
+        :param name: название замера
+        :param action: функция, которая получает номер повтора и выполняет действие
+        :param prepare: функция, которая получает номер повтора и готовит действие, не попадая в замер
+        """
+        for number in range(self.repeat):
+            if prepare is not None:
+                prepare(number)
+                self.wait()
+
+            start = perf_counter()
+            action(number)
+            self.wait()
+            self.results.setdefault(name, []).append(perf_counter() - start)
+
+    def open(self):
+        """Открыть программу на базе данных и дождаться, пока она загрузится"""
+        from main import Main
+
+        self.window = Main(self.path)
+        self.window.show()
+        self.wait()
+
+    def close(self):
+        self.window.close()
+        self.window.deleteLater()
+        self.app.processEvents()
+        self.window = None
+
+    def cold_startup(self):
+        """Запуск программы в новом процессе вместе с импортом модулей"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for _ in range(self.repeat):
+            output = subprocess.run([sys.executable, "-c", cold_startup_script, self.path], cwd=root, check=True,
+                                    capture_output=True, text=True, timeout=600).stdout
+            timings = json.loads(output.strip().splitlines()[-1])
+            for name in ("window", "ready"):
+                self.results.setdefault(f"cold_startup.{name}", []).append(timings[name])
+
+    def startup(self):
+        """Main.__init__ в уже запущенном процессе: до показа окна и до загрузки истории, сводки и курсов"""
+        from main import Main
+
+        for _ in range(self.repeat):
+            start = perf_counter()
+            self.window = Main(self.path)
+            self.window.show()
+            self.app.processEvents()
+            shown = perf_counter()
+            self.wait()
+            self.results.setdefault("startup.window", []).append(shown - start)
+            self.results.setdefault("startup.ready", []).append(perf_counter() - start)
+            self.close()
+
+    def account_switch(self):
+        """Смена счёта в выпадающем списке (MainPage.account_changed) и переход ко всем счетам"""
+        # Первый пункт списка - все счета, второй - счёт, который выбран сейчас
+        combobox = self.page.accounts_combobox
+        self.measure("account_switch", lambda number: combobox.setCurrentIndex(2 + number % (combobox.count() - 2)))
+        self.measure("all_accounts_switch", lambda number: combobox.setCurrentIndex(0),
+                     prepare=lambda number: combobox.setCurrentIndex(1))
+        combobox.setCurrentIndex(1)
+        self.wait()
+
+    def transactions(self):
+        """Добавление, изменение и удаление транзакции на самом большом счёте"""
+        from core.dialogs import AddTransactionDialog, EditTransactionDialog
+
+        page = self.page
+
+        def add(dialog):
+            dialog.money_spinbox.setValue(-12.34)
+            dialog.note_line_edit.setText("кофе замер")
+
+        with accepted(AddTransactionDialog, add):
+            self.measure("add_transaction", lambda number: page.add_transaction())
+
+        def edit(number):
+            transaction, category = page.outcome_history.model().transactions[0]
+            page.edit_transaction(transaction.id, transaction.account_id, category.id, transaction.money,
+                                  transaction.date, transaction.note)
+
+        with accepted(EditTransactionDialog, lambda dialog: dialog.money_spinbox.setValue(
+                dialog.money_spinbox.value() - 1)):
+            self.measure("edit_transaction", edit)
+
+        with accepted(EditTransactionDialog, lambda dialog: setattr(dialog, "deleted", True)):
+            self.measure("delete_transaction", edit)
+
+    def search(self):
+        """Поиск по заметкам, по сумме и по датам на текущем счёте и по всем счетам"""
+        from core.database import Money, TransactionFilter
+        from benchmarks.generate import end
+
+        page = self.page
+        searches = {
+            "search_note": TransactionFilter(text="кофе"),
+            "search_money": TransactionFilter(money_from=Money(100000), money_to=Money(200000)),
+            "search_dates": TransactionFilter(start=end - 30, end=end),
+        }
+
+        for all_accounts in (False, True):
+            page.accounts_combobox.setCurrentIndex(0 if all_accounts else 1)
+            self.wait()
+
+            for name, search in searches.items():
+                self.measure(f"{name}.all_accounts" if all_accounts else name,
+                             lambda number: page.search_changed(search),
+                             prepare=lambda number: page.search_changed(TransactionFilter()))
+
+        page.search_changed(TransactionFilter())
+        page.accounts_combobox.setCurrentIndex(1)
+        self.wait()
+
+    def reports(self):
+        """
+        Сводка по периодам и разбивка периода по категориям для одного счёта и для всех счетов. Сводка в программе
+        считается от сегодняшнего дня, а история синтетической базы данных заканчивается постоянной датой, поэтому
+        периоды берутся от конца истории
+        """
+        from core.database import SummaryRepository, period_bounds, period_shift
+        from benchmarks.generate import end
+
+        page = self.page
+        panel = page.summary_panel
+        shown_period = panel.period
+
+        for all_accounts in (False, True):
+            page.accounts_combobox.setCurrentIndex(0 if all_accounts else 1)
+            self.wait()
+            account = page.account
+            suffix = ".all_accounts" if all_accounts else ""
+
+            for period in ("day", "month", "year"):
+                start = period_bounds(period, period_shift(period, end, 1 - page.summary_length))[0]
+
+                def periods(number):
+                    rates = page.summary_rates()
+                    panel.period = period
+                    page.executor.submit(lambda db: SummaryRepository(db).periods(account.id, period, start, rates),
+                                         lambda rows: panel.set_periods(account.currency, start, rows))
+
+                def categories(number):
+                    # Как если бы пользователь выбрал в сводке последний период истории
+                    panel.period = period
+                    page.summary_period_selected(period_bounds(period, end)[0])
+
+                self.measure(f"summary_{period}{suffix}", periods)
+                self.measure(f"summary_categories_{period}{suffix}", categories)
+
+        panel.period = shown_period
+        page.accounts_combobox.setCurrentIndex(1)
+        self.wait()
+
+    def analytics(self):
+        """
+        Отчёты по всей истории через analytics.TransactionFrame: загрузка истории, разбивка по категориям и месяцам,
+        остаток счёта по дням и общая сумма на всех счетах по дням. Запросы идут в потоке базы данных, как в программе
+        """
+        from core.analytics import TransactionFrame
+
+        page = self.page
+        account = page.account
+        frames = {}
+
+        def load(number):
+            page.executor.submit(TransactionFrame.load, lambda frame: frames.update(all=frame))
+
+        def load_account(number):
+            page.executor.submit(lambda db: TransactionFrame.load(db, account.id),
+                                 lambda frame: frames.update(account=frame))
+
+        def report(name, function):
+            self.measure(f"analytics_{name}", lambda number: page.executor.submit(lambda db: function()))
+
+        self.measure("analytics_load", load)
+        self.measure("analytics_load_account", load_account)
+        report("by_category", lambda: frames["all"].by_category())
+        report("by_month", lambda: frames["all"].by_month())
+        report("running_balance", lambda: frames["account"].running_balance(account.money - frames["account"].total()))
+        report("net_worth", lambda: frames["all"].net_worth(page.converter, page.accounts,
+                                                              page.all_accounts.currency))
+
+    def account_delete(self):
+        """Удаление счёта со всей его историей через список счетов. Удаляются счета со второго по номеру"""
+        from core.dialogs import EditAccountDialog, ListAccountsDialog
+
+        page = self.page
+        accounts = sorted((account for account in page.accounts if account is not page.account),
+                          key=lambda account: account.id)
+
+        def delete(number):
+            with accepted(ListAccountsDialog, lambda dialog: dialog.edit_account(accounts[number])):
+                page.accounts_list()
+
+        with accepted(EditAccountDialog, lambda dialog: setattr(dialog, "deleted", True)):
+            self.measure("account_delete", delete)
+
+    def run(self):
+        """Выполнить все сценарии. Удаление счетов идёт последним, так как уменьшает базу данных"""
+        self.cold_startup()
+        self.startup()
+
+        self.open()
+        try:
+            self.account_switch()
+            self.transactions()
+            self.search()
+            self.reports()
+            self.analytics()
+            self.account_delete()
+        finally:
+            self.close()
+
+        return self.results
+
+
+def summarize(runs):
+    """Статистика замера в миллисекундах"""
+    runs = [run * 1000 for run in runs]
+    return {"min_ms": min(runs), "median_ms": statistics.median(runs), "mean_ms": statistics.fmean(runs),
+            "max_ms": max(runs), "runs_ms": runs}
+
+
+def database(count, accounts, categories, seed, directory):
+    """
+    Путь к синтетической базе данных. Базы данных создаются один раз и дальше берутся из папки
+
+    :return: путь к файлу
+    """
+    from benchmarks.generate import generate
+
+    path = os.path.join(directory, f"ledger-{label(count)}-a{accounts}-c{categories}-s{seed}.sqlite")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        print(f"Создаётся база данных на {label(count)} транзакций...", file=sys.stderr)
+        generate(path + ".part", count, accounts, categories, seed)
+        os.replace(path + ".part", path)
+
+    return path
+
+
+def commit():
+    """Текущий коммит git или None"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(arguments=None):
+    """Замеры из командной строки: python -m benchmarks.run --size 100k --size 1M --output results.json"""
+    from benchmarks.generate import parse_count
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Замеры производительности")
+    parser.add_argument("--size", type=parse_count, action="append", dest="sizes", metavar="N",
+                        help="количество транзакций: 10k, 100k, 1M, 10M, можно указать несколько раз "
+                             f"(по умолчанию {', '.join(default_sizes)})")
+    parser.add_argument("--accounts", type=int, default=20, help="количество счетов")
+    parser.add_argument("--categories", type=int, default=30, help="количество категорий")
+    parser.add_argument("--seed", type=int, default=1, help="начальное значение генератора случайных чисел")
+    parser.add_argument("--repeat", type=int, default=default_repeat, help="сколько раз повторяется каждый сценарий")
+    parser.add_argument("--data", default=data_directory, help="папка для сгенерированных баз данных")
+    parser.add_argument("--output", help="файл JSON с результатами (по умолчанию - стандартный вывод)")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.repeat >= arguments.accounts:
+        parser.error("счетов должно быть больше, чем повторов: каждый повтор удаляет один счёт")
+
+    # Окна не показываются на экране, поэтому замеры можно запускать без дисплея
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QT_VERSION_STR
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    sizes = arguments.sizes or [parse_count(size) for size in default_sizes]
+    results = {}
+
+    for count in sizes:
+        source = database(count, arguments.accounts, arguments.categories, arguments.seed, arguments.data)
+
+        # Сценарии изменяют базу данных, поэтому каждый раз работают с копией
+        directory = tempfile.mkdtemp(prefix="benchmark-")
+        try:
+            path = os.path.join(directory, "db.sqlite")
+            shutil.copyfile(source, path)
+
+            print(f"Замеры на {label(count)} транзакций...", file=sys.stderr)
+            for name, runs in Benchmark(app, path, arguments.repeat).run().items():
+                results[f"{label(count)}/{name}"] = summarize(runs)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"), "commit": commit(),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "qt": QT_VERSION_STR,
+            "platform": platform.platform(), "repeat": arguments.repeat, "accounts": arguments.accounts,
+            "categories": arguments.categories, "seed": arguments.seed, "sizes": [label(count) for count in sizes],
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
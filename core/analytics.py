@@ -0,0 +1,186 @@
+from itertools import chain
+
+import numpy as np
+
+
+no_category = 0  # так в TransactionFrame.category_id обозначаются транзакции без категории
+no_date = np.iinfo(np.int64).min  # так в TransactionFrame.day обозначаются транзакции без даты
+
+
+dense_limit = 1 << 20  # если ключи укладываются в такой промежуток, то группировка идёт без сортировки
+exact_limit = 1 << 53  # до этого значения float64 хранит целые числа точно
+
+
+def group_sum(keys, *values):
+    """
+    Сумма значений по каждому ключу. Суммы получаются точными целыми числами
+
+    :param keys: numpy массив целочисленных ключей
+    :param values: numpy массивы целочисленных значений той же длины
+    :return: кортеж (отсортированные уникальные ключи, суммы первых значений, суммы вторых значений, ...)
+    """
+    if not len(keys):
+        return (keys[:0], *(value[:0] for value in values))
+
+    low, high = int(keys.min()), int(keys.max())
+    if high - low < dense_limit and all(int(np.abs(value).sum()) < exact_limit for value in values):
+        # Ключи плотные, поэтому суммы считаются за один проход без сортировки. Пока сумма модулей меньше 2 ** 53,
+        # float64 складывает целые числа без потери точности
+        index = keys - low
+        present = np.bincount(index, minlength=high - low + 1) > 0
+        sums = (np.bincount(index, weights=value, minlength=high - low + 1)[present].astype(np.int64)
+                for value in values)
+
+        return (np.flatnonzero(present) + low, *sums)
+
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+
+    return (keys[starts], *(np.add.reduceat(value[order], starts) for value in values))
+
+
+class TransactionFrame:
+    def __init__(self, account_id, category_id, money, day):
+        """
+        Транзакции в виде столбцов numpy массивов для аналитики по всей истории. Каждая транзакция - это одна позиция во
+        всех массивах. Суммы хранятся в копейках (минимальных единицах валюты), даты - количеством дней от 01.01.1970
+
+        :param account_id: numpy массив ID счетов
+        :param category_id: numpy массив ID категорий (no_category, если категории нет)
+        :param money: numpy массив сумм транзакций
+        :param day: numpy массив дат (no_date, если даты нет)
+        """
+        self.account_id = account_id
+        self.category_id = category_id
+        self.money = money
+        self.day = day
+
+    @classmethod
+    def load(cls, db, account_id=None):
+        """
+        Загрузить транзакции из базы данных одним запросом, минуя создание database.Transaction
+
+        :param db: подключение к базе данных
+        :param account_id: ID счёта, если нужны транзакции только одного счёта
+        :return: TransactionFrame
+        """
+        query = "SELECT account_id, IFNULL(category_id, ?), money, IFNULL(date, ?) FROM 'transaction'"
+        parameters = (no_category, int(no_date))
+        if account_id is not None:
+            query += " WHERE account_id = ?"
+            parameters += (account_id,)
+
+        data = np.fromiter(chain.from_iterable(db.execute(query, parameters)), dtype=np.int64).reshape(-1, 4)
+
+        return cls(*(np.ascontiguousarray(data[:, column]) for column in range(4)))
+
+    def __len__(self):
+        return len(self.money)
+
+    def filter(self, mask):
+        """
+        Оставить только транзакции, которые подходят под условие
+
+        :param mask: numpy массив bool, например frame.money > 0
+        :return: TransactionFrame
+        """
+        return TransactionFrame(self.account_id[mask], self.category_id[mask], self.money[mask], self.day[mask])
+
+    def for_account(self, account_id):
+        """Транзакции одного счёта"""
+        return self.filter(self.account_id == account_id)
+
+    def between(self, start, end):
+        """
+        Транзакции с датой в промежутке
+
+        :param start: первый день промежутка (количество дней от 01.01.1970)
+        :param end: последний день промежутка включительно
+        """
+        return self.filter((self.day >= start) & (self.day <= end))
+
+    def income(self):
+        """Сумма доходов"""
+        return int(self.money[self.money > 0].sum())
+
+    def outcome(self):
+        """Сумма расходов (отрицательное число)"""
+        return int(self.money[self.money < 0].sum())
+
+    def total(self):
+        """Итоговая сумма всех транзакций"""
+        return int(self.money.sum())
+
+    def split(self, keys):
+        """
+        Доходы и расходы по каждому ключу
+
+        :param keys: numpy массив ключей той же длины, что и транзакции
+        :return: кортеж (уникальные ключи, доходы, расходы) из numpy массивов. Итог по ключу - доходы плюс расходы
+        """
+        return group_sum(keys, np.where(self.money > 0, self.money, 0), np.where(self.money < 0, self.money, 0))
+
+    def by_category(self):
+        """
+        Доходы и расходы по категориям
+
+        :return: кортеж (ID категорий, доходы, расходы), см. TransactionFrame.split
+        """
+        return self.split(self.category_id)
+
+    def by_month(self):
+        """
+        Доходы и расходы по месяцам. Транзакции без даты не учитываются
+
+        :return: кортеж (месяцы в виде numpy.datetime64[M], доходы, расходы), см. TransactionFrame.split
+        """
+        # Сначала суммы считаются по дням, а в месяцы переводятся уже уникальные дни, которых намного меньше, чем
+        # транзакций
+        days, income, outcome = self.filter(self.day != no_date).split(self.day[self.day != no_date])
+        months, income, outcome = group_sum(days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64),
+                                            income, outcome)
+
+        return months.astype("datetime64[M]"), income, outcome
+
+    def net_worth(self, converter, accounts, to_currency):
+        """
+        Сумма на всех счетах в одной валюте после каждого дня, в который были транзакции. Остаток в каждой валюте
+        переводится по курсу этого дня. Транзакции без даты считаются сделанными до всех остальных
+
+        :param converter: currency.CurrencyConverter
+        :param accounts: итерируемый объект с database.Account с актуальными суммами на счетах
+        :param to_currency: код валюты, в которой считается сумма
+        :return: кортеж (дни, сумма на конец дня) из numpy массивов
+        """
+        dated = self.day != no_date
+        days = np.unique(self.day[dated])
+        total = np.zeros(len(days))
+
+        by_currency = {}
+        for account in accounts:
+            by_currency.setdefault(account.currency, []).append(account)
+
+        for currency, group in by_currency.items():
+            frame = self.filter(dated & np.isin(self.account_id, [account.id for account in group]))
+            change_days, changes = group_sum(frame.day, frame.money)
+
+            # Сумма до первой транзакции с датой - это сумма на счетах сейчас без всех транзакций с датой
+            opening = sum(int(account.money) for account in group) - int(changes.sum())
+            balances = opening + np.concatenate(([0], np.cumsum(changes)))
+            total += balances[np.searchsorted(change_days, days, side="right")] * converter.rates(currency, to_currency,
+                                                                                                   days)
+
+        return days, np.rint(total).astype(np.int64)
+
+    def running_balance(self, opening=0):
+        """
+        Сумма после каждого дня, в который были транзакции. Транзакции без даты не учитываются
+
+        :param opening: сумма до первой транзакции
+        :return: кортеж (дни, сумма на конец дня) из numpy массивов
+        """
+        dated = self.day != no_date
+        days, money = group_sum(self.day[dated], self.money[dated])
+
+        return days, opening + np.cumsum(money)
@@ -0,0 +1,214 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+import numpy as np
+
+from core.analytics import no_date
+from core.database import CurrencyRateRepository, CurrencyRepository, Money
+from core.importer import StatementError, chunks, csv_date_formats, open_text, parse_date
+
+
+latest = np.iinfo(np.int64).max  # день, на который берётся последний известный курс
+
+
+class RateError(LookupError):
+    def __init__(self, from_currency, to_currency):
+        """
+        Нет курса, по которому одну валюту можно перевести в другую
+
+        :param from_currency: код валюты, из которой переводится сумма
+        :param to_currency: код валюты, в которую переводится сумма
+        """
+        super(RateError, self).__init__(f"Нет курса {from_currency} → {to_currency}")
+
+        self.from_currency = from_currency
+        self.to_currency = to_currency
+
+
+def read_rates(file):
+    """
+    Прочитать курсы валют из CSV с колонками: дата, из какой валюты, в какую валюту, курс. Разделитель определяется по
+    началу файла, строка заголовка пропускается
+
+    :param file: открытый текстовый файл
+    :return: генератор кортежей (дата в днях от 01.01.1970, из какой валюты, в какую валюту, курс)
+    """
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t|")
+    except csv.Error:
+        dialect = csv.excel
+
+    for number, row in enumerate(csv.reader(file, dialect), 1):
+        if not any(row):
+            continue
+        if len(row) < 4:
+            raise StatementError(f"Строка {number}: нужны дата, две валюты и курс")
+
+        day, from_currency, to_currency, rate = (value.strip() for value in row[:4])
+        try:
+            rate = Decimal(rate.replace("\xa0", "").replace(" ", "").replace(",", "."))
+        except InvalidOperation:
+            if number == 1:
+                continue  # заголовок
+            raise StatementError(f"Строка {number}: не удалось прочитать курс: {rate}") from None
+
+        if rate <= 0:
+            raise StatementError(f"Строка {number}: курс должен быть больше нуля")
+
+        yield parse_date(day, csv_date_formats), from_currency.upper(), to_currency.upper(), float(rate)
+
+
+def load_rates(db, path):
+    """
+    Загрузить курсы валют из файла в базу данных. Курсы валют, которых нет в программе, пропускаются. Функция не делает
+    commit, её нужно вызывать внутри Repository.atomic
+
+    :param db: подключение к базе данных
+    :param path: путь к файлу CSV (см. read_rates)
+    :return: количество загруженных курсов
+    """
+    known = {currency.short_name for currency in CurrencyRepository(db).all()}
+    repository = CurrencyRateRepository(db)
+    added = 0
+
+    with open_text(path) as file:
+        rates = (rate for rate in read_rates(file) if rate[0] is not None and rate[1] in known and rate[2] in known)
+        for chunk in chunks(rates):
+            added += repository.add_many(chunk)
+
+    return added
+
+
+class CurrencyConverter:
+    def __init__(self, rates):
+        """
+        Перевод сумм между валютами по курсу на дату. История курса каждой пары хранится в памяти numpy массивами,
+        отсортированными по дате, поэтому курс на любую дату находится двоичным поиском, а много сумм переводятся одной
+        операцией. Если прямого курса пары нет, то берётся обратный курс или кросс-курс через третью валюту. До первого
+        известного курса действует первый курс, а для сумм без даты берётся последний
+
+        :param rates: итерируемый объект с кортежами (дата, из какой валюты, в какую валюту, курс)
+        """
+        histories = {}
+        for day, from_currency, to_currency, rate in rates:
+            histories.setdefault((from_currency, to_currency), []).append((day, rate))
+
+        self.pairs = {}  # (из какой валюты, в какую валюту) -> (numpy массив дат, numpy массив курсов)
+        for pair, history in histories.items():
+            history.sort()
+            self.pairs[pair] = (np.fromiter((day for day, _ in history), dtype=np.int64, count=len(history)),
+                                np.fromiter((rate for _, rate in history), dtype=np.float64, count=len(history)))
+
+        # Истории пар с обратными и кросс-курсами и курсы на отдельные даты считаются один раз
+        self.history = lru_cache(maxsize=1024)(self.find_history)
+        self.rate = lru_cache(maxsize=65536)(self.find_rate)
+
+    @classmethod
+    def load(cls, db):
+        """
+        Загрузить все курсы из базы данных
+
+        :param db: подключение к базе данных
+        :return: CurrencyConverter
+        """
+        return cls(CurrencyRateRepository(db).all())
+
+    @staticmethod
+    def at(history, days):
+        """Курсы из истории пары на каждую из дат"""
+        positions = np.searchsorted(history[0], days, side="right") - 1
+        return history[1][np.maximum(positions, 0)]
+
+    def direct(self, from_currency, to_currency):
+        """История прямого или обратного курса пары или None, если такого курса нет"""
+        if (from_currency, to_currency) in self.pairs:
+            return self.pairs[from_currency, to_currency]
+        if (to_currency, from_currency) in self.pairs:
+            days, rates = self.pairs[to_currency, from_currency]
+            return days, 1 / rates
+
+        return None
+
+    def find_history(self, from_currency, to_currency):
+        """
+        История курса пары валют
+
+        :param from_currency: код валюты, из которой переводится сумма
+        :param to_currency: код валюты, в которую переводится сумма
+        :return: кортеж (numpy массив дат, numpy массив курсов)
+        """
+        if from_currency == to_currency:
+            return np.zeros(1, dtype=np.int64), np.ones(1)
+
+        history = self.direct(from_currency, to_currency)
+        if history is not None:
+            return history
+
+        # Кросс-курс через валюту, у которой есть курсы с обеими валютами пары. Курс меняется в каждую дату, когда
+        # меняется любой из двух курсов
+        for pivot in sorted({currency for pair in self.pairs for currency in pair} - {from_currency, to_currency}):
+            first, second = self.direct(from_currency, pivot), self.direct(pivot, to_currency)
+            if first is not None and second is not None:
+                days = np.union1d(first[0], second[0])
+                return days, self.at(first, days) * self.at(second, days)
+
+        raise RateError(from_currency, to_currency)
+
+    def find_rate(self, from_currency, to_currency, day=None):
+        """
+        Курс пары валют на дату
+
+        :param from_currency: код валюты, из которой переводится сумма
+        :param to_currency: код валюты, в которую переводится сумма
+        :param day: дата (количество дней от 01.01.1970) или None для последнего известного курса
+        :return: float
+        """
+        return float(self.rates(from_currency, to_currency, np.array([latest if day is None else day]))[0])
+
+    def rates(self, from_currency, to_currency, days):
+        """
+        Курсы пары валют на каждую из дат
+
+        :param from_currency: код валюты, из которой переводится сумма
+        :param to_currency: код валюты, в которую переводится сумма
+        :param days: numpy массив дат. Для транзакций без даты (analytics.no_date) берётся последний известный курс
+        :return: numpy массив float64
+        """
+        return self.at(self.history(from_currency, to_currency), np.where(days == no_date, latest, days))
+
+    def convert(self, money, from_currency, to_currency, day=None):
+        """
+        Перевести сумму в другую валюту
+
+        :param money: Money
+        :param from_currency: код валюты суммы
+        :param to_currency: код валюты, в которую переводится сумма
+        :param day: дата курса (количество дней от 01.01.1970) или None для последнего известного курса
+        :return: Money
+        """
+        return Money(round(money * self.rate(from_currency, to_currency, day)))
+
+    def convert_many(self, money, days, from_currency, to_currency):
+        """
+        Перевести много сумм одной валюты в другую валюту по курсу на дату каждой суммы
+
+        :param money: numpy массив сумм в копейках
+        :param days: numpy массив дат той же длины
+        :param from_currency: код валюты сумм
+        :param to_currency: код валюты, в которую переводятся суммы
+        :return: numpy массив int64
+        """
+        return np.rint(money * self.rates(from_currency, to_currency, days)).astype(np.int64)
+
+    def total(self, totals, to_currency):
+        """
+        Сумма на всех счетах в одной валюте по последним известным курсам
+
+        :param totals: словарь код валюты -> сумма на счетах в этой валюте (см. database.AccountRepository.totals)
+        :param to_currency: код валюты, в которой считается сумма
+        :return: Money
+        """
+        return sum((self.convert(money, currency, to_currency) for currency, money in totals.items()), Money(0))
@@ -1,65 +1,1274 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+
 from PyQt5.QtCore import QDate
 from PyQt5.QtGui import QColor
 
 
+# Путь к базе данных по умолчанию - файл db.sqlite рядом с main.py, независимо от текущей рабочей папки
+default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db.sqlite")
+
+epoch = QDate(1970, 1, 1)  # дата, от которой отсчитываются дни в колонке transaction.date
+
+
 # Утилиты
-def hex_to_rgb(hex_color):
+def date_to_days(date):
+    """
+    Преобразует дату в количество дней от 01.01.1970, в таком виде дата хранится в базе данных
+
+    :param date: QDate или None
+    :return: целое число или None, если даты нет
+    """
+    return epoch.daysTo(date) if date else None
+
+
+def days_to_date(days):
+    """
+    Преобразует количество дней от 01.01.1970 в дату
+
+    :param days: целое число или None
+    :return: QDate или None, если даты нет
+    """
+    return epoch.addDays(days) if days is not None else None
+
+
+def connect(path=default_path, cache_size=16 * 1024, mmap_size=256 * 1024 * 1024):
+    """
+    Открывает подключение к базе данных с настройками программы:
+    - журнал WAL, поэтому чтение не блокируется записью, а фиксация изменений не ждёт полной записи журнала на диск;
+    - synchronous = NORMAL, с журналом WAL база данных остаётся целой даже при сбое;
+    - проверка внешних ключей.
+
+    :param path: путь к файлу базы данных
+    :param cache_size: размер кэша страниц в килобайтах
+    :param mmap_size: сколько байт файла базы данных отображается в память (0 - не отображать)
+    :return: sqlite3.Connection
+    """
+    db = sqlite3.connect(path)
+
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute(f"PRAGMA cache_size = {-int(cache_size)}")  # отрицательное значение - размер в килобайтах
+    db.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    db.execute("PRAGMA foreign_keys = ON")
+
+    return db
+
+
+def period_bounds(period, day):
+    """
+    Границы периода, в который попадает день
+
+    :param period: "day", "week", "month" или "year"
+    :param day: количество дней от 01.01.1970
+    :return: кортеж (первый день периода, последний день периода)
+    """
+    date = days_to_date(day)
+
+    if period == "day":
+        start, end = date, date
+    elif period == "week":
+        start = date.addDays(1 - date.dayOfWeek())
+        end = start.addDays(6)
+    elif period == "month":
+        start = QDate(date.year(), date.month(), 1)
+        end = start.addMonths(1).addDays(-1)
+    else:
+        start = QDate(date.year(), 1, 1)
+        end = start.addYears(1).addDays(-1)
+
+    return date_to_days(start), date_to_days(end)
+
+
+def period_shift(period, day, count):
+    """
+    Сдвинуть день на несколько периодов
+
+    :param period: "day", "week", "month" или "year"
+    :param day: количество дней от 01.01.1970
+    :param count: на сколько периодов сдвинуть (отрицательное число - назад)
+    :return: количество дней от 01.01.1970
+    """
+    date = days_to_date(day)
+
+    if period == "day":
+        date = date.addDays(count)
+    elif period == "week":
+        date = date.addDays(count * 7)
+    elif period == "month":
+        date = date.addMonths(count)
+    else:
+        date = date.addYears(count)
+
+    return date_to_days(date)
+
+
+# Миграции базы данных. Каждая миграция - это SQL скрипт, номер миграции - это её позиция в списке, начиная с единицы.
+# Номер последней применённой миграции хранится в PRAGMA user_version. Новые миграции добавляются только в конец списка
+migrations = [
+    # 1. Дата транзакции хранится как количество дней от 01.01.1970 вместо текста вида dd.MM.yyyy, а история транзакций
+    # сортируется и разбивается на страницы по индексу (account_id, date, id). SQLite не умеет менять тип колонки,
+    # поэтому таблица пересоздаётся
+    """
+    CREATE TABLE transaction_new
+    (
+        id INTEGER not null
+            primary key autoincrement,
+        account_id INTEGER not null
+            references account,
+        category_id INTEGER
+            references category,
+        money REAL not null,
+        date INTEGER
+    );
+
+    INSERT INTO transaction_new(id, account_id, category_id, money, date)
+    SELECT id, account_id, category_id, money,
+           CAST(JULIANDAY(SUBSTR(date, 7, 4) || '-' || SUBSTR(date, 4, 2) || '-' || SUBSTR(date, 1, 2))
+                - JULIANDAY('1970-01-01') AS INTEGER)
+    FROM 'transaction';
+
+    DROP TABLE 'transaction';
+    ALTER TABLE transaction_new RENAME TO 'transaction';
+
+    CREATE INDEX transaction_account_id_date_id_index ON 'transaction' (account_id, date, id);
+    """,
+
+    # 2. Индекс для поиска транзакций по категории. Поиск по account_id (в том числе удаление транзакций счёта) уже
+    # идёт по индексу (account_id, date, id)
+    """
+    CREATE INDEX transaction_category_id_index ON 'transaction' (category_id);
+    """,
+
+    # 3. Деньги хранятся целым числом в копейках (минимальных единицах валюты) вместо REAL, чтобы суммы считались
+    # точно. Таблицы пересоздаются, чтобы у колонок money была целочисленная совместимость типов. Заодно колонка
+    # account.color становится TEXT: раньше она была INTEGER, и цвет из цифр и буквы e SQLite хранил числом
+    # ('012345' - как 12345, '00e000' - как 0, '12e345' - как бесконечность). Цвета, которые хранились целым числом,
+    # снова записываются шестью цифрами, а бесконечность заменяется цветом по умолчанию
+    """
+    CREATE TABLE account_new
+    (
+        id INTEGER not null
+            primary key autoincrement,
+        name TEXT default 'Счёт' not null,
+        color TEXT default 'a1a1a1' not null,
+        currency INTEGER not null
+            references currency,
+        money INTEGER default 0 not null
+    );
+
+    INSERT INTO account_new(id, name, color, currency, money)
+    SELECT id, name,
+           CASE WHEN typeof(color) = 'integer' AND color BETWEEN 0 AND 999999 THEN printf('%06d', color)
+                WHEN typeof(color) IN ('integer', 'real') THEN 'a1a1a1'
+                ELSE color END,
+           currency, CAST(ROUND(ROUND(money, 2) * 100) AS INTEGER) FROM account;
+
+    DROP TABLE account;
+    ALTER TABLE account_new RENAME TO account;
+
+    CREATE TABLE transaction_new
+    (
+        id INTEGER not null
+            primary key autoincrement,
+        account_id INTEGER not null
+            references account,
+        category_id INTEGER
+            references category,
+        money INTEGER not null,
+        date INTEGER
+    );
+
+    INSERT INTO transaction_new(id, account_id, category_id, money, date)
+    SELECT id, account_id, category_id, CAST(ROUND(ROUND(money, 2) * 100) AS INTEGER), date FROM 'transaction';
+
+    DROP TABLE 'transaction';
+    ALTER TABLE transaction_new RENAME TO 'transaction';
+
+    CREATE INDEX transaction_account_id_date_id_index ON 'transaction' (account_id, date, id);
+    CREATE INDEX transaction_category_id_index ON 'transaction' (category_id);
+    """,
+
+    # 4. Сумма на счету ведётся базой данных: account.money равно начальной сумме счёта opening_money плюс сумма всех
+    # его транзакций и поддерживается триггерами, поэтому любое изменение транзакции стоит одного обновления счёта
+    """
+    ALTER TABLE account ADD COLUMN opening_money INTEGER default 0 not null;
+
+    UPDATE account
+    SET opening_money = money - (SELECT COALESCE(SUM(money), 0) FROM 'transaction' WHERE account_id = account.id);
+
+    CREATE TRIGGER transaction_insert_balance AFTER INSERT ON 'transaction'
+    BEGIN
+        UPDATE account SET money = money + NEW.money WHERE id = NEW.account_id;
+    END;
+
+    CREATE TRIGGER transaction_delete_balance AFTER DELETE ON 'transaction'
+    BEGIN
+        UPDATE account SET money = money - OLD.money WHERE id = OLD.account_id;
+    END;
+
+    CREATE TRIGGER transaction_update_balance AFTER UPDATE OF account_id, money ON 'transaction'
+    BEGIN
+        UPDATE account SET money = money - OLD.money WHERE id = OLD.account_id;
+        UPDATE account SET money = money + NEW.money WHERE id = NEW.account_id;
+    END;
+    """,
+
+    # 5. Итоги по месяцам: доходы, расходы и количество транзакций для каждого счёта, категории и месяца. Месяц - это
+    # первый день месяца в днях от 01.01.1970, транзакции без даты попадают в месяц -1, а без категории - в категорию 0.
+    # Таблица поддерживается триггерами, поэтому отчёты по месяцам читают несколько сотен строк вместо всей истории
+    """
+    CREATE TABLE monthly_totals
+    (
+        account_id INTEGER not null,
+        category_id INTEGER not null,
+        month INTEGER not null,
+        income INTEGER default 0 not null,
+        outcome INTEGER default 0 not null,
+        count INTEGER default 0 not null,
+        primary key (account_id, month, category_id)
+    ) WITHOUT ROWID;
+
+    INSERT INTO monthly_totals(account_id, category_id, month, income, outcome, count)
+    SELECT account_id, IFNULL(category_id, 0),
+           CASE WHEN date IS NULL THEN -1
+                ELSE CAST(STRFTIME('%s', date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END AS month,
+           SUM(MAX(money, 0)), SUM(MIN(money, 0)), COUNT(*)
+    FROM 'transaction'
+    GROUP BY account_id, month, IFNULL(category_id, 0);
+
+    CREATE TRIGGER transaction_insert_monthly_totals AFTER INSERT ON 'transaction'
+    BEGIN
+        INSERT INTO monthly_totals(account_id, category_id, month, income, outcome, count)
+        VALUES (NEW.account_id, IFNULL(NEW.category_id, 0),
+                CASE WHEN NEW.date IS NULL THEN -1
+                     ELSE CAST(STRFTIME('%s', NEW.date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END,
+                MAX(NEW.money, 0), MIN(NEW.money, 0), 1)
+        ON CONFLICT (account_id, month, category_id) DO UPDATE
+        SET income = income + excluded.income, outcome = outcome + excluded.outcome, count = count + 1;
+    END;
+
+    CREATE TRIGGER transaction_delete_monthly_totals AFTER DELETE ON 'transaction'
+    BEGIN
+        UPDATE monthly_totals
+        SET income = income - MAX(OLD.money, 0), outcome = outcome - MIN(OLD.money, 0), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = IFNULL(OLD.category_id, 0) AND month =
+            CASE WHEN OLD.date IS NULL THEN -1
+                 ELSE CAST(STRFTIME('%s', OLD.date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END;
+
+        DELETE FROM monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = IFNULL(OLD.category_id, 0) AND count = 0 AND month =
+            CASE WHEN OLD.date IS NULL THEN -1
+                 ELSE CAST(STRFTIME('%s', OLD.date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END;
+    END;
+
+    CREATE TRIGGER transaction_update_monthly_totals AFTER UPDATE OF account_id, category_id, money, date
+        ON 'transaction'
+    BEGIN
+        UPDATE monthly_totals
+        SET income = income - MAX(OLD.money, 0), outcome = outcome - MIN(OLD.money, 0), count = count - 1
+        WHERE account_id = OLD.account_id AND category_id = IFNULL(OLD.category_id, 0) AND month =
+            CASE WHEN OLD.date IS NULL THEN -1
+                 ELSE CAST(STRFTIME('%s', OLD.date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END;
+
+        DELETE FROM monthly_totals
+        WHERE account_id = OLD.account_id AND category_id = IFNULL(OLD.category_id, 0) AND count = 0 AND month =
+            CASE WHEN OLD.date IS NULL THEN -1
+                 ELSE CAST(STRFTIME('%s', OLD.date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END;
+
+        INSERT INTO monthly_totals(account_id, category_id, month, income, outcome, count)
+        VALUES (NEW.account_id, IFNULL(NEW.category_id, 0),
+                CASE WHEN NEW.date IS NULL THEN -1
+                     ELSE CAST(STRFTIME('%s', NEW.date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400 END,
+                MAX(NEW.money, 0), MIN(NEW.money, 0), 1)
+        ON CONFLICT (account_id, month, category_id) DO UPDATE
+        SET income = income + excluded.income, outcome = outcome + excluded.outcome, count = count + 1;
+    END;
+    """,
+
+    # 6. Заметка к транзакции и полнотекстовый поиск по заметкам. transaction_note - внешняя таблица FTS5, которая
+    # хранит только индекс слов, а сами заметки читает из transaction. Индекс поддерживается триггерами. В индекс
+    # истории транзакций добавлена сумма, чтобы условия на сумму проверялись без чтения строк таблицы
+    """
+    ALTER TABLE 'transaction' ADD COLUMN note TEXT;
+
+    DROP INDEX transaction_account_id_date_id_index;
+    CREATE INDEX transaction_account_id_date_id_money_index ON 'transaction' (account_id, date, id, money);
+
+    CREATE VIRTUAL TABLE transaction_note USING fts5(
+        note, content='transaction', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    );
+
+    CREATE TRIGGER transaction_insert_note AFTER INSERT ON 'transaction' WHEN NEW.note IS NOT NULL
+    BEGIN
+        INSERT INTO transaction_note(rowid, note) VALUES (NEW.id, NEW.note);
+    END;
+
+    CREATE TRIGGER transaction_delete_note AFTER DELETE ON 'transaction' WHEN OLD.note IS NOT NULL
+    BEGIN
+        INSERT INTO transaction_note(transaction_note, rowid, note) VALUES ('delete', OLD.id, OLD.note);
+    END;
+
+    CREATE TRIGGER transaction_update_note AFTER UPDATE OF note ON 'transaction' WHEN OLD.note IS NOT NEW.note
+    BEGIN
+        INSERT INTO transaction_note(transaction_note, rowid, note)
+        SELECT 'delete', OLD.id, OLD.note WHERE OLD.note IS NOT NULL;
+        INSERT INTO transaction_note(rowid, note) SELECT NEW.id, NEW.note WHERE NEW.note IS NOT NULL;
+    END;
+    """,
+
+    # 7. Хэш импортированной транзакции. По уникальному индексу повторный импорт той же выписки пропускает транзакции,
+    # которые уже есть. У транзакций, добавленных вручную, хэша нет
+    """
+    ALTER TABLE 'transaction' ADD COLUMN import_hash BLOB;
+
+    CREATE UNIQUE INDEX transaction_import_hash_index ON 'transaction' (import_hash) WHERE import_hash IS NOT NULL;
+    """,
+
+    # 8. Курсы валют: одна единица from_currency стоит rate единиц to_currency начиная с даты date и до следующего
+    # курса той же пары
+    """
+    CREATE TABLE currency_rate
+    (
+        date INTEGER not null,
+        from_currency TEXT not null
+            references currency,
+        to_currency TEXT not null
+            references currency,
+        rate REAL not null,
+        primary key (from_currency, to_currency, date)
+    ) WITHOUT ROWID;
+    """,
+
+    # 9. Индекс общей истории всех счетов: страницы идут по нему так же, как история одного счёта идёт по индексу
+    # (account_id, date, id, money). ID счёта в конце нужен сводке по всем счетам, чтобы она не читала строки таблицы
     """
-    Преобразует цвет из HEX в RGB (три числа)
+    CREATE INDEX transaction_date_id_money_account_id_index ON 'transaction' (date, id, money, account_id);
+    """,
+
+    # 10. Индекс сумм для поиска по сумме. Если под условия на сумму подходит мало транзакций, то страницы истории
+    # выбираются по нему, а не перебором всей истории по индексу истории (см. TransactionRepository.page)
+    """
+    CREATE INDEX transaction_money_account_id_index ON 'transaction' (money, account_id);
+    """,
+]
+
+
+def migrate(db):
+    """
+    Применяет к базе данных миграции, которые ещё не были применены. Каждая миграция выполняется в отдельной
+    транзакции вместе с изменением PRAGMA user_version, поэтому при ошибке база данных остаётся в прежнем состоянии
+
+    :param db: подключение к базе данных
+    """
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(migrations):
+        raise RuntimeError(f"База данных создана более новой версией программы (версия схемы {version})")
+
+    if version == len(migrations):
+        return
 
-    :param hex_color: Строка в виде HEX числа
-    :return: кортеж из трёх чисел характеризующие цветовые каналы RGB
+    # На время пересоздания таблиц проверка внешних ключей выключается. Менять PRAGMA foreign_keys внутри транзакции
+    # нельзя
+    foreign_keys = db.execute("PRAGMA foreign_keys").fetchone()[0]
+    db.commit()
+    db.execute("PRAGMA foreign_keys = OFF")
+
+    try:
+        for number, script in enumerate(migrations[version:], version + 1):
+            try:
+                db.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+            except Exception:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                raise
+    finally:
+        db.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+
+
+class Money(int):
     """
-    return tuple(int(hex_color[x:x + 2], 16) for x in range(0, 6, 2))
+    Сумма денег, которая хранится целым числом в копейках (минимальных единицах валюты). Сложение и вычитание остаются
+    целочисленными, поэтому суммы не накапливают ошибку округления. При форматировании выводится в рублях (основных
+    единицах валюты): f"{money:.2f}"
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_major(cls, value):
+        """
+        Создать сумму из числа в рублях (основных единицах валюты), например из значения QDoubleSpinBox
+
+        :param value: число в рублях
+        """
+        return cls(round(value * 100))
+
+    @property
+    def major(self):
+        """Сумма в рублях (основных единицах валюты) в виде float, например для QDoubleSpinBox"""
+        return self / 100
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return Money(int(self) + int(other))
+        return NotImplemented
 
+    __radd__ = __add__
 
-# Классы, ориентированные на данные из базы данных. Сделаны они для удобного использования данных из базы данных
+    def __sub__(self, other):
+        if isinstance(other, int):
+            return Money(int(self) - int(other))
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, int):
+            return Money(int(other) - int(self))
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __format__(self, format_spec):
+        return format(Decimal(int(self)).scaleb(-2), format_spec)
+
+    def __str__(self):
+        return str(int(self))
+
+    def __repr__(self):
+        return f"Money({int(self)})"
+
+
+# Классы, ориентированные на данные из базы данных. Сделаны они для удобного использования данных из базы данных.
+# У классов есть __slots__, а дата и цвет хранятся в виде чисел, как в базе данных. В QDate и QColor они переводятся
+# только тогда, когда нужны интерфейсу, поэтому большое количество загруженных транзакций занимает мало памяти
 class Currency:
     """Данные о валюте"""
 
+    __slots__ = ("name", "short_name")
+
     def __init__(self, name, short_name):
         self.short_name = short_name
         self.name = name
 
 
-class Account:
+class Colored:
+    """Данные, у которых есть цвет. Цвет хранится числом 0xRRGGBB"""
+
+    __slots__ = ("rgb",)
+
+    @property
+    def color(self):
+        """QColor, цвет"""
+        return QColor(self.rgb)
+
+    @color.setter
+    def color(self, color):
+        if type(color) is str:
+            self.rgb = int(color, 16)
+        else:
+            self.rgb = color.rgb() & 0xFFFFFF
+
+
+class Account(Colored):
     """Данные о счёте"""
 
+    __slots__ = ("id", "name", "currency", "money")
+
     def __init__(self, id, name, color, currency, money):
         self.id = id
         self.name = name
-        if type(color) is str:
-            self.color = QColor(*hex_to_rgb(color))
-        else:
-            self.color = color
+        self.color = color
         self.currency = currency
-        self.money = money
+        self.money = Money(money)
 
     def __copy__(self):
         return Account(self.id, self.name, self.color, self.currency, self.money)
 
 
-class Category:
+class Category(Colored):
     """Данные о категории транзакции"""
 
+    __slots__ = ("id", "name")
+
     def __init__(self, id, name, color):
         self.id = id
         self.name = name
-        if type(color) is str:
-            self.color = QColor(*hex_to_rgb(color))
-        else:
-            self.color = color
+        self.color = color
 
 
 class Transaction:
     """Данные о транзакции"""
 
-    def __init__(self, id, account_id, category_id, money, date):
+    __slots__ = ("id", "account_id", "category_id", "money", "day", "note")
+
+    def __init__(self, id, account_id, category_id, money, date, note=None):
+        """
+        :param date: количество дней от 01.01.1970, QDate или None, если даты нет
+        :param note: заметка к транзакции или None
+        """
         self.id = id
         self.account_id = account_id
         self.category_id = category_id
-        self.money = money
-        if type(date) is str:
-            self.date = QDate.fromString(date, "dd.MM.yyyy")
+        self.money = Money(money)
+        self.note = note
+        if type(date) is int or date is None:
+            self.day = date  # количество дней от 01.01.1970 или None
         else:
             self.date = date
+
+    @property
+    def date(self):
+        """QDate, дата транзакции или None, если даты нет"""
+        return days_to_date(self.day)
+
+    @date.setter
+    def date(self, date):
+        self.day = date_to_days(date)
+
+
+class Registry:
+    def __init__(self, items=(), key=lambda item: item.id, sort_key=None, reverse=False):
+        """
+        Справочник объектов из базы данных (счетов, категорий, валют) с поиском по ключу за O(1). При переборе объекты
+        идут в отсортированном порядке, который вычисляется один раз и сбрасывается при изменении справочника
+
+        :param items: объекты справочника
+        :param key: функция, которая возвращает ключ объекта
+        :param sort_key: функция, по которой объекты сортируются при переборе
+        :param reverse: сортировать в обратном порядке
+        """
+        self.key = key
+        self.sort_key = sort_key
+        self.reverse = reverse
+
+        self.items = {key(item): item for item in items}
+        self.ordered = None  # объекты в отсортированном порядке или None, если порядок нужно вычислить заново
+
+    def get(self, key, default=None):
+        """
+        Найти объект по ключу
+
+        :param key: ключ объекта, например ID
+        :param default: что вернуть, если объект не найден
+        """
+        return self.items.get(key, default)
+
+    def list(self):
+        """Объекты справочника в отсортированном порядке"""
+        if self.ordered is None:
+            self.ordered = list(self.items.values())
+            if self.sort_key is not None:
+                self.ordered.sort(key=self.sort_key, reverse=self.reverse)
+
+        return self.ordered
+
+    def add(self, item):
+        """Добавить объект или заменить объект с тем же ключом"""
+        self.items[self.key(item)] = item
+        self.ordered = None
+
+    def remove(self, key):
+        """Удалить объект по ключу"""
+        self.items.pop(key, None)
+        self.ordered = None
+
+    def changed(self):
+        """Сбросить порядок объектов, если сами объекты были изменены (например, переименован счёт)"""
+        self.ordered = None
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.list())
+
+    def __getitem__(self, index):
+        return self.list()[index]
+
+
+# Репозитории. Весь SQL программы собран здесь в виде постоянных строк, поэтому каждый запрос подготавливается SQLite
+# один раз и дальше берётся из кэша подготовленных запросов подключения. Методы репозиториев не фиксируют изменения
+# сами: изменения объединяются в одну транзакцию с помощью Repository.atomic()
+class Repository:
+    def __init__(self, db):
+        """
+        Базовый класс репозитория
+
+        :param db: подключение к базе данных
+        """
+        self.db = db
+
+    @contextmanager
+    def atomic(self):
+        """
+        Выполнить изменения в одной транзакции. При выходе из блока изменения фиксируются, а при ошибке - отменяются
+
+        :return: подключение к базе данных
+        """
+        with self.db:
+            yield self.db
+
+
+class CurrencyRepository(Repository):
+    """Запросы к таблице currency"""
+
+    SELECT_ALL = "SELECT name, short_name FROM currency"
+
+    def all(self):
+        """Все валюты"""
+        return [Currency(*row) for row in self.db.execute(self.SELECT_ALL)]
+
+
+class CurrencyRateRepository(Repository):
+    """Запросы к таблице currency_rate"""
+
+    SELECT_ALL = "SELECT date, from_currency, to_currency, rate FROM currency_rate"
+    INSERT = "INSERT OR REPLACE INTO currency_rate(date, from_currency, to_currency, rate) VALUES (?, ?, ?, ?)"
+
+    def all(self):
+        """
+        Все курсы валют
+
+        :return: курсор со строками (дата, из какой валюты, в какую валюту, курс)
+        """
+        return self.db.execute(self.SELECT_ALL)
+
+    def add_many(self, rows):
+        """
+        Добавить курсы одним подготовленным запросом. Курс пары на ту же дату заменяется
+
+        :param rows: итерируемый объект с кортежами (дата, из какой валюты, в какую валюту, курс)
+        :return: количество добавленных курсов
+        """
+        return self.db.executemany(self.INSERT, rows).rowcount
+
+
+class CategoryRepository(Repository):
+    """Запросы к таблице category"""
+
+    SELECT_ALL = "SELECT id, name, color FROM category"
+
+    def all(self):
+        """Все категории транзакций"""
+        return [Category(*row) for row in self.db.execute(self.SELECT_ALL)]
+
+
+class AccountRepository(Repository):
+    """Запросы к таблице account"""
+
+    SELECT_ALL = "SELECT id, name, color, currency, money FROM account"
+    SELECT_MONEY = "SELECT money FROM account WHERE id = ?"
+    # ID счетов передаются одним параметром в виде JSON массива, поэтому запрос один при любом количестве счетов
+    SELECT_BALANCES = "SELECT id, money FROM account WHERE id IN (SELECT value FROM json_each(?))"
+    SELECT_TOTALS = "SELECT currency, SUM(money) FROM account GROUP BY currency"
+    INSERT = "INSERT INTO account(name, color, currency, money, opening_money) VALUES (?, ?, ?, ?, ?)"
+    # Новая сумма на счету ставится через начальную сумму счёта, чтобы сумма продолжала сходиться с историей транзакций
+    UPDATE = "UPDATE account SET name = ?, color = ?, currency = ?, opening_money = opening_money + ? - money, " \
+             "money = ? WHERE id = ?"
+    DELETE = "DELETE FROM account WHERE id = ?"
+    DELETE_TRANSACTIONS = "DELETE FROM 'transaction' WHERE account_id = ?"
+    SELECT_DRIFTED = "SELECT id, money, expected FROM (" \
+                     "   SELECT id, money, opening_money + " \
+                     "       (SELECT COALESCE(SUM(money), 0) FROM 'transaction' WHERE account_id = account.id) " \
+                     "       AS expected " \
+                     "   FROM account" \
+                     ") WHERE money != expected"
+    REBUILD_BALANCES = "UPDATE account SET money = opening_money + " \
+                       "(SELECT COALESCE(SUM(money), 0) FROM 'transaction' WHERE account_id = account.id)"
+
+    def all(self):
+        """Все счета"""
+        return [Account(*row) for row in self.db.execute(self.SELECT_ALL)]
+
+    def money(self, account_id):
+        """
+        Актуальная сумма на счету
+
+        :param account_id: ID счёта
+        :return: Money
+        """
+        return Money(self.db.execute(self.SELECT_MONEY, (account_id,)).fetchone()[0])
+
+    def balances(self, account_ids):
+        """
+        Актуальные суммы на нескольких счетах одним запросом
+
+        :param account_ids: итерируемый объект с ID счетов
+        :return: словарь ID счёта -> Money. Счетов, которых уже нет в базе данных, в словаре нет
+        """
+        rows = self.db.execute(self.SELECT_BALANCES, (json.dumps(list(set(account_ids))),))
+        return {account_id: Money(money) for account_id, money in rows}
+
+    def totals(self):
+        """
+        Суммы на всех счетах по валютам одним запросом
+
+        :return: словарь код валюты -> Money
+        """
+        return {currency: Money(money) for currency, money in self.db.execute(self.SELECT_TOTALS)}
+
+    def add(self, account):
+        """
+        Добавить счёт. Сумма на счету становится начальной суммой счёта
+
+        :param account: Account, ID будет поставлен тот, что сгенерировала база данных
+        :return: ID нового счёта
+        """
+        cursor = self.db.execute(self.INSERT, (account.name, account.color.name()[1:], account.currency,
+                                               account.money, account.money))
+        account.id = cursor.lastrowid
+
+        return account.id
+
+    def update(self, account):
+        """
+        Изменить название, цвет, валюту и сумму на счету
+
+        :param account: Account с новыми данными
+        """
+        self.db.execute(self.UPDATE, (account.name, account.color.name()[1:] if account.color else None,
+                                      account.currency, account.money, account.money, account.id))
+
+    def delete(self, account_id):
+        """
+        Удалить счёт вместе с его транзакциями
+
+        :param account_id: ID счёта
+        """
+        self.db.execute(self.DELETE_TRANSACTIONS, (account_id,))
+        self.db.execute(self.DELETE, (account_id,))
+
+    def verify_balances(self):
+        """
+        Проверить, что сумма на каждом счету равна начальной сумме счёта плюс сумма его транзакций
+
+        :return: список кортежей (ID счёта, сумма на счету, сумма по истории транзакций) для счетов, где суммы не
+            сходятся
+        """
+        return self.db.execute(self.SELECT_DRIFTED).fetchall()
+
+    def rebuild_balances(self):
+        """Пересчитать суммы на всех счетах по их начальным суммам и истории транзакций"""
+        self.db.execute(self.REBUILD_BALANCES)
+
+
+transaction_columns = "id, account_id, category_id, money, date, note"  # колонки, из которых собирается Transaction
+
+
+class TransactionFilter:
+    """Условия поиска транзакций. Условия, которые не заданы, поиск не ограничивают"""
+
+    __slots__ = ("money_from", "money_to", "start", "end", "category_ids", "text", "note_matches", "money_matches")
+
+    def __init__(self, money_from=None, money_to=None, start=None, end=None, category_ids=None, text=""):
+        """
+        :param money_from: Money, наименьшая сумма транзакции по модулю или None
+        :param money_to: Money, наибольшая сумма транзакции по модулю или None
+        :param start: первый день (количество дней от 01.01.1970) или None. Если задан start или end, то транзакции без
+            даты не подходят
+        :param end: последний день включительно или None
+        :param category_ids: множество ID подходящих категорий (None в множестве - транзакции без категории) или None,
+            если подходят все категории
+        :param text: слова, с которых должны начинаться слова заметки
+        """
+        self.money_from = money_from
+        self.money_to = money_to
+        self.start = start
+        self.end = end
+        self.category_ids = category_ids
+        self.text = text
+
+        # Сколько транзакций подходит под текст и под суммы (для каждого знака суммы). Считается при запросе первой
+        # страницы и нужно только для выбора индекса, поэтому следующие страницы используют то же число
+        # (см. TransactionRepository.page)
+        self.note_matches = None
+        self.money_matches = {}
+
+    def __bool__(self):
+        return any(value is not None for value in (self.money_from, self.money_to, self.start, self.end,
+                                                   self.category_ids)) or bool(self.text.split())
+
+    def match_query(self):
+        """
+        Запрос FTS5 для текста: каждое слово берётся в кавычки, чтобы символы запроса не имели особого смысла, и
+        ищется по началу слова
+
+        :return: строка для MATCH
+        """
+        return " ".join('"{}"*'.format(word.replace('"', '""')) for word in self.text.split())
+
+    def money_bounds(self, sign):
+        """
+        Промежуток значений money, которые подходят под условия на сумму по модулю
+
+        :param sign: 1 для доходов, -1 для расходов
+        :return: кортеж (наименьшая сумма, наибольшая сумма)
+        """
+        low = self.money_from if self.money_from is not None else 0
+        high = self.money_to if self.money_to is not None else 2 ** 63 - 1
+
+        return (low, high) if sign > 0 else (-high, -low)
+
+    def sql(self, sign=None):
+        """
+        Условия для WHERE
+
+        :param sign: None, если условия на сумму нужны по модулю, или знак суммы транзакций, тогда условия на сумму
+            ставятся на money, и SQLite может выбрать индекс сумм
+        :return: кортеж (строка с условиями, каждое начинается с " AND ", параметры условий)
+        """
+        conditions = ""
+        parameters = ()
+
+        if self.money_from is not None or self.money_to is not None:
+            if sign is None:
+                if self.money_from is not None:
+                    conditions += " AND ABS(money) >= ?"
+                    parameters += (self.money_from,)
+                if self.money_to is not None:
+                    conditions += " AND ABS(money) <= ?"
+                    parameters += (self.money_to,)
+            else:
+                conditions += " AND money BETWEEN ? AND ?"
+                parameters += self.money_bounds(sign)
+        if self.start is not None:
+            conditions += " AND date >= ?"
+            parameters += (self.start,)
+        if self.end is not None:
+            conditions += " AND date <= ?"
+            parameters += (self.end,)
+
+        if self.category_ids is not None:
+            category_ids = tuple(category_id for category_id in self.category_ids if category_id is not None)
+            condition = f"category_id IN ({', '.join('?' * len(category_ids))})"
+            if None in self.category_ids:
+                condition = f"({condition} OR category_id IS NULL)"
+            conditions += " AND " + condition
+            parameters += category_ids
+
+        if self.text.split():
+            conditions += " AND id IN (SELECT rowid FROM transaction_note WHERE transaction_note MATCH ?)"
+            parameters += (self.match_query(),)
+
+        return conditions, parameters
+
+
+@lru_cache(maxsize=64)
+def page_queries(sign, conditions="", narrow=False, all_accounts=False):
+    """
+    Запросы страниц истории транзакций. Транзакции с датой и без даты выбираются отдельно, чтобы каждый запрос шёл по
+    индексу (account_id, date, id, money), а общая история всех счетов - по индексу (date, id, money)
+
+    :param sign: 1 для доходов, -1 для расходов
+    :param conditions: дополнительные условия (см. TransactionFilter.sql)
+    :param narrow: если True, то индексы истории не используются (унарный плюс перед account_id, date и id), и
+        транзакции выбираются по ID, найденным в индексе заметок, или по индексу сумм, а потом сортируются. Так
+        быстрее, когда условиям подходит мало транзакций. Для общей истории SQLite сам выбирает индекс заметок, если в
+        условиях есть текст
+    :param all_accounts: если True, то запросы выбирают транзакции всех счетов, и первого параметра (ID счёта) у них нет
+    :return: словарь "first", "after", "no_date" -> запрос
+    """
+    plus = "+" if narrow else ""
+    account = "1" if all_accounts else f"{plus}account_id = ?"
+    date, id = f"{plus}date", f"{plus}id"
+    condition = ("money > 0" if sign > 0 else "money < 0") + conditions
+
+    return {
+        "first": f"SELECT {transaction_columns} FROM 'transaction' WHERE ({account}) AND {condition} "
+                 f"AND {date} IS NOT NULL ORDER BY {date} DESC, {id} DESC LIMIT ?",
+        "after": f"SELECT {transaction_columns} FROM 'transaction' WHERE ({account}) AND {condition} "
+                 f"AND {date} IS NOT NULL AND ({date}, {id}) < (?, ?) ORDER BY {date} DESC, {id} DESC LIMIT ?",
+        "no_date": f"SELECT {transaction_columns} FROM 'transaction' WHERE ({account}) AND {condition} "
+                   f"AND {date} IS NULL AND {id} < ? ORDER BY {id} DESC LIMIT ?",
+    }
+
+
+class TransactionRepository(Repository):
+    """Запросы к таблице transaction"""
+
+    # Страницы истории транзакций без условий поиска, для каждого знака суммы (доходы и расходы) свой набор запросов
+    PAGE_QUERIES = {sign: page_queries(sign) for sign in (1, -1)}
+    ALL_PAGE_QUERIES = {sign: page_queries(sign, all_accounts=True) for sign in (1, -1)}
+
+    # Первые страницы доходов и расходов одним запросом: четыре ограниченных выборки по индексу, склеенные через
+    # UNION ALL, поэтому смена счёта стоит одного обращения к базе данных
+    FIRST_PAGES = " UNION ALL ".join(
+        f"SELECT * FROM ({queries[part]})" for queries in PAGE_QUERIES.values() for part in ("first", "no_date")
+    )
+    ALL_FIRST_PAGES = " UNION ALL ".join(
+        f"SELECT * FROM ({queries[part]})" for queries in ALL_PAGE_QUERIES.values() for part in ("first", "no_date")
+    )
+
+    # Если заметке или суммам подходит не больше стольких транзакций, то поиск идёт от индекса заметок или сумм, а не
+    # от индекса истории
+    NOTE_SCAN_LIMIT = 5000
+    MONEY_SCAN_LIMIT = 5000
+    COUNT_NOTE_MATCHES = "SELECT COUNT(*) FROM transaction_note WHERE transaction_note MATCH ?"
+    # Подсчёт останавливается на MONEY_SCAN_LIMIT + 1, поэтому широкий промежуток сумм не перебирает весь индекс
+    COUNT_MONEY_MATCHES = "SELECT COUNT(*) FROM (SELECT 1 FROM 'transaction' WHERE money BETWEEN ? AND ? LIMIT ?)"
+
+    INSERT = "INSERT INTO 'transaction'(account_id, category_id, money, date, note) VALUES (?, ?, ?, ?, ?)"
+    UPDATE = "UPDATE 'transaction' SET account_id = ?, category_id = ?, money = ?, date = ?, note = ? WHERE id = ?"
+    DELETE = "DELETE FROM 'transaction' WHERE id = ?"
+    INSERT_IMPORTED = "INSERT OR IGNORE INTO 'transaction'(account_id, category_id, money, date, note, import_hash) " \
+                      "VALUES (?, ?, ?, ?, ?, ?)"
+
+    def page(self, account_id, sign, after, count, search=None):
+        """
+        Получить страницу транзакций счёта. Транзакции с ближайшей датой идут первыми, а более давние или без даты -
+        последними. Страница начинается сразу после транзакции after, поэтому стоимость запроса не зависит от того,
+        насколько далеко пользователь пролистал историю
+
+        :param account_id: ID счёта или None для общей истории всех счетов
+        :param sign: 1 для доходов, -1 для расходов
+        :param after: Transaction, последняя уже полученная транзакция или None для первой страницы
+        :param count: максимальное количество транзакций на странице
+        :param search: TransactionFilter, если нужны только подходящие под условия транзакции
+        :return: список Transaction
+        """
+        all_accounts = account_id is None
+
+        if search:
+            by_money = (search.money_from is not None or search.money_to is not None) and \
+                self.money_matches(search, sign) <= self.MONEY_SCAN_LIMIT
+            by_note = not all_accounts and bool(search.text.split()) and \
+                self.note_matches(search) <= self.NOTE_SCAN_LIMIT
+            conditions, parameters = search.sql(sign if by_money else None)
+            queries = page_queries(sign, conditions, by_note or by_money, all_accounts)
+        else:
+            queries, parameters = (self.ALL_PAGE_QUERIES if all_accounts else self.PAGE_QUERIES)[sign], ()
+
+        if not all_accounts:
+            parameters = (account_id, *parameters)
+
+        result = []
+        if after is None:
+            result = self.db.execute(queries["first"], (*parameters, count)).fetchall()
+        elif after.day is not None:
+            result = self.db.execute(queries["after"], (*parameters, after.day, after.id, count)).fetchall()
+
+        # Транзакции без даты идут после всех транзакций с датой. Если транзакции без даты ещё не показывались, то
+        # ограничение по ID ставится больше любого возможного
+        if len(result) < count:
+            last_id = after.id if after is not None and after.day is None else 2 ** 63 - 1
+            result.extend(self.db.execute(queries["no_date"], (*parameters, last_id, count - len(result))).fetchall())
+
+        return [Transaction(*row) for row in result]
+
+    def note_matches(self, search):
+        """
+        Количество транзакций, заметки которых подходят под текст поиска. Считается один раз для условий поиска, так
+        что подгрузка следующих страниц не ищет по индексу заметок заново
+
+        :param search: TransactionFilter с текстом
+        :return: количество транзакций всех счетов
+        """
+        if search.note_matches is None:
+            search.note_matches = self.db.execute(self.COUNT_NOTE_MATCHES, (search.match_query(),)).fetchone()[0]
+
+        return search.note_matches
+
+    def money_matches(self, search, sign):
+        """
+        Количество доходов или расходов, суммы которых подходят под условия поиска, но не больше MONEY_SCAN_LIMIT + 1.
+        Считается один раз для условий поиска и знака суммы (см. TransactionRepository.note_matches)
+
+        :param search: TransactionFilter с суммой от или до
+        :param sign: 1 для доходов, -1 для расходов
+        :return: количество транзакций всех счетов
+        """
+        if sign not in search.money_matches:
+            search.money_matches[sign] = self.db.execute(
+                self.COUNT_MONEY_MATCHES, (*search.money_bounds(sign), self.MONEY_SCAN_LIMIT + 1)).fetchone()[0]
+
+        return search.money_matches[sign]
+
+    def first_pages(self, account_id, count):
+        """
+        Получить первые страницы доходов и расходов счёта одним запросом (см. TransactionRepository.page)
+
+        :param account_id: ID счёта или None для общей истории всех счетов
+        :param count: максимальное количество транзакций на каждой странице
+        :return: словарь 1 (доходы) и -1 (расходы) -> список Transaction
+        """
+        if account_id is None:
+            query, parameters = self.ALL_FIRST_PAGES, (count, 2 ** 63 - 1, count) * 2
+        else:
+            query, parameters = self.FIRST_PAGES, (account_id, count, account_id, 2 ** 63 - 1, count) * 2
+        pages = {1: [], -1: []}
+
+        # Транзакции без даты идут сразу после транзакций с датой, поэтому каждой странице достаточно взять первые count
+        for row in self.db.execute(query, parameters):
+            page = pages[1 if row[3] > 0 else -1]
+            if len(page) < count:
+                page.append(Transaction(*row))
+
+        return pages
+
+    @staticmethod
+    def parameters(transaction):
+        """Параметры запросов INSERT и UPDATE для транзакции"""
+        return transaction.account_id, transaction.category_id, transaction.money, transaction.day, transaction.note
+
+    def add(self, transaction):
+        """
+        Добавить транзакцию. Сумма на счету изменяется триггером базы данных
+
+        :param transaction: Transaction, ID будет поставлен тот, что сгенерировала база данных
+        :return: ID новой транзакции
+        """
+        transaction.id = self.db.execute(self.INSERT, self.parameters(transaction)).lastrowid
+
+        return transaction.id
+
+    def add_many(self, transactions):
+        """
+        Добавить несколько транзакций одним подготовленным запросом. Запрос берётся из кэша подготовленных запросов
+        подключения, поэтому выполняется для каждой транзакции отдельно: так каждая транзакция получает свой ID
+
+        :param transactions: итерируемый объект с Transaction, ID будут поставлены те, что сгенерировала база данных
+        :return: список ID новых транзакций
+        """
+        ids = []
+        for transaction in transactions:
+            transaction.id = self.db.execute(self.INSERT, self.parameters(transaction)).lastrowid
+            ids.append(transaction.id)
+
+        return ids
+
+    def add_imported(self, rows):
+        """
+        Добавить импортированные транзакции одним подготовленным запросом. Транзакции, хэш которых уже есть в базе
+        данных, пропускаются
+
+        :param rows: итерируемый объект с кортежами (account_id, category_id, money, date, note, import_hash)
+        :return: количество добавленных транзакций
+        """
+        return self.db.executemany(self.INSERT_IMPORTED, rows).rowcount
+
+    def export(self, account_ids=None, start=None, end=None):
+        """
+        Транзакции вместе с названиями счёта и категории для выгрузки. Возвращается курсор, строки из которого нужно
+        забирать частями через fetchmany, тогда вся история не загружается в память. Транзакции идут по дате, а
+        транзакции без даты - первыми
+
+        :param account_ids: ID счетов или None, если нужны все счета
+        :param start: первый день промежутка (количество дней от 01.01.1970) или None
+        :param end: последний день промежутка включительно или None
+        :return: sqlite3.Cursor со строками (id, дата, счёт, валюта, категория, сумма, заметка)
+        """
+        query = "SELECT t.id, t.date, a.name, a.currency, c.name, t.money, t.note FROM 'transaction' AS t " \
+                "JOIN account AS a ON a.id = t.account_id LEFT JOIN category AS c ON c.id = t.category_id WHERE 1"
+        parameters = []
+
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            query += f" AND t.account_id IN ({', '.join('?' * len(account_ids))})"
+            parameters.extend(account_ids)
+        if start is not None:
+            query += " AND t.date >= ?"
+            parameters.append(start)
+        if end is not None:
+            query += " AND t.date <= ?"
+            parameters.append(end)
+
+        return self.db.execute(query + " ORDER BY t.date, t.id", parameters)
+
+    def update(self, transaction):
+        """
+        Изменить транзакцию
+
+        :param transaction: Transaction с новыми данными
+        """
+        self.db.execute(self.UPDATE, (*self.parameters(transaction), transaction.id))
+
+    def update_many(self, transactions):
+        """
+        Изменить несколько транзакций одним подготовленным запросом
+
+        :param transactions: итерируемый объект с Transaction
+        """
+        self.db.executemany(self.UPDATE, ((*self.parameters(transaction), transaction.id)
+                                          for transaction in transactions))
+
+    def delete(self, transaction_id):
+        """
+        Удалить транзакцию
+
+        :param transaction_id: ID транзакции
+        """
+        self.db.execute(self.DELETE, (transaction_id,))
+
+    def delete_many(self, transaction_ids):
+        """
+        Удалить несколько транзакций одним подготовленным запросом
+
+        :param transaction_ids: итерируемый объект с ID транзакций
+        """
+        self.db.executemany(self.DELETE, ((transaction_id,) for transaction_id in transaction_ids))
+
+
+# Выражения SQL, которые переводят дату транзакции в первый день её периода. Неделя начинается с понедельника, а
+# 01.01.1970 был четвергом. Даты до 1970 года отрицательные, а % в SQLite для них тоже отрицательный, поэтому остаток
+# приводится к 0..6
+period_starts = {
+    "day": "date",
+    "week": "date - ((date + 3) % 7 + 7) % 7",
+    "month": "CAST(STRFTIME('%s', date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400",
+    "year": "CAST(STRFTIME('%s', date * 86400, 'unixepoch', 'start of year') AS INTEGER) / 86400",
+}
+period_sums = "SUM(CASE WHEN money > 0 THEN money ELSE 0 END), SUM(CASE WHEN money < 0 THEN money ELSE 0 END), " \
+              "COUNT(*)"
+
+# Сводка по всем счетам: суммы каждого счёта переводятся в одну валюту по курсам, которые передаются параметром в виде
+# JSON {"код валюты": курс}
+converted_sums = "SUM(CASE WHEN t.money > 0 THEN t.money * rate.value ELSE 0 END), " \
+                 "SUM(CASE WHEN t.money < 0 THEN t.money * rate.value ELSE 0 END), COUNT(*)"
+rates_join = "JOIN account ON account.id = {}.account_id JOIN json_each(?) AS rate ON rate.key = account.currency"
+
+
+class SummaryRepository(Repository):
+    """
+    Сводки доходов и расходов по периодам. Дни и недели считаются по транзакциям с помощью индекса
+    (account_id, date, id, money), а месяцы и годы читаются из итогов по месяцам monthly_totals. Сводка по всем счетам
+    считается теми же запросами, только суммы каждого счёта переводятся в одну валюту
+    """
+
+    SELECT_PERIODS = {
+        period: f"SELECT {start} AS period, {period_sums} FROM 'transaction' "
+                f"WHERE account_id = ? AND date >= ? GROUP BY period ORDER BY period DESC"
+        for period, start in period_starts.items()
+    }
+    SELECT_PERIOD = f"SELECT {period_sums} FROM 'transaction' WHERE account_id = ? AND date BETWEEN ? AND ?"
+    SELECT_CATEGORIES = f"SELECT category_id, {period_sums} FROM 'transaction' " \
+                        f"WHERE account_id = ? AND date BETWEEN ? AND ? GROUP BY category_id"
+
+    # Месяц -1 - это транзакции без даты, в сводку по периодам они не попадают
+    SELECT_PERIODS.update({
+        "month": "SELECT month AS period, SUM(income), SUM(outcome), SUM(count) FROM monthly_totals "
+                 "WHERE account_id = ? AND month >= ? AND month != -1 GROUP BY period ORDER BY period DESC",
+        "year": "SELECT CAST(STRFTIME('%s', month * 86400, 'unixepoch', 'start of year') AS INTEGER) / 86400 "
+                "AS period, SUM(income), SUM(outcome), SUM(count) FROM monthly_totals "
+                "WHERE account_id = ? AND month >= ? AND month != -1 GROUP BY period ORDER BY period DESC",
+    })
+    SELECT_MONTHS_PERIOD = "SELECT SUM(income), SUM(outcome), SUM(count) FROM monthly_totals " \
+                           "WHERE account_id = ? AND month BETWEEN ? AND ? AND month != -1"
+    SELECT_MONTHS_CATEGORIES = "SELECT category_id, SUM(income), SUM(outcome), SUM(count) FROM monthly_totals " \
+                               "WHERE account_id = ? AND month BETWEEN ? AND ? AND month != -1 GROUP BY category_id"
+
+    # Те же запросы для сводки по всем счетам. Первый параметр у них - курсы валют вместо ID счёта
+    SELECT_ALL_PERIODS = {
+        period: f"SELECT {start} AS period, {converted_sums} FROM 'transaction' AS t {rates_join.format('t')} "
+                f"WHERE date >= ? GROUP BY period ORDER BY period DESC"
+        for period, start in period_starts.items()
+    }
+    SELECT_ALL_PERIOD = f"SELECT {converted_sums} FROM 'transaction' AS t {rates_join.format('t')} " \
+                        f"WHERE date BETWEEN ? AND ?"
+    SELECT_ALL_CATEGORIES = f"SELECT category_id, {converted_sums} FROM 'transaction' AS t {rates_join.format('t')} " \
+                            f"WHERE date BETWEEN ? AND ? GROUP BY category_id"
+
+    SELECT_ALL_PERIODS.update({
+        "month": f"SELECT month AS period, SUM(income * rate.value), SUM(outcome * rate.value), SUM(count) "
+                 f"FROM monthly_totals AS m {rates_join.format('m')} "
+                 f"WHERE month >= ? AND month != -1 GROUP BY period ORDER BY period DESC",
+        "year": f"SELECT CAST(STRFTIME('%s', month * 86400, 'unixepoch', 'start of year') AS INTEGER) / 86400 "
+                f"AS period, SUM(income * rate.value), SUM(outcome * rate.value), SUM(count) "
+                f"FROM monthly_totals AS m {rates_join.format('m')} "
+                f"WHERE month >= ? AND month != -1 GROUP BY period ORDER BY period DESC",
+    })
+    SELECT_ALL_MONTHS_PERIOD = f"SELECT SUM(income * rate.value), SUM(outcome * rate.value), SUM(count) " \
+                               f"FROM monthly_totals AS m {rates_join.format('m')} " \
+                               f"WHERE month BETWEEN ? AND ? AND month != -1"
+    SELECT_ALL_MONTHS_CATEGORIES = f"SELECT category_id, SUM(income * rate.value), SUM(outcome * rate.value), " \
+                                   f"SUM(count) FROM monthly_totals AS m {rates_join.format('m')} " \
+                                   f"WHERE month BETWEEN ? AND ? AND month != -1 GROUP BY category_id"
+
+    REBUILD_MONTHLY_TOTALS = """
+        INSERT INTO monthly_totals(account_id, category_id, month, income, outcome, count)
+        SELECT account_id, IFNULL(category_id, 0),
+               CASE WHEN date IS NULL THEN -1
+                    ELSE CAST(STRFTIME('%s', date * 86400, 'unixepoch', 'start of month') AS INTEGER) / 86400
+               END AS month,
+               SUM(MAX(money, 0)), SUM(MIN(money, 0)), COUNT(*)
+        FROM 'transaction'
+        GROUP BY account_id, month, IFNULL(category_id, 0)
+    """
+
+    # Периоды, которые состоят из целых месяцев и поэтому считаются по monthly_totals
+    MONTHLY_PERIODS = ("month", "year")
+
+    @staticmethod
+    def scope(account_id, rates):
+        """Первый параметр запросов сводки: ID счёта или курсы валют в JSON для сводки по всем счетам"""
+        return account_id if account_id is not None else json.dumps(rates)
+
+    def periods(self, account_id, period, start, rates=None):
+        """
+        Доходы и расходы счёта по периодам, начиная с периода, в который попадает день start
+
+        :param account_id: ID счёта или None для сводки по всем счетам
+        :param period: "day", "week", "month" или "year"
+        :param start: количество дней от 01.01.1970
+        :param rates: для сводки по всем счетам - словарь код валюты -> курс к валюте сводки. Счета, валюты которых нет
+            в словаре, не учитываются
+        :return: список кортежей (первый день периода, доходы, расходы, количество транзакций), последние периоды
+            идут первыми
+        """
+        start = period_bounds(period, start)[0]
+        query = (self.SELECT_ALL_PERIODS if account_id is None else self.SELECT_PERIODS)[period]
+
+        # Суммы по всем счетам переведены по курсу и поэтому дробные, они округляются до копеек
+        return [(row[0], Money(round(row[1])), Money(round(row[2])), row[3])
+                for row in self.db.execute(query, (self.scope(account_id, rates), start))]
+
+    def period(self, account_id, period, day, rates=None):
+        """
+        Доходы и расходы счёта за один период
+
+        :param account_id: ID счёта или None для сводки по всем счетам
+        :param period: "day", "week", "month" или "year"
+        :param day: любой день периода (количество дней от 01.01.1970)
+        :param rates: курсы для сводки по всем счетам (см. SummaryRepository.periods)
+        :return: кортеж (первый день периода, доходы, расходы, количество транзакций)
+        """
+        start, end = period_bounds(period, day)
+        if account_id is None:
+            query = self.SELECT_ALL_MONTHS_PERIOD if period in self.MONTHLY_PERIODS else self.SELECT_ALL_PERIOD
+        else:
+            query = self.SELECT_MONTHS_PERIOD if period in self.MONTHLY_PERIODS else self.SELECT_PERIOD
+        income, outcome, count = self.db.execute(query, (self.scope(account_id, rates), start, end)).fetchone()
+
+        return start, Money(round(income or 0)), Money(round(outcome or 0)), count or 0
+
+    def categories(self, account_id, period, day, rates=None):
+        """
+        Доходы и расходы счёта за один период по категориям
+
+        :param account_id: ID счёта или None для сводки по всем счетам
+        :param period: "day", "week", "month" или "year"
+        :param day: любой день периода (количество дней от 01.01.1970)
+        :param rates: курсы для сводки по всем счетам (см. SummaryRepository.periods)
+        :return: список кортежей (ID категории, доходы, расходы, количество транзакций)
+        """
+        start, end = period_bounds(period, day)
+        if account_id is None:
+            query = self.SELECT_ALL_MONTHS_CATEGORIES if period in self.MONTHLY_PERIODS else self.SELECT_ALL_CATEGORIES
+        else:
+            query = self.SELECT_MONTHS_CATEGORIES if period in self.MONTHLY_PERIODS else self.SELECT_CATEGORIES
+
+        # В monthly_totals транзакции без категории хранятся под ID 0
+        return [(row[0] or None, Money(round(row[1])), Money(round(row[2])), row[3])
+                for row in self.db.execute(query, (self.scope(account_id, rates), start, end))]
+
+    def rebuild_monthly_totals(self):
+        """Пересчитать итоги по месяцам по всей истории транзакций, если они разошлись с транзакциями"""
+        self.db.execute("DELETE FROM monthly_totals")
+        self.db.execute(self.REBUILD_MONTHLY_TOTALS)
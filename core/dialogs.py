@@ -0,0 +1,489 @@
+from PyQt5.QtCore import QDate, pyqtSignal
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QDialog, QColorDialog, QMessageBox, QLabel, QLineEdit, QPushButton, QHBoxLayout
+
+from core.database import Account, AccountRepository, Money, Transaction
+from core.widgets import AccountInfo, AccountsList, TransactionInfo, default_color, no_category
+from ui.add_transaction_dialog import Ui_Dialog as AddTransactionDialogUi
+from ui.create_account_widget import Ui_CreateAccountDialog as CreateAccountDialogUi
+
+
+# Диалоги. Модуль импортируется при первом открытии диалога, а не при запуске программы
+class AddTransactionDialog(QDialog, AddTransactionDialogUi):
+    def __init__(self, accounts, categories, account_id=0, *args, **kwargs):
+        """
+        Диалоговое окно для добавления транзакции
+
+        :param accounts: database.Registry со всеми доступными счетами
+        :param categories: database.Registry со всеми доступными категориями
+        :param account_id: ID аккаунта, который будет поставлен по умолчанию при запуске окна
+        """
+        super(AddTransactionDialog, self).__init__(*args, **kwargs)
+        self.setupUi(self)
+        self.setWindowIcon(QIcon("icon.ico"))
+        self.setWindowTitle("Добавить транзакцию")
+
+        # Основные переменные
+        self.accounts = accounts
+        self.categories = categories
+
+        self.account = accounts.get(account_id, self.accounts[0])
+        self.category = no_category
+
+        self.transaction = Transaction(0, self.account.id, 0, 0, QDate.currentDate())
+
+        # Виджеты, которые не были добавлены изначально
+
+        # Показываем, как будет выглядить количество денег на счету после транзакции
+        self.main_layout.insertWidget(0, QLabel("Счёт после транзакции:"))
+        self.account_info = AccountInfo(self.account)
+        self.main_layout.insertWidget(1, self.account_info)
+
+        # Информация о транзакции
+        self.main_layout.insertWidget(2, QLabel("Транзакция:"))
+        self.transaction_info = TransactionInfo(self.transaction, self.account, self.category)
+        self.main_layout.insertWidget(3, self.transaction_info)
+
+        # Заметка к транзакции, по ней работает поиск
+        self.note_line_edit = QLineEdit()
+        self.form_layout.addRow("Заметка:", self.note_line_edit)
+
+        # Ставим дату транзакции
+        self.date_edit.setDate(self.transaction.date)
+        self.date_edit.setMaximumDate(self.transaction.date)
+
+        # Ставим элементы выпадающих списков
+
+        # Список аккаунтов
+        for account in self.accounts:
+            self.account_combobox.addItem(account.name, account.id)
+        self.account_combobox.setCurrentIndex(self.account_combobox.findData(self.account.id))
+
+        # Список категорий транзакций
+        self.category_combobox.addItem(no_category.name, no_category.id)
+        for category in categories:
+            self.category_combobox.addItem(category.name, category.id)
+
+        # Подключаем функции к элементам интерфейса
+        self.add_button.clicked.connect(self.accept)
+        self.cancel_button.clicked.connect(self.reject)
+        self.money_spinbox.valueChanged.connect(self.money_changed)
+        self.category_combobox.currentIndexChanged.connect(self.category_changed)
+        self.account_combobox.currentIndexChanged.connect(self.account_changed)
+        self.date_edit.dateChanged.connect(self.date_changed)
+        self.date_checkbox.stateChanged.connect(self.date_checkbox_state_changed)
+        self.note_line_edit.textChanged.connect(self.note_changed)
+
+    def check_data(self):
+        """Проверяем данные формы. Если данные недействительны, то кнопка 'Добавить' будет выключена"""
+        if self.transaction.money != 0:
+            state = False
+        else:
+            state = True
+
+        self.add_button.setDisabled(state)
+
+    def money_changed(self, value):
+        """Когда мы изменяем количество денег в транзакции"""
+        self.transaction.money = Money.from_major(value)
+
+        self.transaction_info.set_money(self.transaction.money)
+        self.account_info.set_money(self.account.money + self.transaction.money)
+
+        self.check_data()
+
+    def category_changed(self, index):
+        """Когда мы изменяем категорию"""
+        self.category = self.categories.get(self.category_combobox.itemData(index), no_category)
+        self.transaction_info.set_category(self.category)
+        self.transaction.category_id = self.category.id
+
+        self.check_data()
+
+    def account_changed(self, index):
+        """Когда мы изменяем счёт"""
+        account = self.accounts.get(self.account_combobox.itemData(index))
+        self.account = account
+        self.account_info.change_account(self.account)
+        self.account_info.set_money(self.account.money + self.transaction.money)
+
+        self.check_data()
+
+    def date_changed(self, date):
+        """Когда мы изменяем дату"""
+        self.transaction.date = date
+        self.transaction_info.set_date(date)
+
+        self.check_data()
+
+    def note_changed(self, text):
+        """Когда мы изменяем заметку"""
+        self.transaction.note = text.strip() or None
+
+        self.check_data()
+
+    def date_checkbox_state_changed(self, state):
+        """Когда мы выключаем или включаем дату"""
+        date = None if not state else self.date_edit.date()
+
+        self.date_edit.setDisabled(not state)
+        self.transaction_info.set_date(date)
+        self.transaction.date = date
+
+        self.check_data()
+
+
+class EditTransactionDialog(AddTransactionDialog):
+    def __init__(self, accounts, categories, account_id=0, category_id=0, money=0, date=None, note=None,
+                 *args, **kwargs):
+        """
+        Диалоговое окно для редактирования транзакции
+
+        :param accounts: database.Registry со всеми доступными счетами
+        :param categories: database.Registry со всеми доступными категориями
+        :param account_id: ID аккаунта, который будет поставлен по умолчанию
+        :param category_id: ID категории, который будет поставлен по умолчанию
+        :param money: количетсво денег в транзакции, которая будет поставлена по умолчанию
+        :param date: дата транзакции, которая будет поставлена по умолчанию (если None, то дата не поставлена)
+        :param note: заметка к транзакции, которая будет поставлена по умолчанию
+        """
+        super(EditTransactionDialog, self).__init__(accounts, categories, account_id, *args, **kwargs)
+
+        # Каждый раз при изменении каких-либо данных, введёные данные будут сравниваться отсюда
+        self.default_settings = {
+            "account_id": account_id,
+            "category_id": category_id,
+            "money": money,
+            "date": date,
+            "note": note
+        }
+
+        # Ставим соотвествующие название кнопки и окна диалога
+        self.setWindowTitle("Редактировать транзакцию")
+        self.add_button.setText("Сохранить")
+
+        # Изменяем данные в соотвествии с данными транзакции
+        self.transaction_info.set_money(money)
+        self.transaction_info.set_date(date)
+        self.money_spinbox.setValue(money.major)
+        if date is None:
+            self.date_checkbox.setChecked(False)
+        else:
+            self.date_edit.setDate(date)
+        self.category = categories.get(category_id, no_category)
+        self.category_combobox.setCurrentIndex(self.category_combobox.findData(self.category.id))
+        self.note_line_edit.setText(note or "")
+
+        # Переменная, которая указывает, что транзакцию должна быть удаленна
+        self.deleted = False
+
+        # Добавляем допольнительную кнопку - удалить транзакцию
+        self.delete_button = QPushButton("Удалить", self)
+        self.delete_button.clicked.connect(self.set_as_deleted)
+        self.buttons_layout.insertWidget(0, self.delete_button)
+
+    def check_data(self):
+        """Проверяем данные формы. Если данные недействительны, то кнопка 'Сохранить' будет выключена"""
+        state = True
+
+        if self.transaction.money != 0:
+            if self.default_settings["money"] != self.transaction.money:
+                state = False
+            elif not self.default_settings["category_id"] == self.category.id:
+                state = False
+            elif self.account.id != self.default_settings["account_id"]:
+                state = False
+            elif self.transaction.date != self.default_settings["date"]:
+                state = False
+            elif self.transaction.note != self.default_settings["note"]:
+                state = False
+
+        self.add_button.setDisabled(state)
+
+    def set_as_deleted(self):
+        """Когда пользователь хочет удалить транзакцию"""
+        dialog = QMessageBox.warning(
+            self,
+            "Удаление транзакции",
+            "Вы точно хотите удалить данную транзакцию?",
+            QMessageBox.Yes | QMessageBox.Cancel,
+            QMessageBox.Yes
+        )
+
+        # Если пользователь решил, что транзакцию нужно удалить, то пометим это и закроем окно
+        if dialog == QMessageBox.Yes:
+            self.deleted = True
+            self.accept()
+
+
+class CreateAccountDialog(QDialog, CreateAccountDialogUi):
+    def __init__(self, accounts, currencies, *args, **kwargs):
+        """
+        Виджет предназначенный для создания нового счёта
+
+        :param accounts: database.Registry со всеми доступными счетами
+        :param categories: database.Registry со всеми доступными категориями
+        """
+        super(CreateAccountDialog, self).__init__(*args, **kwargs)
+        self.setupUi(self)
+        self.setWindowIcon(QIcon("icon.ico"))
+        self.setWindowTitle("Создать счёт")
+
+        # Основные переменные
+        self.accounts = accounts
+        self.currencies = currencies
+
+        self.account = Account(0, None, default_color, currencies[0].short_name, 0)
+
+        # Показываем, как будет выглядить счёт после создания
+        self.account_info = AccountInfo(self.account)
+        self.account_info.set_name("Без названия")
+        self.main_layout.insertWidget(0, self.account_info)
+
+        for currency in self.currencies:
+            self.currency_combobox.addItem(currency.name, currency.short_name)
+
+        # Подключаем функции к элементам интерфейса
+        self.add_button.clicked.connect(self.accept)
+        self.cancel_button.clicked.connect(self.reject)
+        self.money_spinbox.valueChanged.connect(self.money_changed)
+        self.name_line_edit.textChanged.connect(self.name_changed)
+        self.currency_combobox.currentIndexChanged.connect(self.currency_changed)
+        self.change_color_button.clicked.connect(self.change_color)
+
+    def check_data(self):
+        """Проверяем данные формы. Если данные недействительны, то кнопка 'Добавить' будет выключена"""
+        state = True
+
+        # Ищем, чтобы имя нового счёта не совпадало с другими именами счетов
+        if self.account.name is not None:
+            for account in self.accounts:
+                if account.name == self.account.name:
+                    break
+            else:
+                state = False
+
+        self.add_button.setDisabled(state)
+
+    def money_changed(self, value):
+        """Когда мы изменяем начальное количество денег на счёте"""
+        self.account.money = Money.from_major(value)
+        self.account_info.set_money(self.account.money)
+
+        self.check_data()
+
+    def name_changed(self, value):
+        """Когда мы изменяем название счёта"""
+        # Если поле не пустое
+        if value:
+            self.account_info.set_name(value)
+            self.account.name = value
+        else:
+            self.account_info.set_name("Нет названия")
+            self.account.name = None
+
+        self.check_data()
+
+    def currency_changed(self, index):
+        """Когда мы изменяем валюту счёта"""
+        currency = self.currencies.get(self.currency_combobox.itemData(index))
+        self.account.currency = currency.short_name
+        self.account_info.set_currency(currency.short_name)
+
+        self.check_data()
+
+    def change_color(self):
+        """Когда мы изменяем цвет счёта"""
+        color = QColorDialog.getColor(self.account.color)
+        if color.isValid():
+            self.account.color = color
+            self.account_info.set_color(color)
+
+        self.check_data()
+
+
+class EditAccountDialog(CreateAccountDialog):
+    def __init__(self, accounts, currencies, name, color, money, currency, *args, deletable=True, **kwargs):
+        """
+        Виджет предназначенный для создания нового счёта
+
+        :param accounts: database.Registry со всеми доступными счетами
+        :param categories: database.Registry со всеми доступными категориями
+        :param name: название счёта, которое будет поставлено по умолчанию
+        :param color: QColor цвет, который будет поставлен по умолчанию
+        :param money: количество денег на счету, которое будет поставлено по умолчанию
+        :param currency: валюта счёта, которая будет поставлена по умолчанию
+        :param deletable: False, если счёт нельзя удалить, например, другие счета уже удаляются
+        """
+        super(EditAccountDialog, self).__init__(accounts, currencies, *args, **kwargs)
+
+        # Ставим соотвествующие название кнопки и окна диалога
+        self.setWindowTitle("Редактировать транзакцию")
+        self.add_button.setText("Сохранить")
+        self.money_label.setText("Сумма:")
+
+        # Настройки счёта, которые были в момент открытия окна диалога. По этим настройкам будет идти сравнение, изменил
+        # ли пользователь что-то или нет
+        self.default_settings = {
+            "name": name,
+            "color": color,
+            "money": money,
+            "currency": currency
+        }
+
+        # Переменная, которая указывает, что транзакцию должна быть удаленна
+        self.deleted = False
+
+        # Добавляем допольнительную кнопку - удалить транзакцию
+        self.delete_button = QPushButton("Удалить", self)
+        self.delete_button.clicked.connect(self.set_as_deleted)
+        self.buttons_layout.insertWidget(0, self.delete_button)
+
+        # Если у пользователя всего один счёь, то выключаем кнопку "Удалить". У пользователя должен быть как минимум
+        # один счёт
+        if len(accounts) == 1 or not deletable:
+            self.delete_button.setDisabled(True)
+
+        # Вставляем в формы информацию о счёте
+        self.name_line_edit.setText(name)
+        self.currency_combobox.setCurrentIndex(self.currency_combobox.findData(currency))
+        self.account.color = color
+        self.account_info.set_color(color)
+        self.money_spinbox.setValue(money.major)
+
+        self.account_info.change_account(self.account)
+
+    def check_data(self):
+        """Проверяем данные формы. Если данные недействительны, то кнопка 'Сохранить' будет выключена"""
+        state = True
+
+        # Ищем, чтобы имя нового счёта не совпадало с другими именами счетов
+        if self.account.name is not None and self.account.name != self.default_settings["name"] and \
+                self.account.name not in [x.name for x in self.accounts]:
+            state = False
+        elif self.account.money != self.default_settings["money"]:
+            state = False
+        elif self.account.color != self.default_settings["color"]:
+            state = False
+        elif self.account.currency != self.default_settings["currency"]:
+            state = False
+
+        self.add_button.setDisabled(state)
+
+    def set_as_deleted(self):
+        dialog = QMessageBox.warning(
+            self,
+            "Удаление счёта",
+            "Вы точно хотите удалить данный счёт?",
+            QMessageBox.Yes | QMessageBox.Cancel,
+            QMessageBox.Yes
+        )
+
+        # Если пользователь решил, что транзакцию нужно удалить, то пометим это и закроем окно
+        if dialog == QMessageBox.Yes:
+            self.deleted = True
+            self.accept()
+
+
+class ListAccountsDialog(QDialog):
+    changed = pyqtSignal()  # изменение счёта сохранено в базе данных и поставлено в справочник счетов
+
+    def __init__(self, executor, accounts, currencies, *args, **kwargs):
+        """
+        Диалог, который показывает список счетов, которые есть у пользователя. Изменения сохраняются в фоновом потоке,
+        поэтому сигнал changed может прийти и после того, как диалог закрыт. Пока изменения счёта сохраняются, его
+        элемент в списке выключен, поэтому диалог стоит открывать заново, а не создавать новый
+
+        :param executor: worker.DatabaseExecutor, через который выполняются запросы к базе данных
+        :param accounts: database.Registry со всеми доступными счетами
+        :param categories: database.Registry со всеми доступными категориями
+        """
+        super(ListAccountsDialog, self).__init__(*args, **kwargs)
+        self.resize(423, 194)
+        self.setWindowTitle("Список счетов")
+        self.setWindowIcon(QIcon("icon.ico"))
+
+        # Ставим основные переменные
+        self.executor = executor
+        self.accounts = accounts
+        self.currencies = currencies
+        self.pending = set()  # ID счетов, изменения которых ещё сохраняются
+        self.deleting = set()  # ID счетов, которые ещё удаляются
+
+        # Создаем виджет для вывода списка счетов на данный момент
+        self.main_layout = QHBoxLayout(self)
+        self.accounts_list_widget = AccountsList(self)
+        self.main_layout.addWidget(self.accounts_list_widget)
+
+        # Ставим счета
+        self.set_accounts()
+
+    def set_accounts(self):
+        """Сортируем счета по алфавитному порядку и ставим их в списке"""
+        self.accounts_list_widget.set_accounts(reversed(self.accounts.list()), self.edit_account, self.pending)
+
+    def edit_account(self, original_account):
+        """Когда пользователь редактирует счёт"""
+        if original_account.id in self.pending:
+            return
+
+        # Счета, которые ещё удаляются, не считаются: у пользователя должен остаться как минимум один счёт
+        dialog = EditAccountDialog(self.accounts, self.currencies, original_account.name, original_account.color,
+                                   original_account.money, original_account.currency,
+                                   deletable=len(self.accounts) - len(self.deleting) > 1)
+
+        if dialog.exec_():
+            account = dialog.account
+            account.id = original_account.id
+
+            self.pending.add(account.id)
+            if dialog.deleted:
+                self.deleting.add(account.id)
+            self.accounts_list_widget.set_pending(account.id, True)
+
+            def finished():
+                self.pending.discard(account.id)
+                self.deleting.discard(account.id)
+                self.accounts_list_widget.set_pending(account.id, False)
+
+            # Изменения в базе данных делаются в фоновом потоке, так как удаление счёта с большой историей транзакций
+            # занимает время
+            def save(db):
+                repository = AccountRepository(db)
+                with repository.atomic():
+                    if dialog.deleted:
+                        repository.delete(account.id)
+                    else:
+                        repository.update(account)
+
+            # Справочник счетов и список в диалоге меняются только после того, как изменения сохранены. Иначе при ошибке
+            # программа показывала бы счёт, которого нет в базе данных
+            def saved(result):
+                finished()
+
+                # Если пользотель нажал на кнопку "удалить". В диалоге обновляется только элемент изменённого счёта
+                if dialog.deleted:
+                    # Удаляем счёт из справочника счетов
+                    self.accounts.remove(account.id)
+                    self.accounts_list_widget.remove_account(account.id)
+                elif self.accounts.get(account.id) is original_account:
+                    # Изменяем счёт в справочнике счетов на месте, чтобы изменения увидели все, кто на него ссылается
+                    original_account.name = account.name
+                    original_account.color = account.color
+                    original_account.currency = account.currency
+                    original_account.money = account.money
+                    self.accounts.changed()
+
+                    self.accounts_list_widget.update_account(original_account,
+                                                             self.accounts.list().index(original_account))
+
+                self.changed.emit()
+
+            def failed(error):
+                finished()
+
+                action = "удалить" if dialog.deleted else "изменить"
+                QMessageBox.warning(self, "Список счетов",
+                                    f"Не удалось {action} счёт «{original_account.name}»: {error}")
+
+            self.executor.submit(save, saved, error_callback=failed)
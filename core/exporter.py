@@ -0,0 +1,196 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date, timedelta
+from functools import lru_cache
+
+from core.database import TransactionRepository, connect, default_path, migrate
+
+
+chunk_size = 10000  # сколько строк забирается из курсора за один fetchmany
+
+epoch = date(1970, 1, 1)
+
+columns = ("id", "date", "account", "currency", "category", "amount", "note")  # колонки выгрузки
+
+
+class ExportError(ValueError):
+    """Историю не удалось выгрузить"""
+
+
+@lru_cache(maxsize=4096)
+def format_date(days):
+    """
+    Перевести дату из базы данных в строку ГГГГ-ММ-ДД. Различных дат намного меньше, чем транзакций, поэтому результат
+    запоминается
+
+    :param days: количество дней от 01.01.1970 или None
+    :return: строка (пустая, если даты нет)
+    """
+    return (epoch + timedelta(days=days)).isoformat() if days is not None else ""
+
+
+def format_money(money):
+    """
+    Перевести сумму в копейках в строку в рублях с двумя знаками после точки. Перевод целочисленный, поэтому точный
+
+    :param money: целое число
+    :return: строка
+    """
+    units, cents = divmod(abs(money), 100)
+    return f"{'-' if money < 0 else ''}{units}.{cents:02d}"
+
+
+# Запись в файл. Каждая функция получает поток списков строк из TransactionRepository.export
+def write_csv(chunks, file):
+    """
+    Записать выгрузку в CSV. Заголовок и формат даты понимает core.importer, поэтому выгрузку можно импортировать
+    обратно
+
+    :param chunks: поток списков строк
+    :param file: открытый текстовый файл
+    """
+    writer = csv.writer(file)
+    writer.writerow(columns)
+
+    for chunk in chunks:
+        writer.writerows((id, format_date(day), account, currency, category or "", format_money(money), note or "")
+                         for id, day, account, currency, category, money, note in chunk)
+
+
+def write_ndjson(chunks, file):
+    """
+    Записать выгрузку в NDJSON: по одному объекту JSON на строку
+
+    :param chunks: поток списков строк
+    :param file: открытый текстовый файл
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False)
+
+    for chunk in chunks:
+        file.writelines(encoder.encode({
+            "id": id, "date": format_date(day) or None, "account": account, "currency": currency, "category": category,
+            "amount": money / 100, "note": note
+        }) + "\n" for id, day, account, currency, category, money, note in chunk)
+
+
+def write_parquet(chunks, file):
+    """
+    Записать выгрузку в Parquet. Нужен пакет pyarrow, который импортируется только здесь, поэтому без него остальные
+    форматы работают. Каждая часть строк записывается отдельной группой строк. Сумма хранится как decimal(18, 2), дата -
+    как date32
+
+    :param chunks: поток списков строк
+    :param file: открытый двоичный файл
+    """
+    try:
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Для выгрузки в Parquet нужен пакет pyarrow (pip install pyarrow)") from None
+
+    money_type = pa.decimal128(18, 2)
+    schema = pa.schema([("id", pa.int64()), ("date", pa.date32()), ("account", pa.string()),
+                        ("currency", pa.string()), ("category", pa.string()), ("amount", money_type),
+                        ("note", pa.string())])
+
+    with pq.ParquetWriter(file, schema) as writer:
+        for chunk in chunks:
+            ids, days, accounts, currencies, categories, money, notes = zip(*chunk)
+
+            # decimal128 хранится двумя 64-битными словами, а копейки и есть значение decimal с двумя знаками после
+            # точки, поэтому массив собирается из сумм без перевода каждой в Decimal
+            words = np.empty((len(money), 2), dtype="<i8")
+            words[:, 0] = money
+            words[:, 1] = words[:, 0] >> 63
+            amounts = pa.Array.from_buffers(money_type, len(money), [None, pa.py_buffer(words)])
+
+            writer.write_batch(pa.record_batch([
+                pa.array(ids, pa.int64()), pa.array(days, pa.int32()).cast(pa.date32()),
+                pa.array(accounts, pa.string()), pa.array(currencies, pa.string()), pa.array(categories, pa.string()),
+                amounts, pa.array(notes, pa.string())
+            ], schema=schema))
+
+
+# Расширение файла -> (функция записи, двоичный ли файл)
+writers = {".csv": (write_csv, False), ".ndjson": (write_ndjson, False), ".jsonl": (write_ndjson, False),
+           ".parquet": (write_parquet, True)}
+
+
+def export_file(db, path, account_ids=None, start=None, end=None):
+    """
+    Выгрузить историю транзакций в файл. Формат выбирается по расширению. Строки забираются из курсора частями по
+    chunk_size, поэтому память не зависит от размера истории. Запись идёт во временный файл, который заменяет path
+    только после успешной выгрузки
+
+    :param db: подключение к базе данных
+    :param path: путь к файлу CSV, NDJSON (.ndjson, .jsonl) или Parquet
+    :param account_ids: ID счетов или None, если нужны все счета
+    :param start: первый день промежутка (количество дней от 01.01.1970) или None
+    :param end: последний день промежутка включительно или None
+    :return: количество выгруженных транзакций
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in writers:
+        raise ExportError(f"Неизвестный формат выгрузки: {extension}")
+
+    write, binary = writers[extension]
+    cursor = TransactionRepository(db).export(account_ids, start, end)
+    count = 0
+
+    def chunks():
+        nonlocal count
+        for chunk in iter(lambda: cursor.fetchmany(chunk_size), []):
+            count += len(chunk)
+            yield chunk
+
+    temporary = path + ".part"
+    try:
+        with open(temporary, "wb") if binary else open(temporary, "w", encoding="utf-8", newline="") as file:
+            write(chunks(), file)
+        os.replace(temporary, path)
+    except BaseException:
+        cursor.close()
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+    return count
+
+
+def parse_day(text):
+    """Дата ГГГГ-ММ-ДД из командной строки в количество дней от 01.01.1970"""
+    try:
+        return (date.fromisoformat(text) - epoch).days
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"дата должна быть в виде ГГГГ-ММ-ДД: {text}") from None
+
+
+def main(arguments=None):
+    """Выгрузка из командной строки: python -m core.exporter history.csv --account 1 --from 2020-01-01"""
+    parser = argparse.ArgumentParser(prog="python -m core.exporter", description="Выгрузка истории транзакций")
+    parser.add_argument("path", help="файл выгрузки: .csv, .ndjson, .jsonl или .parquet")
+    parser.add_argument("--db", default=default_path, help="путь к базе данных")
+    parser.add_argument("--account", type=int, action="append", dest="account_ids", metavar="ID",
+                        help="ID счёта, можно указать несколько раз (по умолчанию все счета)")
+    parser.add_argument("--from", type=parse_day, dest="start", metavar="ГГГГ-ММ-ДД", help="первый день")
+    parser.add_argument("--to", type=parse_day, dest="end", metavar="ГГГГ-ММ-ДД", help="последний день")
+    arguments = parser.parse_args(arguments)
+
+    db = connect(arguments.db)
+    try:
+        migrate(db)
+        count = export_file(db, arguments.path, arguments.account_ids, arguments.start, arguments.end)
+    except ExportError as e:
+        parser.exit(1, f"{e}\n")
+    finally:
+        db.close()
+
+    print(f"Выгружено транзакций: {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
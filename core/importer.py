@@ -0,0 +1,320 @@
+import csv
+import hashlib
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import islice
+
+from core.database import Money, TransactionRepository
+
+
+chunk_size = 1000  # сколько транзакций добавляется одним executemany
+
+epoch = date(1970, 1, 1)
+
+# Форматы дат, которые встречаются в выписках. Сначала пробуется день перед месяцем, как принято в русских банках
+csv_date_formats = ("%d.%m.%Y", "%Y-%m-%d", "%d.%m.%y", "%d/%m/%Y", "%d-%m-%Y", "%Y.%m.%d", "%d.%m.%Y %H:%M:%S",
+                    "%d.%m.%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+qif_date_formats = ("%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d")
+
+# Возможные названия колонок CSV (в нижнем регистре)
+csv_columns = {
+    "date": ("date", "дата", "дата операции", "дата платежа", "дата проводки", "booking date", "transaction date"),
+    "money": ("amount", "сумма", "сумма операции", "сумма платежа", "сумма в валюте счёта", "сумма в валюте счета"),
+    "income": ("income", "credit", "приход", "поступление", "зачисление"),
+    "outcome": ("outcome", "debit", "расход", "списание"),
+    "note": ("note", "description", "memo", "payee", "описание", "назначение платежа", "назначение", "заметка",
+             "комментарий", "описание операции"),
+    "category": ("category", "категория"),
+}
+
+
+class StatementError(ValueError):
+    """Выписку не удалось прочитать"""
+
+
+# Чтение файлов. Каждая функция - генератор словарей с ключами date, money, note, category (строки как в файле)
+def open_text(path):
+    """
+    Открыть текстовый файл выписки. Если начало файла не читается как UTF-8, то файл считается в кодировке cp1251,
+    в которой выгружают выписки многие русские банки
+
+    :param path: путь к файлу
+    :return: открытый файл
+    """
+    with open(path, "rb") as file:
+        sample = file.read(64 * 1024)
+
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Ошибка в самом конце образца может означать, что символ просто разрезан границей образца
+        if e.start < len(sample) - 3:
+            return open(path, encoding="cp1251", newline="")
+
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def read_csv(file, columns=None):
+    """
+    Прочитать выписку в формате CSV. Разделитель определяется по началу файла, а колонки - по заголовку
+
+    :param file: открытый текстовый файл
+    :param columns: словарь date/money/income/outcome/note/category -> название колонки, если заголовок не
+        распознаётся автоматически
+    """
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t|")
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(file, dialect)
+    header = [name.strip().lower() for name in next(reader, [])]
+
+    positions = {}
+    for key, names in csv_columns.items():
+        names = (columns[key].lower(),) if columns and key in columns else names
+        for name in names:
+            if name in header:
+                positions[key] = header.index(name)
+                break
+
+    if "date" not in positions or ("money" not in positions and "income" not in positions):
+        raise StatementError("В выписке не найдены колонки с датой и суммой")
+
+    def get(row, key):
+        position = positions.get(key)
+        return row[position] if position is not None and position < len(row) else ""
+
+    for row in reader:
+        if not any(row):
+            continue
+
+        if "money" in positions:
+            money = get(row, "money")
+        else:
+            # Приход и расход в разных колонках
+            money = parse_money(get(row, "income") or "0") - parse_money(get(row, "outcome") or "0")
+
+        yield {"date": get(row, "date"), "money": money, "note": get(row, "note"), "category": get(row, "category")}
+
+
+def read_ofx(file):
+    """
+    Прочитать выписку в формате OFX (и SGML, и XML). Файл читается кусками, транзакции выбираются по одной из блоков
+    <STMTTRN>
+
+    :param file: открытый текстовый файл
+    """
+    block_end = re.compile(r"</STMTTRN>", re.IGNORECASE)
+    block_start = re.compile(r"<STMTTRN>", re.IGNORECASE)
+    field = re.compile(r"<(\w+)>([^<\r\n]*)")
+    buffer = ""
+
+    for text in iter(lambda: file.read(64 * 1024), ""):
+        buffer += text
+        position = 0
+
+        for match in block_end.finditer(buffer):
+            block, position = buffer[position:match.start()], match.end()
+            start = None
+            for start in block_start.finditer(block):
+                pass
+            if start is None:
+                continue
+
+            values = {name.upper(): value.strip() for name, value in field.findall(block, start.end())}
+            note = " ".join(value for value in (values.get("NAME"), values.get("MEMO")) if value)
+
+            # DTPOSTED выглядит как 20200115120000[+3:MSK], дата - первые 8 цифр
+            yield {"date": values.get("DTPOSTED", "")[:8], "money": values.get("TRNAMT", ""), "note": note,
+                   "category": "", "id": values.get("FITID")}
+
+        buffer = buffer[position:]
+
+
+def read_qif(file):
+    """
+    Прочитать выписку в формате QIF. Каждая транзакция - несколько строк, которые начинаются с кода поля, и строка ^
+
+    :param file: открытый текстовый файл
+    """
+    record = {}
+
+    for line in file:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("!"):
+            continue
+
+        code, value = line[0], line[1:].strip()
+        if code == "^":
+            if record:
+                note = " ".join(value for value in (record.get("P"), record.get("M")) if value)
+                yield {"date": record.get("D", ""), "money": record.get("T", record.get("U", "")), "note": note,
+                       "category": record.get("L", "")}
+            record = {}
+        else:
+            record[code] = value
+
+
+readers = {".csv": read_csv, ".ofx": read_ofx, ".qfx": read_ofx, ".qif": read_qif}
+
+
+# Приведение данных
+@lru_cache(maxsize=4096)
+def parse_date(text, formats=csv_date_formats):
+    """
+    Перевести дату из выписки в количество дней от 01.01.1970. Различных дат в выписке намного меньше, чем транзакций,
+    поэтому результат запоминается, и strptime вызывается один раз на дату
+
+    :param text: дата строкой
+    :param formats: форматы для datetime.strptime, которые пробуются по порядку
+    :return: целое число или None, если даты нет
+    """
+    text = text.strip().replace("'", "/")  # в QIF год бывает записан как 1/15'20
+    if not text:
+        return None
+
+    if len(text) == 8 and text.isdigit():
+        formats = ("%Y%m%d",)  # OFX
+
+    for date_format in formats:
+        try:
+            return (datetime.strptime(text, date_format).date() - epoch).days
+        except ValueError:
+            pass
+
+    raise StatementError(f"Не удалось прочитать дату: {text}")
+
+
+def parse_money(text):
+    """
+    Перевести сумму из выписки в Money. Понимает пробелы между разрядами, запятую вместо точки и сумму в скобках как
+    отрицательную
+
+    :param text: сумма строкой (или уже Money)
+    :return: Money
+    """
+    if isinstance(text, int):
+        return Money(text)
+
+    value = text.strip().replace("\xa0", "").replace(" ", "").replace("'", "")
+    negative = value.startswith("(") and value.endswith(")")
+    value = value.strip("()")
+
+    # Если есть и точка, и запятая, то разделитель дробной части - тот, что правее
+    if "," in value and "." in value:
+        if value.rfind(".") > value.rfind(","):
+            value = value.replace(",", "")
+        else:
+            value = value.replace(".", "").replace(",", ".")
+    else:
+        value = value.replace(",", ".")
+
+    try:
+        money = Money(int((Decimal(value) * 100).to_integral_value()))
+    except InvalidOperation:
+        raise StatementError(f"Не удалось прочитать сумму: {text}") from None
+
+    return -money if negative else money
+
+
+def normalize(records, date_formats=csv_date_formats):
+    """
+    Привести даты и суммы к виду, в котором они хранятся в базе данных. Записи с нулевой суммой пропускаются
+
+    :param records: словари из read_csv/read_ofx/read_qif
+    :param date_formats: форматы дат
+    :return: генератор словарей с ключами day, money, note, category, id
+    """
+    for record in records:
+        money = parse_money(record["money"])
+        if not money:
+            continue
+
+        yield {"day": parse_date(record["date"], date_formats), "money": money,
+               "note": record["note"].strip() or None, "category": record["category"].strip(),
+               "id": record.get("id")}
+
+
+def map_categories(records, categories):
+    """
+    Подобрать ID категорий по названию из выписки
+
+    :param records: словари из normalize
+    :param categories: словарь название категории в нижнем регистре -> ID
+    :return: генератор словарей, у которых добавлен ключ category_id (None, если категория не найдена)
+    """
+    for record in records:
+        record["category_id"] = categories.get(record["category"].lower())
+        yield record
+
+
+def to_rows(records, account_id):
+    """
+    Собрать строки для TransactionRepository.add_imported. Хэш строится по счёту и данным транзакции (или по ID
+    транзакции в банке, если он есть), а одинаковые транзакции внутри выписки различаются порядковым номером, поэтому
+    повторный импорт той же выписки ничего не добавляет, а две одинаковые покупки за день не склеиваются
+
+    :param records: словари из map_categories
+    :param account_id: ID счёта, на который импортируются транзакции
+    :return: генератор кортежей (account_id, category_id, money, date, note, import_hash)
+    """
+    occurrences = {}
+
+    for record in records:
+        if record["id"]:
+            key = f"{account_id}|id|{record['id']}"
+        else:
+            key = f"{account_id}|{record['day']}|{int(record['money'])}|{record['note'] or ''}"
+            occurrences[key] = occurrences.get(key, 0) + 1
+            key += f"|{occurrences[key]}"
+
+        yield (account_id, record["category_id"], record["money"], record["day"], record["note"],
+               hashlib.sha1(key.encode("utf-8")).digest())
+
+
+def chunks(iterable, size=chunk_size):
+    """Разбить поток на списки не длиннее size"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_file(db, account_id, path, categories=None, columns=None):
+    """
+    Импортировать выписку на счёт. Файл читается потоком и добавляется пачками по chunk_size транзакций, поэтому память
+    не зависит от размера выписки. Функция не делает commit, её нужно вызывать внутри Repository.atomic, тогда выписка
+    добавится целиком или не добавится вовсе. Суммы на счёте и итоги по месяцам обновляются триггерами базы данных
+
+    :param db: подключение к базе данных
+    :param account_id: ID счёта
+    :param path: путь к файлу CSV, OFX/QFX или QIF
+    :param categories: словарь название категории в нижнем регистре -> ID
+    :param columns: названия колонок CSV (см. read_csv)
+    :return: кортеж (количество транзакций в выписке, количество добавленных)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in readers:
+        raise StatementError(f"Неизвестный формат выписки: {extension}")
+
+    repository = TransactionRepository(db)
+    read = added = 0
+
+    with open_text(path) as file:
+        records = read_csv(file, columns) if extension == ".csv" else readers[extension](file)
+        records = normalize(records, qif_date_formats if extension == ".qif" else csv_date_formats)
+        records = map_categories(records, categories or {})
+
+        for chunk in chunks(to_rows(records, account_id)):
+            read += len(chunk)
+            added += repository.add_imported(chunk)
+
+    return read, added
@@ -0,0 +1,246 @@
+import atexit
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from time import perf_counter_ns
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QLabel
+
+
+# Переменная окружения с путём к файлу, в который при выходе из программы записывается трасса. Если переменная не
+# задана, то профилировщик выключен и ничего не замеряет: декораторы возвращают функции без изменений
+environment_variable = "MONEY_PROFILE"
+
+max_events = 1000000  # больше событий в трассе не записывается, но общая статистика продолжает считаться
+query_length = 80  # до скольки символов сокращается текст запроса в статистике
+
+
+def function_name(function):
+    """Название функции для замеров: полное имя функции, а для functools.partial - имя обёрнутой функции"""
+    function = getattr(function, "func", function)
+    return getattr(function, "__qualname__", None) or repr(function)
+
+
+class Profiler:
+    def __init__(self, path=None):
+        """
+        Замеры времени работы программы. Замеряются отрезки кода (span, timed) и запросы к базе данных (trace). По
+        каждому названию копится общая статистика, а каждый отрезок записывается событием трассы в формате Chrome
+        Trace Event, который открывается в chrome://tracing или ui.perfetto.dev. Замеры идут из основного и фонового
+        потоков, поэтому статистика защищена блокировкой
+
+        :param path: путь к файлу трассы или None, если профилировщик выключен
+        """
+        self.path = path
+        self.enabled = path is not None
+
+        self.lock = threading.Lock()
+        self.start = perf_counter_ns()
+        self.events = []  # события трассы
+        self.threads = {}  # ID потока -> название потока
+        self.stats = {}  # (категория, название) -> [количество, общее время, наибольшее время] в наносекундах
+        self.queries = {}  # текст запроса -> [количество выполнений, количество строк]
+        self.current_query = threading.local()  # последний начатый запрос в каждом потоке
+
+    def record(self, category, name, start, end):
+        """
+        Записать замер отрезка
+
+        :param category: категория отрезка: sql, model, ui, callback, startup
+        :param name: название отрезка
+        :param start: время начала (perf_counter_ns)
+        :param end: время конца (perf_counter_ns)
+        """
+        duration = end - start
+        thread = threading.get_ident()
+
+        with self.lock:
+            stat = self.stats.get((category, name))
+            if stat is None:
+                stat = self.stats[category, name] = [0, 0, 0]
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = max(stat[2], duration)
+
+            if thread not in self.threads:
+                self.threads[thread] = threading.current_thread().name
+            if len(self.events) < max_events:
+                # Время в трассе - в микросекундах от запуска профилировщика
+                self.events.append({"name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": thread,
+                                    "ts": (start - self.start) / 1000, "dur": duration / 1000})
+
+    @contextmanager
+    def measure(self, name, category):
+        """Замерить блок кода (см. Profiler.span)"""
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(category, name, start, perf_counter_ns())
+
+    def span(self, name, category="ui"):
+        """
+        Контекстный менеджер, который замеряет блок кода. Если профилировщик выключен, то блок выполняется как есть
+
+        :param name: название отрезка
+        :param category: категория отрезка
+        """
+        if not self.enabled:
+            return nullcontext()
+
+        return self.measure(name, category)
+
+    def timed(self, category="ui", name=None):
+        """
+        Декоратор, который замеряет каждый вызов функции. Если профилировщик выключен, то функция возвращается без
+        изменений и не замедляется
+
+        :param category: категория отрезка
+        :param name: название отрезка, по умолчанию - полное имя функции (например, MainPage.set_transactions)
+        """
+        def decorator(function):
+            if not self.enabled:
+                return function
+
+            label = name or function.__qualname__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(category, label, start, perf_counter_ns())
+
+            return wrapper
+
+        return decorator
+
+    def trace(self, db):
+        """
+        Считать запросы к базе данных и полученные строки. Запросы считаются через set_trace_callback, а строки - через
+        row_factory, которая возвращает строки без изменений. Запросы триггеров тоже попадают в статистику
+
+        :param db: подключение к базе данных
+        """
+        if not self.enabled:
+            return
+
+        def query_started(statement):
+            text = re.sub(r"\s+", " ", statement).strip()[:query_length]
+            self.current_query.text = text
+            with self.lock:
+                query = self.queries.get(text)
+                if query is None:
+                    query = self.queries[text] = [0, 0]
+                query[0] += 1
+
+        def row_fetched(cursor, row):
+            text = getattr(self.current_query, "text", None)
+            if text is not None:
+                with self.lock:
+                    self.queries[text][1] += 1
+            return row
+
+        db.set_trace_callback(query_started)
+        db.row_factory = row_fetched
+
+    def summary(self):
+        """
+        Общая статистика замеров
+
+        :return: словарь с отрезками (по убыванию общего времени) и запросами (по убыванию количества выполнений)
+        """
+        with self.lock:
+            spans = [{"category": category, "name": name, "count": count, "total_ms": total / 1e6,
+                      "max_ms": longest / 1e6}
+                     for (category, name), (count, total, longest) in self.stats.items()]
+            queries = [{"query": text, "count": count, "rows": rows} for text, (count, rows) in self.queries.items()]
+
+        spans.sort(key=lambda span: span["total_ms"], reverse=True)
+        queries.sort(key=lambda query: query["count"], reverse=True)
+
+        return {"spans": spans, "queries": queries}
+
+    def report(self, limit=10):
+        """Короткий текстовый отчёт: самые долгие отрезки и общее количество запросов и строк"""
+        summary = self.summary()
+        lines = [f"{'':<8} {'отрезок':<44} {'раз':>6} {'всего, мс':>10} {'макс, мс':>9}"]
+        for span in summary["spans"][:limit]:
+            lines.append(f"{span['category']:<8} {span['name'][-44:]:<44} {span['count']:>6} "
+                         f"{span['total_ms']:>10.1f} {span['max_ms']:>9.1f}")
+
+        queries = sum(query["count"] for query in summary["queries"])
+        rows = sum(query["rows"] for query in summary["queries"])
+        lines.append(f"Запросов: {queries}, строк: {rows}")
+
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        """
+        Записать трассу в формате Chrome Trace Event. Общая статистика записывается в том же файле под ключом summary
+
+        :param path: путь к файлу, по умолчанию - тот, что передан при создании
+        """
+        path = path or self.path
+        if path is None:
+            return
+
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+
+        pid = os.getpid()
+        events.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}}
+                      for thread, name in threads.items())
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "summary": self.summary()}, file,
+                      ensure_ascii=False)
+
+
+class ProfilerOverlay(QLabel):
+    def __init__(self, profiler, *args, **kwargs):
+        """
+        Полупрозрачная надпись поверх окна с отчётом профилировщика, который обновляется раз в полсекунды. Надпись не
+        перехватывает нажатия мыши
+
+        :param profiler: Profiler
+        """
+        super(ProfilerOverlay, self).__init__(*args, **kwargs)
+
+        self.profiler = profiler
+
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFont(QFont("monospace", 8))
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: white; padding: 4px;")
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.update_report)
+
+    def update_report(self):
+        self.setText(self.profiler.report())
+        self.adjustSize()
+        self.raise_()
+
+    def setVisible(self, visible):
+        super(ProfilerOverlay, self).setVisible(visible)
+
+        # Пока надпись скрыта, отчёт не пересчитывается
+        if visible:
+            self.update_report()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+
+# Профилировщик программы. Включается переменной окружения, а трасса записывается при выходе из программы
+profiler = Profiler(os.environ.get(environment_variable) or None)
+if profiler.enabled:
+    atexit.register(profiler.dump)
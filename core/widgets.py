@@ -1,21 +1,111 @@
-from functools import partial
+from functools import partial, lru_cache
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QPoint, QTimer, QDate, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter
 from PyQt5.QtWidgets import QWidget, QScrollArea, QVBoxLayout, QSizePolicy, QSpacerItem, QLabel, QPushButton, \
-    QHBoxLayout
+    QHBoxLayout, QListView, QStyledItemDelegate, QStyle, QAbstractItemView, QComboBox, QTableWidget, QTableWidgetItem, \
+    QHeaderView, QLineEdit, QToolButton, QMenu, QDoubleSpinBox, QDateEdit, QCheckBox
+
+from core.database import Category, Money, TransactionFilter, date_to_days, days_to_date, period_bounds
+from core.profiler import profiler
 
 from ui.item_of_list_widget import Ui_Form as ItemOfListWidgetUi
 
 
 default_color = QColor(217, 217, 217)  # цвет по-умолчанию
 
+# Когда категория не была выбрана, искользуется именно  этот вид записи
+no_category = Category(None, "Без категории", default_color)
+
+tag_padding = 4  # отступ внутри тега
+tag_radius = 7  # радиус скругления углов тега
+
+# Общая таблица стилей приложения. Цвет суммы зависит от динамического свойства sign, поэтому виджетам не нужны
+# собственные таблицы стилей, которые Qt разбирал бы для каждого виджета отдельно
+stylesheet = """
+QLabel[sign="negative"] { color: red; }
+QLabel[sign="positive"] { color: green; }
+"""
+
+
+# Утилиты
+def tag_text_color(color: QColor):
+    """
+    Определяет цвет текста для тега, чтобы он был контрастен к фону
+
+    :param color: QColor, цвет фона тега
+    :return: строка с цветом текста в HEX
+    """
+    if (color.red() * 0.299 + color.green() * 0.587 + color.blue() * 0.114) > 186:
+        return "#000"
+    else:
+        return "#FFF"
+
+
+@lru_cache(maxsize=None)
+def tag_palette(rgb):
+    """
+    Цвета тега. Для каждого цвета они вычисляются один раз
+
+    :param rgb: цвет тега числом 0xRRGGBB
+    :return: кортеж (QColor фона, QColor текста)
+    """
+    color = QColor(rgb)
+    return color, QColor(tag_text_color(color))
+
+
+def tag_size(metrics, name):
+    """
+    Размер тега с названием name
+
+    :param metrics: QFontMetrics шрифта тега
+    :param name: название тега
+    :return: QSize
+    """
+    return QSize(metrics.horizontalAdvance(name) + tag_padding * 2, metrics.height() + tag_padding * 2)
+
+
+def paint_tag(painter, rect, name, rgb):
+    """
+    Нарисовать тег: плашку цвета rgb со скруглёнными углами и название по центру. Так рисуются и виджеты Tag, и теги
+    в истории транзакций
+
+    :param painter: QPainter со шрифтом тега
+    :param rect: QRect тега
+    :param name: название тега
+    :param rgb: цвет тега числом 0xRRGGBB
+    """
+    background, text = tag_palette(rgb)
+
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(background)
+    painter.drawRoundedRect(rect, tag_radius, tag_radius)
+    painter.setPen(text)
+    painter.drawText(rect, Qt.AlignCenter, name)
+
+
+def set_sign(value, *labels):
+    """
+    Поставить надписям свойство sign, от которого в общей таблице стилей зависит цвет суммы
+
+    :param value: сумма
+    :param labels: QLabel, которые нужно покрасить
+    """
+    sign = "negative" if value < 0 else "positive" if value > 0 else "zero"
+
+    for label in labels:
+        if label.property("sign") != sign:
+            label.setProperty("sign", sign)
+            # Стиль пересчитывается по уже разобранной таблице стилей приложения
+            label.style().unpolish(label)
+            label.style().polish(label)
+
 
 class Tag(QLabel):
     def __init__(self, name, color=default_color, **kwargs):
         """
         Виджет, в виде плашки с изменяемым фоном и текстом
-        Данный виджет предназначен для обозначение тега
+        Данный виджет предназначен для обозначение тега. Тег рисуется сам (см. paint_tag), без таблицы стилей
 
         :param name: строка с названием тега
         :param color: QColor, цвет тега
@@ -24,6 +114,7 @@ class Tag(QLabel):
 
         self.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
 
+        self.rgb = 0
         self.set_name(name)
         self.set_color(color)
 
@@ -34,6 +125,7 @@ class Tag(QLabel):
         :param name: новое название
         """
         self.setText(name)
+        self.updateGeometry()
 
     def set_color(self, color: QColor):
         """
@@ -41,18 +133,19 @@ class Tag(QLabel):
 
         :param color: QColor, новый цвет тега
         """
-        # Определяем насколько фон тега контрастен к белому тексту
-        if (color.red() * 0.299 + color.green() * 0.587 + color.blue() * 0.114) > 186:
-            text_color = "#000"
-        else:
-            text_color = "#FFF"
+        self.rgb = color.rgb() & 0xFFFFFF
+        self.update()
 
-        self.setStyleSheet(
-            f"background-color: {color.name(0)};"
-            f"color: {text_color};"
-            "padding: 4px;"
-            "border-radius: 7px;"
-        )
+    def sizeHint(self):
+        return tag_size(self.fontMetrics(), self.text())
+
+    def minimumSizeHint(self):
+        return self.sizeHint()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        paint_tag(painter, QRect(0, 0, self.width(), self.height()), self.text(), self.rgb)
 
 
 class AccountInfo(QWidget, ItemOfListWidgetUi):
@@ -73,6 +166,7 @@ class AccountInfo(QWidget, ItemOfListWidgetUi):
         self.account_tag = Tag(account.name, account.color)
         self.tags_layout.addWidget(self.account_tag)
 
+    @profiler.timed("ui")
     def change_account(self, account):
         """
         Изменить данные об аккаунте
@@ -91,15 +185,20 @@ class AccountInfo(QWidget, ItemOfListWidgetUi):
         :param value: новое число характеризующие количество денег на счету
         """
         self.money_label.setText(f"{value:.2f}")
+        self.money_label.setToolTip("")
 
         # Поставить красный цвет шрифта, если сумма меньше нуля
-        if value < 0:
-            style = "color: red"
-        else:
-            style = "color: black"
+        set_sign(min(value, 0), self.money_label, self.currency_label)
 
-        self.money_label.setStyleSheet(style)
-        self.currency_label.setStyleSheet(style)
+    def set_unknown_money(self, reason):
+        """
+        Показать прочерк вместо суммы, которую нельзя посчитать, например, когда для суммы на всех счетах нет курса
+
+        :param reason: почему суммы нет, показывается во всплывающей подсказке
+        """
+        self.money_label.setText("—")
+        self.money_label.setToolTip(reason)
+        set_sign(0, self.money_label, self.currency_label)
 
     def set_currency(self, value):
         """
@@ -157,19 +256,11 @@ class TransactionInfo(QWidget, ItemOfListWidgetUi):
         :param value: новое число характеризующие количество денег в транзакции
         """
         text = f"{value:.2f}"
-
-        if value < 0:
-            style = "color: red"
-        elif value > 0:
-            style = "color: green"
+        if value > 0:
             text = "+" + text
-        else:
-            style = "color: black"
 
         self.money_label.setText(text)
-
-        self.money_label.setStyleSheet(style)
-        self.currency_label.setStyleSheet(style)
+        set_sign(value, self.money_label, self.currency_label)
 
     def set_currency(self, value):
         """
@@ -198,36 +289,6 @@ class TransactionInfo(QWidget, ItemOfListWidgetUi):
         self.date_tag.set_name(date.toString("dd.MM.yyyy") if date else "Без даты")
 
 
-class TransactionInfoButton(QPushButton, TransactionInfo):
-    def __init__(self, transaction, account, category, *args, **kwargs):
-        """
-        Виджет, показывающий информацию о выполненной транзакции, а также выполняющий функцию кнопки, при нажатии на
-        которую происходит редактирование транзакции
-
-        :param account: database.account, класс ориантированный на хранение данных о счёте
-        :param transaction: database.transaction, класс ориантированный на хранение данных о транзакции
-        :param category: database.category, класс ориантированный на хранение данных о категории
-        """
-        super(TransactionInfoButton, self).__init__(transaction, account, category,
-                                                    *args, **kwargs)
-
-        self.setObjectName("TransactionInfo")
-        self.setStyleSheet(
-            "QPushButton#TransactionInfo {"
-            "   background-color: none;"
-            "   border: none;"
-            "}"
-            "QPushButton#TransactionInfo:hover {"
-            "   background-color: #ebebeb;"
-            "   border: 1px solid #dbdbdb;"
-            "}"
-            "QPushButton#TransactionInfo:pressed {"
-            "   background-color: #e3e3e3;"
-            "   border: 1px solid #dbdbdb;"
-            "}"
-        )
-
-
 class List(QScrollArea):
     def __init__(self, *args, **kwargs):
         """Виджет, который сделан для вывода виджетов в виде списка"""
@@ -259,52 +320,723 @@ class AccountItem(QWidget):
 
         layout = QHBoxLayout(self)
         # Название счёта
-        layout.addWidget(Tag(account.name, account.color, parent=self))
+        self.tag = Tag(account.name, account.color, parent=self)
+        layout.addWidget(self.tag)
         layout.addItem(QSpacerItem(0, 0, QSizePolicy.Expanding, QSizePolicy.Maximum))
         # Кнопка, при нажатии которой будет открыто окно с редактирование счёта
-        button = QPushButton("Ред.", self)
-        button.clicked.connect(partial(edit_function, account))
-        layout.addWidget(button)
+        self.edit_button = QPushButton("Ред.", self)
+        self.edit_button.clicked.connect(partial(edit_function, account))
+        layout.addWidget(self.edit_button)
 
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
 
+    def set_account(self, account):
+        """
+        Обновить название и цвет счёта
+
+        :param account: database.Account
+        """
+        self.tag.set_name(account.name)
+        self.tag.set_color(account.color)
+
+    def set_pending(self, pending):
+        """
+        Выключить элемент, пока изменения счёта сохраняются, чтобы счёт нельзя было изменить ещё раз
+
+        :param pending: True, если изменения ещё сохраняются
+        """
+        self.setDisabled(pending)
+        self.edit_button.setDisabled(pending)
+        self.setToolTip("Изменения счёта сохраняются" if pending else "")
+
 
 class AccountsList(List):
-    """Виджет ориентирован на показ списка счетов"""
+    def __init__(self, *args, **kwargs):
+        """Виджет ориентирован на показ списка счетов. Элементы списка ищутся по ID счёта"""
+        super(AccountsList, self).__init__(*args, **kwargs)
 
-    def set_accounts(self, accounts, edit_function):
+        self.items = {}  # ID счёта -> AccountItem
+
+    def set_accounts(self, accounts, edit_function, pending=()):
         """
         Вставить счета в список
 
         :param accounts: список, содержащий все доступные счета
         :param edit_function: функция, которая будет вызываться при нажатии на кпопку 'Ред.' напротив названия счёта
+        :param pending: ID счетов, изменения которых ещё сохраняются (см. AccountItem.set_pending)
         """
         # Если в списке есть какие-то элементы, то они будут удалены
-        for i in range(self.items_layout.count()):
-            item = self.items_layout.itemAt(i).widget()
-
-            if type(item) is AccountItem:
-                item.deleteLater()
+        for item in self.items.values():
+            item.deleteLater()
+        self.items = {}
 
         for acc in accounts:
-            self.items_layout.insertWidget(0, AccountItem(acc, edit_function))
+            self.items[acc.id] = AccountItem(acc, edit_function)
+            self.items[acc.id].set_pending(acc.id in pending)
+            self.items_layout.insertWidget(0, self.items[acc.id])
+
+    def set_pending(self, account_id, pending):
+        """
+        Выключить или включить элемент счёта (см. AccountItem.set_pending). Счёта может уже не быть в списке
+
+        :param account_id: ID счёта
+        :param pending: True, если изменения счёта ещё сохраняются
+        """
+        item = self.items.get(account_id)
+        if item is not None:
+            item.set_pending(pending)
+
+    def update_account(self, account, index):
+        """
+        Обновить элемент списка одного счёта, не пересоздавая остальные
+
+        :param account: database.Account, изменённый счёт
+        :param index: позиция счёта в списке после изменения (например, название поменялось)
+        """
+        item = self.items.get(account.id)
+        if item is None:
+            return  # счёт уже убран из списка
+
+        item.set_account(account)
+
+        if self.items_layout.indexOf(item) != index:
+            self.items_layout.removeWidget(item)
+            self.items_layout.insertWidget(index, item)
+
+    def remove_account(self, account_id):
+        """
+        Убрать счёт из списка
+
+        :param account_id: ID счёта
+        """
+        item = self.items.pop(account_id, None)
+        if item is None:
+            return
+
+        self.items_layout.removeWidget(item)
+        item.deleteLater()
+
+
+class TransactionsModel(QAbstractListModel):
+    TransactionRole = Qt.UserRole + 1  # роль, по которой модель отдаёт database.Transaction
+    CategoryRole = Qt.UserRole + 2  # роль, по которой модель отдаёт database.Category
+
+    page_size = 50  # сколько транзакций подгружается за один раз
+
+    def __init__(self, *args, **kwargs):
+        """
+        Модель истории транзакций. Хранит только данные о транзакциях, а виджеты для них не создаются вовсе - каждую
+        видимую строку рисует TransactionDelegate. Транзакции подгружаются страницами, когда список прокручен до конца
+        """
+        super(TransactionsModel, self).__init__(*args, **kwargs)
+
+        self.account = None
+        self.accounts = None  # справочник счетов, если в истории транзакции разных счетов
+        self.fetch = None
+        self.transactions = []
+        self.exhausted = True  # True, если вся история уже загружена
+        self.loading = False  # True, пока загружается очередная страница
+        self.generation = 0  # номер источника транзакций, страницы от прежних источников отбрасываются
+
+    @profiler.timed("model")
+    def set_transactions(self, account, fetch, load=True, accounts=None):
+        """
+        Поставить источник транзакций в модель и загрузить первую страницу
+
+        :param account: database.Account, счёт, к которому относятся транзакции
+        :param fetch: функция fetch(after, count, callback), которая загружает не больше count пар
+            (database.Transaction, database.Category), идущих в истории после транзакции after (или с самого начала,
+            если after равен None), и передаёт их списком в callback. Загрузка может идти в другом потоке
+        :param load: если False, то первая страница не запрашивается через fetch, а передаётся в
+            add_page(generation, transactions) извне, например, загружается одним запросом для нескольких списков
+        :param accounts: database.Registry со счетами, если это общая история всех счетов. Тогда account - это все
+            счета вместе, а валюта и название каждой транзакции берутся из её счёта
+        :return: номер источника транзакций для add_page
+        """
+        self.beginResetModel()
+        self.account = account
+        self.accounts = accounts
+        self.fetch = fetch
+        self.transactions = []
+        self.exhausted = False
+        self.loading = not load
+        self.generation += 1
+        self.endResetModel()
+
+        if load:
+            self.fetchMore(QModelIndex())
+
+        return self.generation
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+
+        return not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted or self.loading:
+            return
+
+        # Следующая страница начинается сразу после последней показанной транзакции
+        after = self.transactions[-1][0] if self.transactions else None
+        self.loading = True
+        self.fetch(after, self.page_size, partial(self.add_page, self.generation))
+
+    @profiler.timed("model")
+    def add_page(self, generation, transactions):
+        """
+        Добавить загруженную страницу транзакций в конец модели
+
+        :param generation: номер источника, для которого загружалась страница
+        :param transactions: список пар (database.Transaction, database.Category)
+        """
+        if generation != self.generation:
+            return  # страница загружалась для прежнего счёта
+
+        self.loading = False
+
+        if len(transactions) < self.page_size:
+            self.exhausted = True
+
+        if transactions:
+            self.beginInsertRows(QModelIndex(), len(self.transactions), len(self.transactions) + len(transactions) - 1)
+            self.transactions.extend(transactions)
+            self.endInsertRows()
+
+    @staticmethod
+    def sort_key(transaction):
+        """Порядок транзакций в истории: сначала ближайшие по дате, транзакции без даты в конце"""
+        return transaction.day is None, -(transaction.day or 0), -transaction.id
+
+    def position(self, transaction):
+        """
+        Найти двоичным поиском место транзакции среди загруженных
+
+        :param transaction: database.Transaction
+        :return: номер строки, на которой стоит или должна стоять транзакция
+        """
+        key = self.sort_key(transaction)
+        low, high = 0, len(self.transactions)
+
+        while low < high:
+            middle = (low + high) // 2
+            if self.sort_key(self.transactions[middle][0]) < key:
+                low = middle + 1
+            else:
+                high = middle
 
+        return low
 
-class TransactionList(List):
-    """Виджет ориентирован на показ списка транзакции"""
+    @profiler.timed("model")
+    def insert_transaction(self, transaction, category):
+        """
+        Вставить одну транзакцию на её место в истории
+
+        :param transaction: database.Transaction
+        :param category: database.Category, категория транзакции
+        """
+        row = self.position(transaction)
+
+        # Если транзакция попадает после последней загруженной, то она придёт со следующей страницей
+        if row == len(self.transactions) and not self.exhausted:
+            return
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.transactions.insert(row, (transaction, category))
+        self.endInsertRows()
+
+    @profiler.timed("model")
+    def remove_transaction(self, transaction):
+        """
+        Убрать одну транзакцию из истории
 
-    def set_transactions(self, transactions):
+        :param transaction: database.Transaction с теми же ID и датой, что и в истории
+        """
+        row = self.position(transaction)
+
+        if row < len(self.transactions) and self.transactions[row][0].id == transaction.id:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.transactions[row]
+            self.endRemoveRows()
+
+    def account_of(self, transaction):
+        """Счёт, к которому относится транзакция"""
+        if self.accounts is None:
+            return self.account
+
+        return self.accounts.get(transaction.account_id, self.account)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.transactions)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        transaction, category = self.transactions[index.row()]
+
+        if role == self.TransactionRole:
+            return transaction
+        elif role == self.CategoryRole:
+            return category
+        elif role == Qt.DisplayRole:
+            return f"{transaction.money:.2f} {self.account_of(transaction).currency}"
+
+        return None
+
+
+class TransactionDelegate(QStyledItemDelegate):
+    height = 66  # высота строки, такая же, как у TransactionInfo
+
+    def __init__(self, *args, **kwargs):
+        """
+        Рисует строку истории транзакций: сумму, валюту, заметку, тег категории и тег даты, а в общей истории всех
+        счетов ещё и тег счёта. Внешний вид повторяет TransactionInfo
+        """
+        super(TransactionDelegate, self).__init__(*args, **kwargs)
+
+        self.money_font = QFont("Nirmala UI", 14)
+        self.currency_font = QFont("Microsoft YaHei UI", 12)
+        self.tag_font = QFont()
+        self.tag_metrics = QFontMetrics(self.tag_font)
+        self.note_color = QColor("gray")
+        self.default_rgb = default_color.rgb() & 0xFFFFFF
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.height)
+
+    @profiler.timed("paint")
+    def paint(self, painter, option, index):
+        transaction = index.data(TransactionsModel.TransactionRole)
+        category = index.data(TransactionsModel.CategoryRole)
+        model = index.model()
+        account = model.account_of(transaction)
+
+        painter.save()
+        painter.setRenderHint(painter.Antialiasing)
+
+        # Фон выбранной строки, а у остальных - фон при наведении, как у кнопки
+        if option.state & QStyle.State_Selected:
+            painter.setPen(QColor("#99c9ff"))
+            painter.setBrush(QColor("#cce4ff"))
+            painter.drawRect(option.rect.adjusted(0, 0, -1, -1))
+        elif option.state & QStyle.State_MouseOver:
+            painter.setPen(QColor("#dbdbdb"))
+            painter.setBrush(QColor("#ebebeb"))
+            painter.drawRect(option.rect.adjusted(0, 0, -1, -1))
+
+        rect = option.rect.adjusted(4, 2, -4, -2)
+
+        # Сумма транзакции и валюта
+        text = f"{transaction.money:.2f}"
+        if transaction.money < 0:
+            color = QColor("red")
+        elif transaction.money > 0:
+            color = QColor("green")
+            text = "+" + text
+        else:
+            color = QColor("black")
+
+        painter.setPen(color)
+        painter.setFont(self.money_font)
+        money_height = QFontMetrics(self.money_font).height()
+        money_rect = QRect(rect.left(), rect.top(), rect.width(), money_height)
+        painter.drawText(money_rect, Qt.AlignLeft | Qt.AlignVCenter, text)
+
+        money_width = QFontMetrics(self.money_font).horizontalAdvance(text)
+        painter.setFont(self.currency_font)
+        currency_rect = money_rect.adjusted(money_width + 6, 0, 0, 0)
+        painter.drawText(currency_rect, Qt.AlignLeft | Qt.AlignVCenter, account.currency)
+
+        # Заметка после валюты, обрезанная по ширине строки
+        if transaction.note:
+            currency_width = QFontMetrics(self.currency_font).horizontalAdvance(account.currency)
+            note_rect = currency_rect.adjusted(currency_width + 8, 0, 0, 0)
+            painter.setPen(self.note_color)
+            painter.setFont(self.tag_font)
+            painter.drawText(note_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                             self.tag_metrics.elidedText(transaction.note, Qt.ElideRight, note_rect.width()))
+
+        # Теги счёта (только в общей истории), категории и даты
+        tags_top = money_rect.bottom() + 6
+        painter.setFont(self.tag_font)
+        left = rect.left()
+        if model.accounts is not None:
+            left = self.paint_tag(painter, left, tags_top, account.name, account.rgb) + 6
+        left = self.paint_tag(painter, left, tags_top, category.name, category.rgb)
+        self.paint_tag(painter, left + 6, tags_top,
+                       transaction.date.toString("dd.MM.yyyy") if transaction.date else "Без даты", self.default_rgb)
+
+        painter.restore()
+
+    def paint_tag(self, painter, left, top, name, rgb):
+        """
+        Нарисовать тег так же, как выглядит виджет Tag
+
+        :return: правая граница нарисованного тега
+        """
+        rect = QRect(QPoint(left, top), tag_size(self.tag_metrics, name))
+        paint_tag(painter, rect, name, rgb)
+
+        return rect.right()
+
+
+class TransactionList(QListView):
+    def __init__(self, *args, **kwargs):
+        """
+        Виджет ориентирован на показ списка транзакции. Строки рисуются делегатом, поэтому количество виджетов не
+        зависит от длины истории. Несколько транзакций выбираются с зажатым Ctrl или Shift, а действия над ними
+        вызываются из контекстного меню
+        """
+        super(TransactionList, self).__init__(*args, **kwargs)
+
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.Expanding)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setUniformItemSizes(True)  # все строки одной высоты, поэтому Qt не опрашивает каждую строку
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.setMouseTracking(True)
+
+        self.setModel(TransactionsModel(self))
+        self.setItemDelegate(TransactionDelegate(self))
+
+    @profiler.timed("ui")
+    def set_transactions(self, account, fetch, load=True, accounts=None):
         """
         Вставить транзакции в список
 
-        :param transactions: спислк, содержащий транзакции счёта
+        :param account: database.Account, счёт, к которому относятся транзакции
+        :param fetch: функция, которая загружает страницу транзакций (см. TransactionsModel.set_transactions)
+        :param load: загружать ли первую страницу через fetch (см. TransactionsModel.set_transactions)
+        :param accounts: справочник счетов для общей истории всех счетов (см. TransactionsModel.set_transactions)
+        :return: функция, которая принимает первую страницу, если load равен False
         """
-        # Если в списке есть какие-то элементы, то они будут удалены
-        for i in range(self.items_layout.count()):
-            item = self.items_layout.itemAt(i).widget()
+        model = self.model()
+        generation = model.set_transactions(account, fetch, load, accounts)
+
+        return partial(model.add_page, generation)
+
+    def selected_transactions(self):
+        """
+        Выбранные транзакции в порядке истории
+
+        :return: список пар (database.Transaction, database.Category)
+        """
+        return [(index.data(TransactionsModel.TransactionRole), index.data(TransactionsModel.CategoryRole))
+                for index in sorted(self.selectionModel().selectedIndexes(), key=lambda index: index.row())]
 
-            if type(item) is TransactionInfoButton:
-                item.deleteLater()
 
-        for transaction in transactions:
-            self.items_layout.insertWidget(0, transaction)
+class SummaryPanel(QWidget):
+    period_changed = pyqtSignal(str)  # "day", "week", "month" или "year"
+    period_selected = pyqtSignal(int)  # первый день выбранного периода
+
+    # Названия периодов в выпадающем списке и формат, в котором показывается период
+    periods = (("День", "day", "dd.MM.yyyy"), ("Неделя", "week", "dd.MM.yyyy"), ("Месяц", "month", "MM.yyyy"),
+               ("Год", "year", "yyyy"))
+
+    def __init__(self, *args, **kwargs):
+        """
+        Сводка доходов и расходов счёта по периодам: таблица последних периодов и разбивка выбранного периода по
+        категориям. Сами суммы считает база данных, панель только показывает их
+        """
+        super(SummaryPanel, self).__init__(*args, **kwargs)
+
+        self.period = "month"
+        self.start = 0  # первый день самого старого показанного периода
+        self.currency = ""
+        self.rows = {}  # первый день периода -> (доходы, расходы)
+        self.selected = None  # первый день выбранного периода
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.period_combobox = QComboBox()
+        for name, period, _ in self.periods:
+            self.period_combobox.addItem(name, period)
+        self.period_combobox.setCurrentIndex(self.period_combobox.findData(self.period))
+        layout.addWidget(self.period_combobox)
+
+        # Предупреждение о счетах, которые не попали в сводку по всем счетам
+        self.warning_label = QLabel()
+        self.warning_label.setWordWrap(True)
+        self.warning_label.setProperty("sign", "negative")
+        self.warning_label.hide()
+        layout.addWidget(self.warning_label)
+
+        self.periods_table = self.create_table("Период")
+        self.periods_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.periods_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        layout.addWidget(self.periods_table)
+
+        self.categories_table = self.create_table("Категория")
+        self.categories_table.setSelectionMode(QAbstractItemView.NoSelection)
+        layout.addWidget(self.categories_table)
+
+        self.period_combobox.currentIndexChanged.connect(self.period_combobox_changed)
+        self.periods_table.itemSelectionChanged.connect(self.selection_changed)
+
+    def set_warning(self, text):
+        """
+        Показать предупреждение над таблицей периодов
+
+        :param text: текст предупреждения или пустая строка, чтобы его убрать
+        """
+        self.warning_label.setText(text)
+        self.warning_label.setVisible(bool(text))
+
+    @staticmethod
+    def create_table(title):
+        """Таблица с колонками: название, доходы, расходы, итог"""
+        table = QTableWidget(0, 4)
+        table.setHorizontalHeaderLabels((title, "Доходы", "Расходы", "Итого"))
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.verticalHeader().hide()
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        return table
+
+    def set_row(self, table, row, name, income, outcome, color=None):
+        """Заполнить строку таблицы"""
+        items = [QTableWidgetItem(name)]
+        for money in (income, outcome, income + outcome):
+            item = QTableWidgetItem(f"{money:.2f} {self.currency}")
+            item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            if money < 0:
+                item.setForeground(QColor("red"))
+            elif money > 0:
+                item.setForeground(QColor("green"))
+            items.append(item)
+
+        if color is not None:
+            items[0].setBackground(color)
+            items[0].setForeground(QColor(tag_text_color(color)))
+
+        for column, item in enumerate(items):
+            table.setItem(row, column, item)
+
+    def period_name(self, start):
+        """Название периода по его первому дню"""
+        text_format = next(period[2] for period in self.periods if period[1] == self.period)
+        text = days_to_date(start).toString(text_format)
+
+        if self.period == "week":
+            text += " - " + days_to_date(period_bounds(self.period, start)[1]).toString(text_format)
+
+        return text
+
+    @profiler.timed("ui")
+    def set_periods(self, currency, start, rows):
+        """
+        Поставить суммы по периодам
+
+        :param currency: валюта счёта
+        :param start: первый день самого старого периода, который показывается в панели
+        :param rows: список кортежей (первый день периода, доходы, расходы, количество транзакций), см.
+            database.SummaryRepository.periods
+        """
+        self.currency = currency
+        self.start = start
+        self.rows = {row[0]: (row[1], row[2]) for row in rows}
+        self.selected = None
+
+        self.periods_table.blockSignals(True)
+        self.periods_table.setRowCount(0)
+        self.periods_table.blockSignals(False)
+        self.categories_table.setRowCount(0)
+
+        self.show_periods()
+
+    def update_period(self, row):
+        """
+        Обновить суммы одного периода, не запрашивая остальные
+
+        :param row: кортеж (первый день периода, доходы, расходы, количество транзакций), см.
+            database.SummaryRepository.period
+        """
+        start, income, outcome, count = row
+        if start < self.start:
+            return  # период слишком старый, чтобы показываться в панели
+
+        if count:
+            self.rows[start] = (income, outcome)
+        else:
+            self.rows.pop(start, None)
+
+        self.show_periods()
+
+        if start == self.selected:
+            self.period_selected.emit(start)  # разбивку по категориям нужно запросить заново
+
+    def show_periods(self):
+        """Вывести периоды в таблицу. Последние периоды идут первыми"""
+        starts = sorted(self.rows, reverse=True)
+
+        self.periods_table.blockSignals(True)
+        self.periods_table.setRowCount(len(starts))
+        for row, start in enumerate(starts):
+            self.set_row(self.periods_table, row, self.period_name(start), *self.rows[start])
+            self.periods_table.item(row, 0).setData(Qt.UserRole, start)
+
+        if self.selected in self.rows:
+            self.periods_table.selectRow(starts.index(self.selected))
+        else:
+            self.periods_table.clearSelection()
+            self.selected = None
+            self.categories_table.setRowCount(0)
+        self.periods_table.blockSignals(False)
+
+    @profiler.timed("ui")
+    def set_categories(self, rows):
+        """
+        Поставить разбивку выбранного периода по категориям
+
+        :param rows: список кортежей (database.Category, доходы, расходы)
+        """
+        self.categories_table.setRowCount(len(rows))
+        for row, (category, income, outcome) in enumerate(rows):
+            self.set_row(self.categories_table, row, category.name, income, outcome, category.color)
+
+    def period_combobox_changed(self, index):
+        """Когда пользователь выбирает другой период из выпадающего списка"""
+        self.period = self.period_combobox.itemData(index)
+        self.period_changed.emit(self.period)
+
+    def selection_changed(self):
+        """Когда пользователь выбирает период в таблице"""
+        items = self.periods_table.selectedItems()
+        if not items:
+            return
+
+        self.selected = self.periods_table.item(items[0].row(), 0).data(Qt.UserRole)
+        self.period_selected.emit(self.selected)
+
+
+class SearchBar(QWidget):
+    changed = pyqtSignal(object)  # database.TransactionFilter
+
+    delay = 300  # сколько миллисекунд ждать после последнего изменения, прежде чем искать
+
+    def __init__(self, categories, *args, **kwargs):
+        """
+        Поиск и фильтры истории транзакций: слова заметки, сумма, промежуток дат и категории. Условия передаются через
+        сигнал changed, когда пользователь перестаёт их менять
+
+        :param categories: список database.Category, из которых можно выбирать
+        """
+        super(SearchBar, self).__init__(*args, **kwargs)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        # Первая строка: текст, категории, сброс
+        text_layout = QHBoxLayout()
+        layout.addLayout(text_layout)
+
+        self.text_line_edit = QLineEdit()
+        self.text_line_edit.setPlaceholderText("Поиск по заметкам")
+        self.text_line_edit.setClearButtonEnabled(True)
+        text_layout.addWidget(self.text_line_edit)
+
+        self.categories_menu = QMenu(self)
+        self.category_actions = []
+        for category in categories:
+            action = self.categories_menu.addAction(category.name)
+            action.setCheckable(True)
+            action.setChecked(True)
+            action.setData(category.id)
+            self.category_actions.append(action)
+
+        self.categories_button = QToolButton()
+        self.categories_button.setText("Категории")
+        self.categories_button.setMenu(self.categories_menu)
+        self.categories_button.setPopupMode(QToolButton.InstantPopup)
+        text_layout.addWidget(self.categories_button)
+
+        self.reset_button = QPushButton("Сбросить")
+        text_layout.addWidget(self.reset_button)
+
+        # Вторая строка: сумма и даты
+        range_layout = QHBoxLayout()
+        layout.addLayout(range_layout)
+
+        self.money_from_spinbox = self.create_money_spinbox()
+        self.money_to_spinbox = self.create_money_spinbox()
+        range_layout.addWidget(QLabel("Сумма от"))
+        range_layout.addWidget(self.money_from_spinbox)
+        range_layout.addWidget(QLabel("до"))
+        range_layout.addWidget(self.money_to_spinbox)
+
+        self.start_checkbox, self.start_date_edit = QCheckBox("С"), QDateEdit(QDate.currentDate().addMonths(-1))
+        self.end_checkbox, self.end_date_edit = QCheckBox("по"), QDateEdit(QDate.currentDate())
+        for checkbox, date_edit in ((self.start_checkbox, self.start_date_edit),
+                                    (self.end_checkbox, self.end_date_edit)):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("dd.MM.yyyy")
+            date_edit.setDisabled(True)
+            checkbox.toggled.connect(date_edit.setEnabled)
+            range_layout.addWidget(checkbox)
+            range_layout.addWidget(date_edit)
+
+        # Поиск запускается с задержкой, чтобы не искать на каждую введённую букву
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.delay)
+        self.timer.timeout.connect(lambda: self.changed.emit(self.search()))
+
+        self.text_line_edit.textChanged.connect(self.schedule)
+        self.categories_menu.triggered.connect(self.schedule)
+        for widget in (self.money_from_spinbox, self.money_to_spinbox):
+            widget.valueChanged.connect(self.schedule)
+        for widget in (self.start_checkbox, self.end_checkbox):
+            widget.toggled.connect(self.schedule)
+        for widget in (self.start_date_edit, self.end_date_edit):
+            widget.dateChanged.connect(self.schedule)
+        self.reset_button.clicked.connect(self.reset)
+
+    def schedule(self, *args):
+        """Запустить поиск после задержки. Если условия снова изменятся, то задержка начнётся заново"""
+        self.timer.start()
+
+    @staticmethod
+    def create_money_spinbox():
+        """Поле суммы. Ноль означает, что сумма не ограничена"""
+        spinbox = QDoubleSpinBox()
+        spinbox.setMaximum(999999999.99)
+        spinbox.setSpecialValueText("любая")
+
+        return spinbox
+
+    def search(self):
+        """
+        Условия поиска, которые выбрал пользователь
+
+        :return: database.TransactionFilter
+        """
+        checked = {action.data() for action in self.category_actions if action.isChecked()}
+
+        return TransactionFilter(
+            money_from=Money.from_major(self.money_from_spinbox.value()) if self.money_from_spinbox.value() else None,
+            money_to=Money.from_major(self.money_to_spinbox.value()) if self.money_to_spinbox.value() else None,
+            start=date_to_days(self.start_date_edit.date()) if self.start_checkbox.isChecked() else None,
+            end=date_to_days(self.end_date_edit.date()) if self.end_checkbox.isChecked() else None,
+            category_ids=None if len(checked) == len(self.category_actions) else checked,
+            text=self.text_line_edit.text(),
+        )
+
+    def reset(self):
+        """Сбросить все условия поиска"""
+        self.text_line_edit.clear()
+        for action in self.category_actions:
+            action.setChecked(True)
+        self.money_from_spinbox.setValue(0)
+        self.money_to_spinbox.setValue(0)
+        self.start_checkbox.setChecked(False)
+        self.end_checkbox.setChecked(False)
+
+        self.schedule()
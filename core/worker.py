@@ -0,0 +1,198 @@
+import sys
+from itertools import count
+from threading import Lock, current_thread
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from core.database import connect
+from core.profiler import function_name, profiler
+
+
+class DatabaseWorker(QObject):
+    finished = pyqtSignal(int, object)  # ID запроса, результат
+    failed = pyqtSignal(int, object)  # ID запроса, исключение
+
+    def __init__(self, path, *args, **kwargs):
+        """
+        Выполняет запросы к базе данных в отдельном потоке. Подключение к базе данных создаётся в этом же потоке, так
+        как sqlite3 не разрешает использовать подключение из разных потоков
+
+        :param path: путь к файлу базы данных
+        """
+        super(DatabaseWorker, self).__init__(*args, **kwargs)
+
+        self.path = path
+        self.db = None
+
+        # Запросы выполняются строго в порядке возрастания ID, поэтому отменять имеет смысл только запросы с ID больше
+        # последнего начатого
+        self.cancelled = set()  # ID запросов, которые ещё не начались и не должны выполняться
+        self.started = 0  # ID последнего начатого запроса
+        self.current = None  # ID запроса, который выполняется сейчас
+        self.lock = Lock()
+
+    @pyqtSlot(int, object)
+    def run(self, request_id, function):
+        """
+        Выполнить запрос
+
+        :param request_id: ID запроса
+        :param function: функция, которая получает подключение к базе данных и возвращает результат запроса
+        """
+        with self.lock:
+            self.started = request_id
+
+            if request_id in self.cancelled:
+                self.cancelled.discard(request_id)
+                return
+
+            self.current = request_id
+
+        if self.db is None:
+            self.db = connect(self.path)
+            profiler.trace(self.db)
+            current_thread().name = "DatabaseWorker"  # так поток называется в трассе профилировщика
+
+        try:
+            with profiler.span(function_name(function), "sql"):
+                result = function(self.db)
+        except Exception as e:
+            if self.db.in_transaction:
+                self.db.rollback()
+            self.failed.emit(request_id, e)
+        else:
+            self.finished.emit(request_id, result)
+        finally:
+            with self.lock:
+                self.current = None
+
+    def cancel(self, request_id):
+        """
+        Отменить запрос. Если запрос ещё не начался, то он не будет выполнен, а если выполняется, то он будет прерван.
+        Вызывается из основного потока
+
+        :param request_id: ID запроса
+        """
+        with self.lock:
+            if request_id > self.started:
+                self.cancelled.add(request_id)
+            elif self.current == request_id:
+                # Пока удерживается блокировка, поток не может перейти к следующему запросу, поэтому будет прерван
+                # именно этот запрос
+                self.db.interrupt()
+
+    @pyqtSlot()
+    def close(self):
+        """
+        Закрыть подключение к базе данных и остановить поток. Слот вызывается через очередь потока после всех запросов,
+        которые были поставлены раньше, поэтому они успевают выполниться
+        """
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+        self.thread().quit()
+
+
+class DatabaseExecutor(QObject):
+    submitted = pyqtSignal(int, object)  # ID запроса, функция запроса
+    closing = pyqtSignal()
+
+    def __init__(self, path, *args, **kwargs):
+        """
+        Очередь запросов к базе данных, которые выполняются в отдельном потоке, чтобы интерфейс не зависал. Результаты
+        возвращаются в основной поток через сигналы и передаются в функции обратного вызова
+
+        :param path: путь к файлу базы данных
+        """
+        super(DatabaseExecutor, self).__init__(*args, **kwargs)
+
+        self.ids = count(1)
+        self.requests = {}  # ID запроса -> (функция обратного вызова, функция обработки ошибки, ключ)
+        self.keys = {}  # ключ -> ID последнего запроса с этим ключом
+
+        self.thread = QThread()
+        self.worker = DatabaseWorker(path)
+        self.worker.moveToThread(self.thread)
+
+        self.submitted.connect(self.worker.run)
+        self.closing.connect(self.worker.close)
+        self.worker.finished.connect(self.request_finished)
+        self.worker.failed.connect(self.request_failed)
+
+        self.thread.start()
+
+    def submit(self, function, callback=None, key=None, error_callback=None):
+        """
+        Поставить запрос в очередь
+
+        :param function: функция, которая получает подключение к базе данных и возвращает результат запроса. Функция
+            выполняется в другом потоке, поэтому не должна трогать виджеты
+        :param callback: функция, которая получит результат запроса в основном потоке
+        :param key: если указан, то предыдущий запрос с этим же ключом отменяется, так как его результат устарел.
+            Например, история транзакций счёта, который пользователь уже успел сменить
+        :param error_callback: функция, которая получит исключение, если запрос завершился ошибкой
+        :return: ID запроса
+        """
+        request_id = next(self.ids)
+
+        if key is not None:
+            if key in self.keys:
+                self.cancel(self.keys[key])
+            self.keys[key] = request_id
+
+        self.requests[request_id] = (callback, error_callback, key)
+        self.submitted.emit(request_id, function)
+
+        return request_id
+
+    def cancel(self, request_id):
+        """
+        Отменить запрос. Его результат не будет передан в функцию обратного вызова
+
+        :param request_id: ID запроса
+        """
+        if self.pop_request(request_id) is not None:
+            self.worker.cancel(request_id)
+
+    def pop_request(self, request_id):
+        """Убрать запрос из списка ожидающих и вернуть его данные"""
+        request = self.requests.pop(request_id, None)
+
+        if request is not None and request[2] is not None and self.keys.get(request[2]) == request_id:
+            del self.keys[request[2]]
+
+        return request
+
+    def request_finished(self, request_id, result):
+        """Когда запрос выполнен"""
+        request = self.pop_request(request_id)
+
+        if request is not None and request[0] is not None:
+            with profiler.span(function_name(request[0]), "callback"):
+                request[0](result)
+
+    def request_failed(self, request_id, error):
+        """Когда запрос завершился ошибкой"""
+        request = self.pop_request(request_id)
+
+        if request is None:
+            return  # запрос был отменён, поэтому ошибка прерывания ожидаема
+
+        if request[1] is not None:
+            request[1](error)
+        else:
+            sys.excepthook(type(error), error, error.__traceback__)
+
+    def close(self):
+        """
+        Дождаться выполнения запросов, закрыть подключение к базе данных и остановить поток. Результаты запросов,
+        которые выполнялись во время закрытия, в функции обратного вызова уже не передаются
+        """
+        # Поток останавливает сам DatabaseWorker, когда дойдёт до закрытия: если остановить поток отсюда, то запросы,
+        # которые ещё стоят в очереди, не выполнятся
+        self.closing.emit()
+        self.thread.wait()
+
+        self.requests.clear()
+        self.keys.clear()
@@ -1,778 +1,849 @@
-import sqlite3
 import sys
+from collections import Counter
 from copy import deepcopy
+from functools import partial
 
+from PyQt5.QtCore import Qt, QDate, QItemSelectionModel
 from PyQt5.QtGui import QIcon
-from PyQt5.QtWidgets import QApplication, QMainWindow, QDialog, QAction, QColorDialog, QMessageBox
-
-from core.widgets import *
-from core.database import *
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QAction, QMessageBox, QDockWidget, QFileDialog, \
+    QHBoxLayout, QLabel, QMenu
+
+from core.widgets import AccountInfo, SearchBar, SummaryPanel, TransactionList, TransactionsModel, default_color, \
+    no_category, set_sign, stylesheet
+from core.database import Account, AccountRepository, CategoryRepository, CurrencyRepository, Registry, Repository, \
+    SummaryRepository, Transaction, TransactionFilter, TransactionRepository, date_to_days, default_path, migrate, \
+    period_bounds, period_shift
+from core.profiler import ProfilerOverlay, profiler
+from core.worker import DatabaseExecutor
 from ui.main_page import Ui_MainPage as MainPageUi
-from ui.add_transaction_dialog import Ui_Dialog as AddTransactionDialogUi
-from ui.create_account_widget import Ui_CreateAccountDialog as CreateAccountDialogUi
 
-# Когда категория не была выбрана, искользуется именно  этот вид записи
-no_category = Category(None, "Без категории", default_color)
+# Диалоги, импорт и экспорт выписок и курсы валют (вместе с numpy) импортируются при первом использовании, а не при
+# запуске программы
 
 
-# Утилиты
-def get(iteration, key, no_result=None):
+def load_converter(db):
     """
-    Возвращает элемент списка, если он соотвествует условию
+    Загрузить курсы валют. Выполняется в фоновом потоке, поэтому и numpy импортируется там же, не задерживая окно
 
-    :param iteration: итерируемый объект
-    :param key: функция, которая возвращает True или False и получает аргумент в виде элемента итерируемого объекта
-    :param no_result: если элемент не был найден по условию, поставленного в функции, то вернуть None, либо что-то ещё
+    :param db: подключение к базе данных
+    :return: currency.CurrencyConverter
     """
-    for i in iteration:
-        if key(i):
-            return i
-    else:
-        return no_result
+    from core.currency import CurrencyConverter
+    return CurrencyConverter.load(db)
 
 
-# Виджеты, диалоги
+# Виджеты
 class MainPage(QWidget, MainPageUi):
-    def __init__(self, db, accounts, categories, currencies):
+    summary_length = 12  # сколько последних периодов показывается в сводке
+
+    @profiler.timed("startup")
+    def __init__(self, executor, accounts, categories, currencies):
         """
         Основная страница приложения. Здесь отображается состояние определённого счёта и его история транзакций
 
-        :param db: подключение к базе данных
-        :param accounts: список счетов
-        :param categories: список категорий транзакций
+        :param executor: worker.DatabaseExecutor, через который выполняются запросы к базе данных
+        :param accounts: database.Registry со счетами
+        :param categories: database.Registry с категориями транзакций
+        :param currencies: database.Registry с валютами
         """
         super(MainPage, self).__init__()
         self.setupUi(self)
 
         # Освновные переменные
-        self.db = db
+        self.executor = executor
         self.accounts = accounts
         self.categories = categories
         self.currencies = currencies
 
-        self.account = self.accounts[0]
+        # Все счета вместе. Сумма на них считается в валюте, в которой открыто больше всего счетов, а история
+        # транзакций общая
+        self.all_accounts = Account(None, "Все счета", default_color, self.main_currency(), 0)
+
+        # Без счетов показывается общая история, которая будет пустой
+        self.account = self.accounts[0] if len(self.accounts) else self.all_accounts
+        self.accounts_dialog = None  # core.dialogs.ListAccountsDialog, создаётся при первом открытии списка счетов
+        self.search = TransactionFilter()  # условия поиска в истории транзакций, пустые условия показывают всю историю
 
         # Виджеты, которые не были добавлены изначально
         self.account_info_widget = AccountInfo(self.account)
         self.header_layout.insertWidget(0, self.account_info_widget)
 
+        self.search_bar = SearchBar([no_category, *self.categories])
+        self.search_bar.changed.connect(self.search_changed)
+        self.page_layout.addWidget(self.search_bar)
+
         self.transactions_history_layout = QHBoxLayout(self)
         self.page_layout.addLayout(self.transactions_history_layout)
 
         self.income_history = TransactionList()
+        self.income_history.clicked.connect(self.transaction_clicked)
+        self.income_history.customContextMenuRequested.connect(partial(self.history_menu, self.income_history))
         self.transactions_history_layout.addWidget(self.income_history)
 
         self.outcome_history = TransactionList()
+        self.outcome_history.clicked.connect(self.transaction_clicked)
+        self.outcome_history.customContextMenuRequested.connect(partial(self.history_menu, self.outcome_history))
         self.transactions_history_layout.addWidget(self.outcome_history)
 
-        # Ставим последние транзакции в каждую колонку
+        # Сводка по периодам. Панель показывается в отдельной области главного окна
+        self.summary_panel = SummaryPanel()
+        self.summary_panel.period_changed.connect(self.set_summary)
+        self.summary_panel.period_selected.connect(self.summary_period_selected)
+
+        # Сумма на всех счетах в основной валюте. Надпись показывается в строке состояния главного окна
+        self.net_worth_label = QLabel()
+        self.converter = None  # currency.CurrencyConverter, курсы загружаются в фоновом потоке
+        # Почему сумму на всех счетах нельзя посчитать, или None, если она посчитана
+        self.net_worth_error = "Курсы валют ещё не загружены"
+
+        # Ставим последние транзакции в каждую колонку. Запросы выполняются по очереди, поэтому курсы валют
+        # загружаются после истории и сводки, которые пользователь видит сразу
         self.set_transactions()
+        self.set_summary()
+        self.executor.submit(load_converter, self.set_converter)
 
         # Добавляем счета в выпадающий список
-        for account in self.accounts:
-            self.accounts_combobox.addItem(account.name, account.id)
+        self.fill_accounts_combobox()
 
         # Подключаем функции к элементам интерфейса
         self.accounts_combobox.currentIndexChanged.connect(self.account_changed)
         self.add_transaction_button.clicked.connect(self.add_transaction)
 
-    def set_transactions(self):
-        """Вывести последние транзакции поставленного счёта"""
-        cursor = self.db.cursor()
-
-        # Для удобства создана отдельная функция, чтобы повторять одно и то же действие дважды
-        def fun(transaction_list, statement):
-            # Получаем последние 50 транзакции, которые связанные с определённым счётом и подходит под условие
-            result = cursor.execute(
-                f"SELECT * FROM 'transaction' WHERE account_id=? AND {statement} "
-                f"ORDER BY STRFTIME('%d.%m.%Y', date) LIMIT 50",
-                (self.account.id,)
-            ).fetchall()
-
-            transactions = []
-
-            # Обрабатываем транзакции из базы данных и ставим элементы для взаимодействия историей транзакций
-            for transaction in result:
-                transaction = Transaction(*transaction)
-                category = get(self.categories, lambda c: c.id == transaction.category_id, no_category)
-                transaction_info = TransactionInfoButton(transaction, self.account, category)
-                transaction_info.clicked.connect(partial(
-                    self.edit_transaction, transaction.id, self.account.id, category.id, transaction.money,
-                    transaction.date
-                ))
-                transactions.append(transaction_info)
-
-            # Сортируем транзакции. Транзакции с ближайшей датов - выше, а более давние или без даты - вниз
-            transactions_with_date = sorted(filter(lambda t: t.date, transactions), key=lambda t: t.date)
-            transactions = list(filter(lambda t: not t.date, transactions))
-            transactions.extend(transactions_with_date)
-
-            transaction_list.set_transactions(transactions)
-
-        # Ставим транзакции для расходов и доходов
-        fun(self.income_history, "money > 0")
-        fun(self.outcome_history, "money < 0")
+    def main_currency(self):
+        """Валюта, в которой открыто больше всего счетов. В ней считается сумма и сводка по всем счетам"""
+        if not len(self.accounts):
+            return self.currencies[0].short_name
 
-    def account_changed(self, index):
-        """Когда пользователь выберает другой счёт из выпадающего списка"""
-        self.account = get(self.accounts, lambda a: a.id == self.accounts_combobox.itemData(index))
-        self.account_info_widget.change_account(self.account)  # Изменяем информацию о счёте
+        return Counter(account.currency for account in self.accounts).most_common(1)[0][0]
 
-        self.set_transactions()  # Ставим историю транзакций для выбранного счёта
-
-    def add_transaction(self):
-        """Когда пользователь добавляет транзакцию"""
-        dialog = AddTransactionDialog(self.accounts, self.categories, self.account.id)
-
-        # Если диалоговое окно завершило работу с успехом
-        if dialog.exec_():
-            account = dialog.account
-            transaction = dialog.transaction
-            category = dialog.category
+    def fill_accounts_combobox(self):
+        """Заполнить выпадающий список: сначала все счета вместе, затем каждый счёт, и выбрать текущий счёт"""
+        self.accounts_combobox.addItem(self.all_accounts.name, None)
+        for account in self.accounts:
+            self.accounts_combobox.addItem(account.name, account.id)
 
-            # Делаем изменения в базу данных
-            cursor = self.db
-            cursor.execute(
-                "INSERT INTO 'transaction'(account_id, category_id, money, date) VALUES (?, ?, ?, ?)",
-                (account.id, category.id, transaction.money,
-                 transaction.date.toString("dd.MM.yyyy") if transaction.date else None)
-            )
-            cursor.execute(
-                "UPDATE account SET money = money + ? WHERE id = ?",
-                (transaction.money, account.id)
-            )
-            self.db.commit()
-
-            # Ищем счёт, на котором было сделано изменение
-            for i in range(len(self.accounts)):
-                if self.accounts[i].id == account.id:
-                    # Изменяем количество денег на счету
-                    self.accounts[i].money = account.money + transaction.money
-
-                    # Если изменения были сделаны на текущем счету, то поставить изменения на главной странице
-                    if self.account.id == account.id:
-                        self.account = self.accounts[i]
-                        self.account_info_widget.set_money(self.account.money)
-                        self.set_transactions()
-                    break
-
-    def edit_transaction(self, transaction_id, account_id, category_id, money, date):
-        """Когда пользователь изменяет трназкцию"""
-        # Находит аккаунт, на котором проходила транзакция и приводим в тот внешний вид, который был до этой транзакции
-        accounts = deepcopy(self.accounts)
-        for i in range(len(accounts)):
-            if accounts[i].id == account_id:
-                # Изменяем количество денег на счету
-                accounts[i].money = accounts[i].money - money
-                break
+        self.accounts_combobox.setCurrentIndex(
+            0 if self.account is self.all_accounts else self.accounts_combobox.findData(self.account.id))
 
-        dialog = EditTransactionDialog(accounts, self.categories, account_id, category_id, money, date)
+    def shows(self, transaction):
+        """Показывается ли транзакция в истории текущего счёта"""
+        return self.account is self.all_accounts or transaction.account_id == self.account.id
 
-        # Если диалоговое окно завершило работу с успехом
-        if dialog.exec_():
-            original_account = get(accounts, lambda a: a.id == account_id)
-            edited_account = dialog.account
-            transaction = dialog.transaction
-            category = dialog.category
+    @profiler.timed("ui")
+    def set_transactions(self):
+        """Вывести транзакции поставленного счёта"""
+        account = self.account
+        search = self.search
+        # В общей истории у каждой транзакции свой счёт, поэтому спискам нужен справочник счетов
+        accounts = self.accounts if account is self.all_accounts else None
+
+        # При поиске каждый список сам загружает подходящие транзакции страницами
+        if search:
+            self.income_history.set_transactions(account, partial(self.fetch_transactions, account, 1, search),
+                                                 accounts=accounts)
+            self.outcome_history.set_transactions(account, partial(self.fetch_transactions, account, -1, search),
+                                                  accounts=accounts)
+            return
+
+        # Ставим транзакции для расходов и доходов. Первые страницы обоих списков загружаются одним запросом, а
+        # остальные подгружаются каждым списком по мере прокрутки
+        add_pages = {
+            1: self.income_history.set_transactions(account, partial(self.fetch_transactions, account, 1, None),
+                                                    False, accounts),
+            -1: self.outcome_history.set_transactions(account, partial(self.fetch_transactions, account, -1, None),
+                                                      False, accounts),
+        }
 
-            cursor = self.db.cursor()
+        def loaded(pages):
+            for sign, transactions in pages.items():
+                add_pages[sign](self.with_categories(transactions))
 
-            # Если пользователь нажал на кнопку удалить
-            if dialog.deleted:
-                # Удаляем транзакцию и изменяем количество денег на счету в базе данных
-                cursor.execute("DELETE FROM 'transaction' WHERE id=?", (transaction_id,))
-                cursor.execute("UPDATE account SET money=? WHERE id=?", (edited_account.money, edited_account.id))
+        self.executor.submit(lambda db: TransactionRepository(db).first_pages(account.id, TransactionsModel.page_size),
+                             loaded, key="history")
 
-                money = 0
-            else:
-                # Обновляем данные о транзакции и итогое количество денег на счету в базе данных
-                cursor.execute(
-                    "UPDATE 'transaction' SET account_id=?, category_id=?, money=?, date=? WHERE id=?",
-                    (edited_account.id, category.id, transaction.money,
-                     transaction.date.toString("dd.MM.yyyy") if transaction.date else None, transaction_id)
-                )
-                cursor.execute(
-                    "UPDATE account SET money=? WHERE id=?",
-                    (edited_account.money + transaction.money, edited_account.id)
-                )
-                if original_account.id != edited_account.id:
-                    # Если был перенос транзакции с одного счёта на другой, то поставить исходную сумму счёта, где
-                    # проводился изначально транзакция
-                    cursor.execute(
-                        "UPDATE account SET money=? WHERE id=?",
-                        (original_account.money, original_account.id)
-                    )
-
-                money = transaction.money
-
-            self.db.commit()
-            # Обновить список транзакций
-            self.set_transactions()
+    def with_categories(self, transactions):
+        """
+        Подобрать транзакциям их категории
 
-            # Ищем аккаунт, который был изменён из-за редактирования транзакции, и изменяем в нём данные
-            for i in range(len(self.accounts)):
-                # Аккаунт, на котором сделана транзакция
-                if self.accounts[i].id == edited_account.id:
-                    self.accounts[i].money = edited_account.money + money
+        :param transactions: список database.Transaction
+        :return: список пар (database.Transaction, database.Category)
+        """
+        return [(transaction, self.categories.get(transaction.category_id, no_category))
+                for transaction in transactions]
 
-                # Если транзакция была перенесена на другой счёт, то поставить прежнюю сумму денег
-                if self.accounts[i].id == original_account.id and original_account.id != edited_account.id:
-                    self.accounts[i].money = original_account.money
+    def fetch_transactions(self, account, sign, search, after, count, callback):
+        """
+        Загрузить страницу транзакций счёта в фоновом потоке (см. TransactionRepository.page). Если пользователь успел
+        сменить счёт или условия поиска, то устаревший запрос отменяется
+
+        :param account: database.Account, счёт, транзакции которого нужно получить (ID None - все счета)
+        :param sign: 1 для доходов, -1 для расходов
+        :param search: database.TransactionFilter или None, если нужна вся история
+        :param after: database.Transaction, последняя уже показанная транзакция или None для первой страницы
+        :param count: максимальное количество транзакций на странице
+        :param callback: функция, которая получит список пар (database.Transaction, database.Category)
+        """
+        self.executor.submit(lambda db: TransactionRepository(db).page(account.id, sign, after, count, search),
+                             lambda transactions: callback(self.with_categories(transactions)), key=("history", sign))
 
-            # Если текущий выбранный аккаунт в главном меню выбранный для изменения, то транзакция будет изменена, то
-            # количество денег на счету изменится
-            if original_account.id == edited_account.id:
-                self.account_info_widget.set_money(original_account.money + money)
-            else:
-                self.account_info_widget.set_money(original_account.money)
+    def search_changed(self, search):
+        """
+        Когда пользователь меняет условия поиска
 
-    def create_account(self):
-        """Когда пользователь создаёт счёт"""
-        dialog = CreateAccountDialog(self.accounts, self.currencies)
+        :param search: database.TransactionFilter
+        """
+        self.search = search
+        self.set_transactions()
 
-        # Если диалоговое окно завершило работу с успехом
-        if dialog.exec_():
-            account = dialog.account
+    def summary_rates(self):
+        """
+        Курсы валют счетов к валюте сводки по всем счетам (см. SummaryRepository.periods). Счета, для валюты которых
+        нет курса, в сводку не попадают
 
-            cursor = self.db.cursor()
-            # Добавляем информацию о счёте в базу данных
-            cursor.execute(
-                "INSERT INTO account(name, color, currency, money) VALUES (?, ?, ?, ?)",
-                (account.name, account.color.name()[1:], account.currency, account.money)
-            )
-            self.db.commit()
+        :return: словарь код валюты -> курс или None, если сводка по одному счёту
+        """
+        if self.account is not self.all_accounts:
+            return None
+
+        currency = self.all_accounts.currency
+        rates = {currency: 1.0}
+        if self.converter is not None:
+            from core.currency import RateError
+            for code in {account.currency for account in self.accounts} - {currency}:
+                try:
+                    rates[code] = self.converter.rate(code, currency)
+                except RateError:
+                    pass
+
+        return rates
+
+    def set_summary(self, *args):
+        """Запросить сводку по последним периодам для поставленного счёта"""
+        account = self.account
+        period = self.summary_panel.period
+        rates = self.summary_rates()
+
+        # Счета в валютах без курса не попадают в сводку по всем счетам, и пользователь должен это видеть
+        missing = sorted({other.currency for other in self.accounts} - set(rates)) if rates is not None else []
+        self.summary_panel.set_warning(f"В сводку не попали счета в {', '.join(missing)}: нет курса к "
+                                       f"{account.currency}" if missing else "")
+        today = date_to_days(QDate.currentDate())
+        start = period_bounds(period, period_shift(period, today, 1 - self.summary_length))[0]
+
+        self.executor.submit(lambda db: SummaryRepository(db).periods(account.id, period, start, rates),
+                             lambda rows: self.summary_panel.set_periods(account.currency, start, rows),
+                             key="summary")
+
+    def update_summary(self, days):
+        """
+        Пересчитать в сводке только те периоды, в которые попадают изменённые транзакции
 
-            # Получаем ID, который сгенерировала база данных
-            account.id = cursor.lastrowid
+        :param days: даты изменённых транзакций (количество дней от 01.01.1970 или None)
+        """
+        account_id = self.account.id
+        period = self.summary_panel.period
+        rates = self.summary_rates()
+        starts = {period_bounds(period, day)[0] for day in days if day is not None}
+        if not starts:
+            return
+
+        def updated(rows):
+            # Пока шёл запрос, пользователь мог сменить счёт или период, тогда результат уже не нужен
+            if self.account.id != account_id or self.summary_panel.period != period:
+                return
+
+            for row in rows:
+                self.summary_panel.update_period(row)
+
+        self.executor.submit(lambda db: [SummaryRepository(db).period(account_id, period, start, rates)
+                                         for start in starts], updated)
+
+    def summary_period_selected(self, start):
+        """Когда в сводке выбран период, запрашиваем его разбивку по категориям"""
+        account_id = self.account.id
+        period = self.summary_panel.period
+        rates = self.summary_rates()
+
+        def loaded(rows):
+            rows = [(self.categories.get(row[0], no_category), row[1], row[2]) for row in rows]
+            rows.sort(key=lambda row: abs(row[1] + row[2]), reverse=True)
+            self.summary_panel.set_categories(rows)
+
+        self.executor.submit(lambda db: SummaryRepository(db).categories(account_id, period, start, rates), loaded,
+                             key="summary_categories")
+
+    def save(self, function, account_ids, removed=(), added=()):
+        """
+        Выполнить изменения в базе данных в фоновом потоке одной транзакцией, а затем обновить суммы на затронутых
+        счетах, историю транзакций и сводку. В истории заменяются только изменённые транзакции, остальные строки не
+        трогаются
+
+        :param function: функция, которая получает подключение к базе данных и делает изменения
+        :param account_ids: ID счетов, суммы которых могут измениться
+        :param removed: database.Transaction в том виде, в каком они были до изменения
+        :param added: database.Transaction в том виде, в каком они стали после изменения. ID транзакций должны быть
+            известны после выполнения function
+        """
+        def run(db):
+            with Repository(db).atomic():
+                function(db)
 
-            # Обновляем данные в программе
-            self.accounts.append(account)
-            self.accounts.sort(key=lambda a: a.name)
-            self.accounts_combobox.addItem(account.name, account.id)
-            self.accounts_combobox.model().sort(0, Qt.AscendingOrder)
+            return AccountRepository(db).balances(account_ids)
 
-    def accounts_list(self):
-        """Когда пользователь открывает список счетов"""
-        dialog = ListAccountsDialog(self.db, self.accounts, self.currencies)
-        dialog.exec_()  # Открываем диалоговое окно
-
-        # Расчитываем на то, что счета были изменены
-        edited_accounts = dialog.accounts
-        self.accounts = edited_accounts
-
-        # Ищем счёт, который выбран на главной странице и изменяем его
-        for i in range(len(edited_accounts)):
-            if edited_accounts[i].id == self.account.id:
-                self.account = edited_accounts[i]
-                break
-        else:
-            # Если аккаунт не был найден, то будет поставлен первый по списку
-            self.account = edited_accounts[0]
-            self.set_transactions()
+        def saved(balances):
+            self.set_balances(balances)
 
-        # Меняем информацию на главном экране
-        self.account_info_widget.change_account(self.account)
+            removed_shown = [transaction for transaction in removed if self.shows(transaction)]
+            added_shown = [transaction for transaction in added if self.shows(transaction)]
+            if (removed_shown or added_shown) and self.search:
+                # Подходят ли изменённые транзакции под условия поиска, знает только база данных
+                self.set_transactions()
+            else:
+                for transaction in removed_shown:
+                    self.history(transaction).model().remove_transaction(transaction)
+                for transaction in added_shown:
+                    self.history(transaction).model().insert_transaction(
+                        transaction, self.categories.get(transaction.category_id, no_category))
+            self.update_summary([transaction.day for transaction in (*removed_shown, *added_shown)])
 
-        # Перед тем как почистить все элементы combobox, мы отключаем привязанную функцию, которая отвечает за
-        # динамическое изменение информации о счёте на главной странице программы. Делаем это для устранения ошибки,
-        # связанной с пустым combobox
-        self.accounts_combobox.currentIndexChanged.disconnect()
-        self.accounts_combobox.clear()
-        # Обновляем combobox актуальным списком счетов и подключаем фукнцию, отключённую ранее
-        for account in self.accounts:
-            self.accounts_combobox.addItem(account.name, account.id)
-        self.accounts_combobox.currentIndexChanged.connect(self.account_changed)
+        self.executor.submit(run, saved)
 
+    def history(self, transaction):
+        """Список, в котором показывается транзакция: доходы или расходы"""
+        return self.income_history if transaction.money > 0 else self.outcome_history
 
-class AddTransactionDialog(QDialog, AddTransactionDialogUi):
-    def __init__(self, accounts, categories, account_id=0, *args, **kwargs):
+    def set_balances(self, balances):
         """
-        Диалоговое окно для добавления транзакции
+        Поставить актуальные суммы на счетах в программе
 
-        :param accounts: список, содержащий все доступные счета
-        :param categories: список, содержащий все доступные категории
-        :param account_id: ID аккаунта, который будет поставлен по умолчанию при запуске окна
+        :param balances: словарь ID счёта -> Money
         """
-        super(AddTransactionDialog, self).__init__(*args, **kwargs)
-        self.setupUi(self)
-        self.setWindowIcon(QIcon("icon.ico"))
-        self.setWindowTitle("Добавить транзакцию")
-
-        # Основные переменные
-        self.accounts = accounts
-        self.categories = categories
-
-        self.account = get(accounts, lambda a: a.id == account_id, self.accounts[0])
-        self.category = no_category
-
-        self.transaction = Transaction(0, self.account.id, 0, 0, QDate.currentDate())
+        for account_id, money in balances.items():
+            if account_id in self.accounts:
+                self.accounts.get(account_id).money = money
 
-        # Виджеты, которые не были добавлены изначально
+        # Если изменения были сделаны на текущем счету, то поставить изменения на главной странице
+        if self.account.id in balances:
+            self.account_info_widget.set_money(self.account.money)
 
-        # Показываем, как будет выглядить количество денег на счету после транзакции
-        self.main_layout.insertWidget(0, QLabel("Счёт после транзакции:"))
-        self.account_info = AccountInfo(self.account)
-        self.main_layout.insertWidget(1, self.account_info)
+        self.update_net_worth()
 
-        # Информация о транзакции
-        self.main_layout.insertWidget(2, QLabel("Транзакция:"))
-        self.transaction_info = TransactionInfo(self.transaction, self.account, self.category)
-        self.main_layout.insertWidget(3, self.transaction_info)
+    def set_converter(self, converter):
+        """
+        Поставить курсы валют, по которым считается сумма на всех счетах
 
-        # Ставим дату транзакции
-        self.date_edit.setDate(self.transaction.date)
-        self.date_edit.setMaximumDate(self.transaction.date)
+        :param converter: currency.CurrencyConverter
+        """
+        self.converter = converter
+        self.update_net_worth()
 
-        # Ставим элементы выпадающих списков
+        # Сводка по всем счетам считалась без курсов, поэтому запрашивается заново
+        if self.account is self.all_accounts:
+            self.set_summary()
 
-        # Список аккаунтов
-        for account in self.accounts:
-            self.account_combobox.addItem(account.name, account.id)
-        self.account_combobox.setCurrentIndex(self.account_combobox.findData(self.account.id))
+    def update_net_worth(self):
+        """Пересчитать сумму на всех счетах: суммы по валютам считает один запрос, а переводятся они по курсам"""
+        self.executor.submit(lambda db: AccountRepository(db).totals(), self.set_totals, key="totals")
 
-        # Список категорий транзакций
-        self.category_combobox.addItem(no_category.name, no_category.id)
-        for category in categories:
-            self.category_combobox.addItem(category.name, category.id)
+    def set_totals(self, totals):
+        """
+        Поставить сумму на всех счетах в основной валюте
 
-        # Подключаем функции к элементам интерфейса
-        self.add_button.clicked.connect(self.accept)
-        self.cancel_button.clicked.connect(self.reject)
-        self.money_spinbox.valueChanged.connect(self.money_changed)
-        self.category_combobox.currentIndexChanged.connect(self.category_changed)
-        self.account_combobox.currentIndexChanged.connect(self.account_changed)
-        self.date_edit.dateChanged.connect(self.date_changed)
-        self.date_checkbox.stateChanged.connect(self.date_checkbox_state_changed)
-
-    def check_data(self):
-        """Проверяем данные формы. Если данные недействительны, то кнопка 'Добавить' будет выключена"""
-        if self.transaction.money != 0:
-            state = False
+        :param totals: словарь код валюты -> сумма на счетах в этой валюте
+        """
+        if self.converter is None:
+            return  # сумма будет пересчитана, когда загрузятся курсы
+
+        from core.currency import RateError
+
+        currency = self.all_accounts.currency = self.main_currency()
+        try:
+            self.all_accounts.money = self.converter.total(totals, currency)
+        except RateError as e:
+            self.net_worth_error = str(e)
+            self.net_worth_label.setText(f"Всего на счетах: {e}")
+            set_sign(0, self.net_worth_label)
         else:
-            state = True
-
-        self.add_button.setDisabled(state)
+            self.net_worth_error = None
+            self.net_worth_label.setText(f"Всего на счетах: {self.all_accounts.money:.2f} {currency}")
+            set_sign(self.all_accounts.money, self.net_worth_label)
 
-    def money_changed(self, value):
-        """Когда мы изменяем количество денег в транзакции"""
-        self.transaction.money = value
+        if self.account is self.all_accounts:
+            self.show_account_info()
 
-        self.transaction_info.set_money(value)
-        self.account_info.set_money(self.account.money + value)
+    def show_account_info(self):
+        """Вывести данные о выбранном счёте. Если сумму на всех счетах нельзя посчитать, то вместо неё будет прочерк"""
+        self.account_info_widget.change_account(self.account)
 
-        self.check_data()
+        if self.account is self.all_accounts and self.net_worth_error is not None:
+            self.account_info_widget.set_unknown_money(self.net_worth_error)
 
-    def category_changed(self, index):
-        """Когда мы изменяем категорию"""
-        self.category = get(self.categories, lambda c: c.id == self.category_combobox.itemData(index), no_category)
-        self.transaction_info.set_category(self.category)
-        self.transaction.category_id = self.category.id
+    def load_rates(self):
+        """Когда пользователь загружает курсы валют из файла"""
+        path, _ = QFileDialog.getOpenFileName(self, "Курсы валют", "", "CSV (*.csv)")
+        if not path:
+            return
 
-        self.check_data()
+        def run(db):
+            from core.currency import load_rates
 
-    def account_changed(self, index):
-        """Когда мы изменяем счёт"""
-        account = get(self.accounts, lambda a: a.id == self.account_combobox.itemData(index))
-        self.account = account
-        self.account_info.change_account(self.account)
-        self.account_info.set_money(self.account.money + self.transaction.money)
+            with Repository(db).atomic():
+                count = load_rates(db, path)
 
-        self.check_data()
+            return count, load_converter(db)
 
-    def date_changed(self, date):
-        """Когда мы изменяем дату"""
-        self.transaction.date = date
-        self.transaction_info.set_date(date)
+        def loaded(result):
+            count, converter = result
+            self.set_converter(converter)
+            QMessageBox.information(self, "Курсы валют", f"Загружено курсов: {count}")
 
-        self.check_data()
+        self.executor.submit(run, loaded, error_callback=lambda error: QMessageBox.warning(
+            self, "Курсы валют", f"Не удалось загрузить курсы: {error}"))
 
-    def date_checkbox_state_changed(self, state):
-        """Когда мы выключаем или включаем дату"""
-        date = None if not state else self.date_edit.date()
+    def transaction_clicked(self, index):
+        """Когда пользователь нажимает на транзакцию в истории"""
+        # С зажатым Ctrl или Shift пользователь выбирает несколько транзакций, а не открывает одну
+        if QApplication.keyboardModifiers() & (Qt.ControlModifier | Qt.ShiftModifier):
+            return
 
-        self.date_edit.setDisabled(not state)
-        self.transaction_info.set_date(date)
-        self.transaction.date = date
+        self.income_history.clearSelection()
+        self.outcome_history.clearSelection()
 
-        self.check_data()
+        transaction = index.data(TransactionsModel.TransactionRole)
+        category = index.data(TransactionsModel.CategoryRole)
 
+        self.edit_transaction(transaction.id, transaction.account_id, category.id, transaction.money,
+                              transaction.date, transaction.note)
 
-class EditTransactionDialog(AddTransactionDialog):
-    def __init__(self, accounts, categories, account_id=0, category_id=0, money=0, date=None,
-                 *args, **kwargs):
+    def history_menu(self, history, position):
         """
-        Диалоговое окно для редактирования транзакции
+        Контекстное меню истории с действиями над выбранными транзакциями. Если пользователь нажал на транзакцию,
+        которая не выбрана, то меню относится только к ней
 
-        :param accounts: список, содержащий все доступные счета
-        :param categories: список, содержащий все доступные категории
-        :param account_id: ID аккаунта, который будет поставлен по умолчанию
-        :param category_id: ID категории, который будет поставлен по умолчанию
-        :param money: количетсво денег в транзакции, которая будет поставлена по умолчанию
-        :param date: дата транзакции, которая будет поставлена по умолчанию (если None, то дата не поставлена)
+        :param history: TransactionList, в котором открыто меню
+        :param position: позиция нажатия в координатах списка
         """
-        super(EditTransactionDialog, self).__init__(accounts, categories, account_id, *args, **kwargs)
-
-        # Каждый раз при изменении каких-либо данных, введёные данные будут сравниваться отсюда
-        self.default_settings = {
-            "account_id": account_id,
-            "category_id": category_id,
-            "money": money,
-            "date": date
-        }
+        index = history.indexAt(position)
+        if not index.isValid():
+            return
+        if not history.selectionModel().isSelected(index):
+            history.selectionModel().select(index, QItemSelectionModel.ClearAndSelect)
 
-        # Ставим соотвествующие название кнопки и окна диалога
-        self.setWindowTitle("Редактировать транзакцию")
-        self.add_button.setText("Сохранить")
+        selected = history.selected_transactions()
 
-        # Изменяем данные в соотвествии с данными транзакции
-        self.transaction_info.set_money(money)
-        self.transaction_info.set_date(date)
-        self.money_spinbox.setValue(money)
-        if date is None:
-            self.date_checkbox.setChecked(False)
-        else:
-            self.date_edit.setDate(date)
-        self.category = get(categories, lambda c: c.id == category_id, no_category)
-        self.category_combobox.setCurrentIndex(self.category_combobox.findData(self.category.id))
-
-        # Переменная, которая указывает, что транзакцию должна быть удаленна
-        self.deleted = False
-
-        # Добавляем допольнительную кнопку - удалить транзакцию
-        self.delete_button = QPushButton("Удалить", self)
-        self.delete_button.clicked.connect(self.set_as_deleted)
-        self.buttons_layout.insertWidget(0, self.delete_button)
-
-    def check_data(self):
-        """Проверяем данные формы. Если данные недействительны, то кнопка 'Сохранить' будет выключена"""
-        state = True
-
-        if self.transaction.money != 0:
-            if self.default_settings["money"] != self.transaction.money:
-                state = False
-            elif not self.default_settings["category_id"] == self.category.id:
-                state = False
-            elif self.account.id != self.default_settings["account_id"]:
-                state = False
-            elif self.transaction.date != self.default_settings["date"]:
-                state = False
-
-        self.add_button.setDisabled(state)
-
-    def set_as_deleted(self):
-        """Когда пользователь хочет удалить транзакцию"""
-        dialog = QMessageBox.warning(
-            self,
-            "Удаление транзакции",
-            "Вы точно хотите удалить данную транзакцию?",
-            QMessageBox.Yes | QMessageBox.Cancel,
-            QMessageBox.Yes
-        )
+        menu = QMenu(self)
+        menu.addAction(f"Удалить ({len(selected)})", partial(self.delete_transactions, selected))
+        category_menu = menu.addMenu("Категория")
+        for category in (no_category, *self.categories):
+            category_menu.addAction(category.name, partial(self.change_category, selected, category))
+        menu.addAction("Повторить сегодня", partial(self.repeat_transactions, selected))
 
-        # Если пользователь решил, что транзакцию нужно удалить, то пометим это и закроем окно
-        if dialog == QMessageBox.Yes:
-            self.deleted = True
-            self.accept()
+        menu.exec_(history.viewport().mapToGlobal(position))
 
+    def delete_transactions(self, selected):
+        """
+        Удалить выбранные транзакции одним запросом
 
-class CreateAccountDialog(QDialog, CreateAccountDialogUi):
-    def __init__(self, accounts, currencies, *args, **kwargs):
+        :param selected: список пар (database.Transaction, database.Category)
         """
-        Виджет предназначенный для создания нового счёта
+        dialog = QMessageBox.warning(self, "Удаление транзакций",
+                                     f"Вы точно хотите удалить выбранные транзакции ({len(selected)})?",
+                                     QMessageBox.Yes | QMessageBox.Cancel, QMessageBox.Yes)
+        if dialog != QMessageBox.Yes:
+            return
+
+        transactions = [transaction for transaction, _ in selected]
+        transaction_ids = [transaction.id for transaction in transactions]
+        self.save(lambda db: TransactionRepository(db).delete_many(transaction_ids),
+                  {transaction.account_id for transaction in transactions}, removed=transactions)
+
+    def change_category(self, selected, category):
+        """
+        Поставить выбранным транзакциям одну категорию одним запросом
 
-        :param accounts: список, содержащий все доступные счета
-        :param categories: список, содержащий все доступные категории
+        :param selected: список пар (database.Transaction, database.Category)
+        :param category: database.Category, новая категория
         """
-        super(CreateAccountDialog, self).__init__(*args, **kwargs)
-        self.setupUi(self)
-        self.setWindowIcon(QIcon("icon.ico"))
-        self.setWindowTitle("Создать счёт")
+        originals = [transaction for transaction, original_category in selected if original_category.id != category.id]
+        changed = [Transaction(transaction.id, transaction.account_id, category.id, transaction.money, transaction.day,
+                               transaction.note) for transaction in originals]
+        if changed:
+            self.save(lambda db: TransactionRepository(db).update_many(changed),
+                      {transaction.account_id for transaction in changed}, removed=originals, added=changed)
+
+    def repeat_transactions(self, selected):
+        """
+        Добавить копии выбранных транзакций с сегодняшней датой одним запросом
 
-        # Основные переменные
-        self.accounts = accounts
-        self.currencies = currencies
+        :param selected: список пар (database.Transaction, database.Category)
+        """
+        today = date_to_days(QDate.currentDate())
+        copies = [Transaction(None, transaction.account_id, transaction.category_id, transaction.money, today,
+                              transaction.note) for transaction, _ in selected]
+        self.save(lambda db: TransactionRepository(db).add_many(copies),
+                  {transaction.account_id for transaction in copies}, added=copies)
 
-        self.account = Account(0, None, default_color, currencies[0].short_name, 0)
+    @profiler.timed("ui")
+    def account_changed(self, index):
+        """Когда пользователь выберает другой счёт из выпадающего списка"""
+        account_id = self.accounts_combobox.itemData(index)
+        self.account = self.all_accounts if account_id is None else self.accounts.get(account_id)
+        self.show_account_info()  # Изменяем информацию о счёте
 
-        # Показываем, как будет выглядить счёт после создания
-        self.account_info = AccountInfo(self.account)
-        self.account_info.set_name("Без названия")
-        self.main_layout.insertWidget(0, self.account_info)
+        self.set_transactions()  # Ставим историю транзакций для выбранного счёта
+        self.set_summary()
 
-        for currency in self.currencies:
-            self.currency_combobox.addItem(currency.name, currency.short_name)
+    def add_transaction(self):
+        """Когда пользователь добавляет транзакцию"""
+        from core.dialogs import AddTransactionDialog
 
-        # Подключаем функции к элементам интерфейса
-        self.add_button.clicked.connect(self.accept)
-        self.cancel_button.clicked.connect(self.reject)
-        self.money_spinbox.valueChanged.connect(self.money_changed)
-        self.name_line_edit.textChanged.connect(self.name_changed)
-        self.currency_combobox.currentIndexChanged.connect(self.currency_changed)
-        self.change_color_button.clicked.connect(self.change_color)
-
-    def check_data(self):
-        """Проверяем данные формы. Если данные недействительны, то кнопка 'Добавить' будет выключена"""
-        state = True
-
-        # Ищем, чтобы имя нового счёта не совпадало с другими именами счетов
-        if self.account.name is not None:
-            for account in self.accounts:
-                if account.name == self.account.name:
-                    break
-            else:
-                state = False
+        dialog = AddTransactionDialog(self.accounts, self.categories, self.account.id)
 
-        self.add_button.setDisabled(state)
+        # Если диалоговое окно завершило работу с успехом
+        if dialog.exec_():
+            account = dialog.account
+            transaction = dialog.transaction
+            category = dialog.category
 
-    def money_changed(self, value):
-        """Когда мы изменяем начальное количество денег на счёте"""
-        self.account_info.set_money(value)
-        self.account.money = value
+            # Делаем изменения в базу данных. Сумма на счету изменяется триггером базы данных
+            transaction.account_id = account.id
+            transaction.category_id = category.id
+            self.save(lambda db: TransactionRepository(db).add(transaction), (account.id,), added=(transaction,))
 
-        self.check_data()
+    def edit_transaction(self, transaction_id, account_id, category_id, money, date, note=None):
+        """Когда пользователь изменяет трназкцию"""
+        from core.dialogs import EditTransactionDialog
 
-    def name_changed(self, value):
-        """Когда мы изменяем название счёта"""
-        # Если поле не пустое
-        if value:
-            self.account_info.set_name(value)
-            self.account.name = value
-        else:
-            self.account_info.set_name("Нет названия")
-            self.account.name = None
+        # Находит аккаунт, на котором проходила транзакция и приводим в тот внешний вид, который был до этой транзакции
+        accounts = deepcopy(self.accounts)
+        accounts.get(account_id).money -= money
 
-        self.check_data()
+        dialog = EditTransactionDialog(accounts, self.categories, account_id, category_id, money, date, note)
 
-    def currency_changed(self, index):
-        """Когда мы изменяем валюту счёта"""
-        currency = get(self.currencies, lambda c: c.short_name == self.currency_combobox.itemData(index))
-        self.account.currency = currency.short_name
-        self.account_info.set_currency(currency.short_name)
+        # Если диалоговое окно завершило работу с успехом
+        if dialog.exec_():
+            original_account = accounts.get(account_id)
+            edited_account = dialog.account
+            transaction = dialog.transaction
+            category = dialog.category
 
-        self.check_data()
+            transaction.id = transaction_id
+            transaction.account_id = edited_account.id
+            transaction.category_id = category.id
 
-    def change_color(self):
-        """Когда мы изменяем цвет счёта"""
-        color = QColorDialog.getColor(self.account.color)
-        if color.isValid():
-            self.account.color = color
-            self.account_info.set_color(color)
+            # Транзакция в том виде, в каком она показана в истории сейчас
+            original = Transaction(transaction_id, original_account.id, category_id, money, date, note)
 
-        self.check_data()
+            # Если пользователь нажал на кнопку удалить. Суммы на счетах изменяются триггерами базы данных
+            if dialog.deleted:
+                self.save(lambda db: TransactionRepository(db).delete(transaction_id), (original_account.id,),
+                          removed=(original,))
+            else:
+                self.save(lambda db: TransactionRepository(db).update(transaction),
+                          (original_account.id, edited_account.id), removed=(original,), added=(transaction,))
 
+    def check_balances(self):
+        """Когда пользователь проверяет, сходятся ли суммы на счетах с историей транзакций"""
+        self.executor.submit(lambda db: AccountRepository(db).verify_balances(), self.balances_checked)
 
-class EditAccountDialog(CreateAccountDialog):
-    def __init__(self, accounts, currencies, name, color, money, currency, *args, **kwargs):
+    def balances_checked(self, drifted):
         """
-        Виджет предназначенный для создания нового счёта
+        Когда проверка сумм на счетах завершена
 
-        :param accounts: список, содержащий все доступные счета
-        :param categories: список, содержащий все доступные категории
-        :param name: название счёта, которое будет поставлено по умолчанию
-        :param color: QColor цвет, который будет поставлен по умолчанию
-        :param money: количество денег на счету, которое будет поставлено по умолчанию
-        :param currency: валюта счёта, которая будет поставлена по умолчанию
+        :param drifted: список счетов, где суммы не сходятся (см. AccountRepository.verify_balances)
         """
-        super(EditAccountDialog, self).__init__(accounts, currencies, *args, **kwargs)
+        if not drifted:
+            QMessageBox.information(self, "Проверка счетов", "Суммы на всех счетах сходятся с историей транзакций")
+            return
 
-        # Ставим соотвествующие название кнопки и окна диалога
-        self.setWindowTitle("Редактировать транзакцию")
-        self.add_button.setText("Сохранить")
-        self.money_label.setText("Сумма:")
-
-        # Настройки счёта, которые были в момент открытия окна диалога. По этим настройкам будет идти сравнение, изменил
-        # ли пользователь что-то или нет
-        self.default_settings = {
-            "name": name,
-            "color": color,
-            "money": money,
-            "currency": currency
-        }
-
-        # Переменная, которая указывает, что транзакцию должна быть удаленна
-        self.deleted = False
-
-        # Добавляем допольнительную кнопку - удалить транзакцию
-        self.delete_button = QPushButton("Удалить", self)
-        self.delete_button.clicked.connect(self.set_as_deleted)
-        self.buttons_layout.insertWidget(0, self.delete_button)
-
-        # Если у пользователя всего один счёь, то выключаем кнопку "Удалить". У пользователя должен быть как минимум
-        # один счёт
-        if len(accounts) == 1:
-            self.delete_button.setDisabled(True)
-
-        # Вставляем в формы информацию о счёте
-        self.name_line_edit.setText(name)
-        self.currency_combobox.setCurrentIndex(self.currency_combobox.findData(currency))
-        self.account.color = color
-        self.account_info.set_color(color)
-        self.money_spinbox.setValue(money)
-
-        self.account_info.change_account(self.account)
-
-    def check_data(self):
-        """Проверяем данные формы. Если данные недействительны, то кнопка 'Сохранить' будет выключена"""
-        state = True
-
-        # Ищем, чтобы имя нового счёта не совпадало с другими именами счетов
-        if self.account.name is not None and self.account.name != self.default_settings["name"] and \
-                self.account.name not in [x.name for x in self.accounts]:
-            state = False
-        elif self.account.money != self.default_settings["money"]:
-            state = False
-        elif self.account.color != self.default_settings["color"]:
-            state = False
-        elif self.account.currency != self.default_settings["currency"]:
-            state = False
-
-        self.add_button.setDisabled(state)
-
-    def set_as_deleted(self):
-        dialog = QMessageBox.warning(
+        names = ", ".join(self.accounts.get(row[0]).name for row in drifted)
+        answer = QMessageBox.warning(
             self,
-            "Удаление счёта",
-            "Вы точно хотите удалить данный счёт?",
+            "Проверка счетов",
+            f"Суммы на счетах не сходятся с историей транзакций: {names}. Пересчитать суммы?",
             QMessageBox.Yes | QMessageBox.Cancel,
             QMessageBox.Yes
         )
 
-        # Если пользователь решил, что транзакцию нужно удалить, то пометим это и закроем окно
-        if dialog == QMessageBox.Yes:
-            self.deleted = True
-            self.accept()
+        if answer == QMessageBox.Yes:
+            self.save(lambda db: AccountRepository(db).rebuild_balances(), [row[0] for row in drifted])
+
+    def rebuild_monthly_totals(self):
+        """Когда пользователь пересчитывает итоги по месяцам"""
+        def rebuild(db):
+            repository = SummaryRepository(db)
+            with repository.atomic():
+                repository.rebuild_monthly_totals()
+
+        self.executor.submit(rebuild, lambda result: self.set_summary())
+
+    def import_statement(self):
+        """Когда пользователь импортирует банковскую выписку на текущий счёт"""
+        if self.account is self.all_accounts:
+            QMessageBox.information(self, "Импорт выписки", "Выберите счёт, на который нужно импортировать выписку")
+            return
 
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт выписки", "", "Выписки (*.csv *.ofx *.qfx *.qif)")
+        if not path:
+            return
 
-class ListAccountsDialog(QDialog):
-    def __init__(self, db, accounts, currencies, *args, **kwargs):
+        account = self.account
+        categories = {category.name.lower(): category.id for category in self.categories}
+
+        # Выписка добавляется одной транзакцией базы данных: целиком или никак
+        def run(db):
+            from core.importer import import_file
+
+            with Repository(db).atomic():
+                result = import_file(db, account.id, path, categories)
+
+            return result, AccountRepository(db).balances((account.id,))
+
+        self.executor.submit(run, self.statement_imported, error_callback=self.statement_failed)
+
+    def statement_imported(self, result):
         """
-        Диалог, который показывает список счетов, которые есть у пользователя
+        Когда выписка импортирована
 
-        :param db: подключение к базе данных
-        :param accounts: список, содержащий все доступные счета
-        :param categories: список, содержащий все доступные категории
+        :param result: кортеж ((количество транзакций в выписке, количество добавленных), суммы на счетах)
         """
-        super(ListAccountsDialog, self).__init__(*args, **kwargs)
-        self.resize(423, 194)
-        self.setWindowTitle("Список счетов")
-        self.setWindowIcon(QIcon("icon.ico"))
+        (read, added), balances = result
 
-        # Ставим основные переменные
-        self.db = db
-        self.accounts = accounts
-        self.currencies = currencies
+        self.set_balances(balances)
+        if self.account.id in balances:
+            self.set_transactions()
+            self.set_summary()
+
+        message = f"Добавлено транзакций: {added}"
+        if added < read:
+            message += f" из {read}. Остальные уже были импортированы раньше"
+        QMessageBox.information(self, "Импорт выписки", message)
+
+    def statement_failed(self, error):
+        """Когда выписку не удалось импортировать"""
+        QMessageBox.warning(self, "Импорт выписки", f"Не удалось импортировать выписку: {error}")
 
-        # Создаем виджет для вывода списка счетов на данный момент
-        self.main_layout = QHBoxLayout(self)
-        self.accounts_list_widget = AccountsList(self)
-        self.main_layout.addWidget(self.accounts_list_widget)
+    def export_history(self):
+        """
+        Когда пользователь выгружает историю текущего счёта (или всех счетов). Если в поиске задан промежуток дат, то
+        выгружается только он
+        """
+        path, _ = QFileDialog.getSaveFileName(self, "Экспорт истории", f"{self.account.name}.csv",
+                                              "CSV (*.csv);;NDJSON (*.ndjson);;Parquet (*.parquet)")
+        if not path:
+            return
 
-        # Ставим счета
-        self.set_accounts()
+        account_ids = None if self.account is self.all_accounts else (self.account.id,)
+        start, end = self.search.start, self.search.end
 
-    def set_accounts(self):
-        """Сортируем счета по алфавитному порядку и ставим их в списке"""
-        sorted_accounts = sorted(self.accounts, key=lambda a: a.name, reverse=True)
-        self.accounts_list_widget.set_accounts(sorted_accounts, self.edit_account)
+        def run(db):
+            from core.exporter import export_file
 
-    def edit_account(self, original_account):
-        """Когда пользователь редактирует счёт"""
-        dialog = EditAccountDialog(self.accounts, self.currencies, original_account.name, original_account.color,
-                                   original_account.money, original_account.currency)
+            return export_file(db, path, account_ids, start, end)
 
+        self.executor.submit(run, lambda count: QMessageBox.information(self, "Экспорт истории",
+                                                                        f"Выгружено транзакций: {count}"),
+                             error_callback=lambda error: QMessageBox.warning(
+                                 self, "Экспорт истории", f"Не удалось выгрузить историю: {error}"))
+
+    def create_account(self):
+        """Когда пользователь создаёт счёт"""
+        from core.dialogs import CreateAccountDialog
+
+        dialog = CreateAccountDialog(self.accounts, self.currencies)
+
+        # Если диалоговое окно завершило работу с успехом
         if dialog.exec_():
             account = dialog.account
-            account.id = original_account.id
 
-            cursor = self.db.cursor()
+            # Добавляем информацию о счёте в базу данных. ID счёта ставится тот, что сгенерировала база данных
+            def add(db):
+                repository = AccountRepository(db)
+                with repository.atomic():
+                    repository.add(account)
 
-            # Если пользотель нажал на кнопку "удалить"
-            if dialog.deleted:
-                # # Удаляем транзакции связанные со счётом и удаляем сам счёт
-                cursor.execute("DELETE FROM 'transaction' WHERE account_id = ?", (account.id,))
-                cursor.execute("DELETE FROM account WHERE id = ?", (account.id,))
-
-                # Находим счёт в списке счетов и удаляем его
-                for index in range(len(self.accounts)):
-                    if self.accounts[index].id == account.id:
-                        del self.accounts[index]
-                        break
-            else:
-                # Делаем изменения в базе данных
-                cursor.execute(
-                    "UPDATE account SET name = ?, color = ?, currency = ?, money = ? WHERE id = ?",
-                    (account.name, account.color.name()[1:] if account.color else None, account.currency, account.money,
-                     account.id)
-                )
+            self.executor.submit(add, lambda result: self.account_created(account))
 
-                # Находим счёт в списке счетов и изменяем его
-                for index in range(len(self.accounts)):
-                    if self.accounts[index].id == account.id:
-                        self.accounts[index].name = account.name
-                        self.accounts[index].color = account.color
-                        self.accounts[index].currency = account.currency
-                        self.accounts[index].money = account.money
+    def account_created(self, account):
+        """
+        Когда счёт добавлен в базу данных
 
-            self.db.commit()
+        :param account: database.Account, новый счёт
+        """
+        # Обновляем данные в программе. Счёт встаёт в выпадающий список на своё место после пункта "Все счета"
+        self.accounts.add(account)
+        self.accounts_combobox.insertItem(self.accounts.list().index(account) + 1, account.name, account.id)
+        self.update_net_worth()
 
-            # Обновляем список аккаунтов в диалоге
-            self.set_accounts()
+    def accounts_list(self):
+        """Когда пользователь открывает список счетов"""
+        from core.dialogs import ListAccountsDialog
+
+        # Изменения счетов сохраняются в фоновом потоке, поэтому главная страница обновляется, когда они сохранены, даже
+        # если диалог уже закрыт. Диалог создаётся один раз: пока изменения сохраняются, он показывает их счета
+        # выключенными, в том числе если пользователь открыл список счетов заново
+        if self.accounts_dialog is None:
+            self.accounts_dialog = ListAccountsDialog(self.executor, self.accounts, self.currencies)
+            self.accounts_dialog.changed.connect(self.accounts_changed)
+        else:
+            self.accounts_dialog.set_accounts()
+
+        self.accounts_dialog.exec_()  # Открываем диалоговое окно
+
+    def accounts_changed(self):
+        """Когда в списке счетов изменён или удалён счёт"""
+        # Счёт, который выбран на главной странице, изменяется в справочнике на месте
+        if self.account is self.all_accounts:
+            # В общей истории могли измениться названия счетов или пропасть транзакции удалённого счёта
+            self.set_transactions()
+        elif self.account.id not in self.accounts:
+            # Если аккаунт был удалён, то будет поставлен первый по списку, а если счетов не осталось - все счета
+            self.account = self.accounts[0] if len(self.accounts) else self.all_accounts
+            self.set_transactions()
+
+        # Меняем информацию на главном экране. Валюта счёта могла измениться, поэтому сводка запрашивается заново
+        self.show_account_info()
+        self.set_summary()
+        self.update_net_worth()
+
+        # Перед тем как почистить все элементы combobox, мы отключаем привязанную функцию, которая отвечает за
+        # динамическое изменение информации о счёте на главной странице программы. Делаем это для устранения ошибки,
+        # связанной с пустым combobox
+        self.accounts_combobox.currentIndexChanged.disconnect()
+        self.accounts_combobox.clear()
+        # Обновляем combobox актуальным списком счетов и подключаем фукнцию, отключённую ранее
+        self.fill_accounts_combobox()
+        self.accounts_combobox.currentIndexChanged.connect(self.account_changed)
 
 
 class Main(QMainWindow):
-    def __init__(self):
+    @profiler.timed("startup")
+    def __init__(self, db_path=default_path):
         """
-        Основной класс программы. Здесь происходит подключение к базе данный, запуск основной страницы программы и
-        генерация меню
+        Основной класс программы. Сначала показывается пустое окно, а подключение к базе данных, обновление её схемы и
+        загрузка справочников идут в фоновом потоке. Основная страница программы и меню создаются, когда справочники
+        загружены, а история транзакций подгружается уже после этого
+
+        :param db_path: путь к файлу базы данных
         """
         super(Main, self).__init__()
         self.resize(650, 450)
         self.setWindowTitle("Мои доходы и расходы")
         self.setWindowIcon(QIcon("icon.ico"))
 
-        # Подключение к базе данных
-        self.db = sqlite3.connect("db.sqlite")
+        # Одна таблица стилей на всё приложение (см. widgets.stylesheet)
+        QApplication.instance().setStyleSheet(stylesheet)
+
+        self.statusBar().showMessage("Загрузка...")
 
-        cursor = self.db.cursor()
+        # Справочники счетов, категорий и валют, которые загружаются в фоновом потоке
+        self.accounts = None
+        self.categories = None
+        self.currencies = None
+
+        # Все запросы к базе данных выполняются в фоновом потоке по очереди. Схема базы данных обновляется первым же
+        # запросом, поэтому остальные запросы видят актуальную схему
+        self.executor = DatabaseExecutor(db_path)
+        self.executor.submit(self.load, self.loaded, error_callback=self.load_failed)
+
+    @staticmethod
+    def load(db):
+        """
+        Обновить схему базы данных до актуальной версии и получить все доступные счета, категории транзакции и валюты.
+        Выполняется в фоновом потоке
+
+        :param db: подключение к базе данных
+        :return: кортеж database.Registry (счета, категории, валюты)
+        """
+        migrate(db)
 
-        # Получить все доступные счета из базы данных
-        self.accounts = []
-        for row in cursor.execute("SELECT * FROM account").fetchall():
-            self.accounts.append(Account(*row))
-        self.accounts.sort(key=lambda a: a.name)
+        return (Registry(AccountRepository(db).all(), sort_key=lambda a: a.name),
+                Registry(CategoryRepository(db).all(), sort_key=lambda c: c.name, reverse=True),
+                Registry(CurrencyRepository(db).all(), key=lambda c: c.short_name, sort_key=lambda c: c.name,
+                         reverse=True))
 
-        # Получить все доступные категории транзакции из базы данных
-        self.categories = []
-        for row in cursor.execute("SELECT * FROM category").fetchall():
-            self.categories.append(Category(*row))
-        self.categories.sort(key=lambda c: c.name, reverse=True)
+    def loaded(self, registries):
+        """
+        Когда справочники загружены: создаём основную страницу программы и меню. Справочники общие для всей программы:
+        главной страницы и диалогов
 
-        # Получить все доступные валюты
-        self.currencies = []
-        for row in cursor.execute("SELECT * FROM currency").fetchall():
-            self.currencies.append(Currency(*row))
-        self.currencies.sort(key=lambda c: c.name, reverse=True)
+        :param registries: кортеж database.Registry (счета, категории, валюты)
+        """
+        self.accounts, self.categories, self.currencies = registries
+        self.statusBar().clearMessage()
 
-        main_page = MainPage(self.db, self.accounts, self.categories, self.currencies)
+        main_page = MainPage(self.executor, self.accounts, self.categories, self.currencies)
         self.setCentralWidget(main_page)
 
+        # Сводка по периодам в отдельной области, которую можно скрыть
+        summary_dock = QDockWidget("Сводка", self)
+        summary_dock.setWidget(main_page.summary_panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, summary_dock)
+        summary_dock.hide()
+
+        self.statusBar().addPermanentWidget(main_page.net_worth_label)
+
         # Создаём меню, в котором мы сможем редактировать счета
         create_account_action = QAction("Создать счёт", self)
         create_account_action.triggered.connect(main_page.create_account)
         accounts_list_actions = QAction("Список счетов", self)
         accounts_list_actions.triggered.connect(main_page.accounts_list)
+        import_statement_action = QAction("Импорт выписки...", self)
+        import_statement_action.triggered.connect(main_page.import_statement)
+        export_history_action = QAction("Экспорт истории...", self)
+        export_history_action.triggered.connect(main_page.export_history)
 
         menu = self.menuBar()
         accounts_menu = menu.addMenu("Счета")
         accounts_menu.addAction(create_account_action)
         accounts_menu.addAction(accounts_list_actions)
+        accounts_menu.addAction(import_statement_action)
+        accounts_menu.addAction(export_history_action)
+
+        # Меню с обслуживанием базы данных
+        check_balances_action = QAction("Проверить суммы на счетах", self)
+        check_balances_action.triggered.connect(main_page.check_balances)
+
+        load_rates_action = QAction("Загрузить курсы валют...", self)
+        load_rates_action.triggered.connect(main_page.load_rates)
+
+        rebuild_monthly_totals_action = QAction("Пересчитать итоги по месяцам", self)
+        rebuild_monthly_totals_action.triggered.connect(main_page.rebuild_monthly_totals)
+
+        service_menu = menu.addMenu("Сервис")
+        service_menu.addAction(check_balances_action)
+        service_menu.addAction(load_rates_action)
+        service_menu.addAction(rebuild_monthly_totals_action)
+
+        view_menu = menu.addMenu("Вид")
+        view_menu.addAction(summary_dock.toggleViewAction())
+
+        # Отчёт профилировщика поверх главной страницы, если программа запущена с профилировщиком (см. core.profiler)
+        if profiler.enabled:
+            overlay = ProfilerOverlay(profiler, main_page)
+            overlay.move(8, 8)
+            overlay.hide()
+
+            profiler_action = QAction("Профилировщик", self)
+            profiler_action.setCheckable(True)
+            profiler_action.setShortcut("F12")
+            profiler_action.toggled.connect(overlay.setVisible)
+            view_menu.addAction(profiler_action)
+
+    def load_failed(self, error):
+        """Когда базу данных не удалось открыть: без неё программа работать не может"""
+        QMessageBox.critical(self, "Мои доходы и расходы", f"Не удалось открыть базу данных: {error}")
+        self.close()
 
     def closeEvent(self, event):
-        self.db.close()  # Закрыть подключение с базой данных при закрытии программы
+        # Закрыть подключение с базой данных при закрытии программы
+        self.executor.close()
 
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
-    main = Main()
+    # Путь к базе данных можно передать первым аргументом командной строки
+    arguments = app.arguments()
+    main = Main(arguments[1]) if len(arguments) > 1 else Main()
     main.show()
     sys.exit(app.exec())
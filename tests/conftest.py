@@ -0,0 +1,38 @@
+import shutil
+
+import pytest
+
+from PyQt5.QtCore import QCoreApplication
+
+from core.database import connect, default_path, migrate
+
+
+@pytest.fixture
+def legacy_path(tmp_path):
+    """Копия поставляемого файла db.sqlite: схема до первой миграции, один счёт и стандартные категории"""
+    path = str(tmp_path / "db.sqlite")
+    shutil.copyfile(default_path, path)
+    return path
+
+
+@pytest.fixture
+def legacy_db(legacy_path):
+    """Подключение к копии db.sqlite, к которой ещё не применены миграции"""
+    db = connect(legacy_path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def database_path(legacy_path):
+    """Путь к копии db.sqlite, к которой применены все миграции"""
+    db = connect(legacy_path)
+    migrate(db)
+    db.close()
+    return legacy_path
+
+
+@pytest.fixture(scope="session")
+def application():
+    """QCoreApplication для сигналов между потоками"""
+    return QCoreApplication.instance() or QCoreApplication([])
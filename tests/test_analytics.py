@@ -0,0 +1,137 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from benchmarks.generate import generate
+from core import analytics
+from core.analytics import TransactionFrame, group_sum, no_category, no_date
+from core.currency import CurrencyConverter
+from core.database import AccountRepository, connect
+
+
+@pytest.fixture(scope="module")
+def ledger(tmp_path_factory):
+    """Синтетическая история: несколько счетов в рублях, долларах и евро, транзакции без даты и без категории"""
+    path = str(tmp_path_factory.mktemp("analytics") / "ledger.sqlite")
+    generate(path, 3000, accounts=6, categories=12, seed=7, years=2)
+    db = connect(path)
+    yield db
+    db.close()
+
+
+def sql_split(db, key, where="1", parameters=()):
+    """Доходы и расходы по ключу обычным GROUP BY"""
+    rows = db.execute(f"SELECT {key} AS k, SUM(MAX(money, 0)), SUM(MIN(money, 0)) FROM 'transaction' "
+                      f"WHERE {where} GROUP BY k ORDER BY k", parameters).fetchall()
+    return [list(column) for column in zip(*rows)] if rows else [[], [], []]
+
+
+def as_lists(arrays):
+    return [array.tolist() for array in arrays]
+
+
+def test_load(ledger):
+    frame = TransactionFrame.load(ledger)
+
+    assert len(frame) == 3000
+    assert all(array.dtype == np.int64 for array in (frame.account_id, frame.category_id, frame.money, frame.day))
+    assert int((frame.day == no_date).sum()) == ledger.execute(
+        "SELECT COUNT(*) FROM 'transaction' WHERE date IS NULL").fetchone()[0]
+    assert frame.total() == ledger.execute("SELECT SUM(money) FROM 'transaction'").fetchone()[0]
+    assert (frame.income(), frame.outcome()) == ledger.execute(
+        "SELECT SUM(MAX(money, 0)), SUM(MIN(money, 0)) FROM 'transaction'").fetchone()
+
+    account = TransactionFrame.load(ledger, 2)
+    assert len(account) == len(frame.for_account(2)) == ledger.execute(
+        "SELECT COUNT(*) FROM 'transaction' WHERE account_id = 2").fetchone()[0]
+
+
+def test_by_category_dense(ledger):
+    frame = TransactionFrame.load(ledger)
+
+    assert as_lists(frame.by_category()) == sql_split(ledger, f"IFNULL(category_id, {no_category})")
+
+
+def test_by_category_sparse(ledger, monkeypatch):
+    # Те же суммы через сортировку и reduceat
+    monkeypatch.setattr(analytics, "dense_limit", 0)
+    frame = TransactionFrame.load(ledger)
+
+    assert as_lists(frame.by_category()) == sql_split(ledger, f"IFNULL(category_id, {no_category})")
+
+
+def test_sparse_keys():
+    # Ключи не укладываются в dense_limit, поэтому группировка идёт через сортировку
+    keys = np.array([5, 1 << 40, 5, -(1 << 40), 1 << 40], dtype=np.int64)
+    money = np.array([1, 2, 3, 4, 5], dtype=np.int64)
+
+    assert as_lists(group_sum(keys, money)) == [[-(1 << 40), 5, 1 << 40], [4, 4, 7]]
+
+
+def test_exactness_guard(ledger):
+    # Сумма модулей больше 2 ** 53: через float64 bincount сумма потеряла бы единицы, поэтому берётся reduceat
+    big = (1 << 53) + 1
+    keys = np.array([1, 1, 2, 2], dtype=np.int64)
+    money = np.array([big, 2, -big, -1], dtype=np.int64)
+
+    expected = ledger.execute("SELECT k, SUM(m) FROM (SELECT 1 AS k, ? AS m UNION ALL SELECT 1, 2 UNION ALL "
+                              "SELECT 2, ? UNION ALL SELECT 2, -1) GROUP BY k ORDER BY k", (big, -big)).fetchall()
+    assert as_lists(group_sum(keys, money)) == [list(column) for column in zip(*expected)]
+    assert group_sum(keys, money)[1].dtype == np.int64
+
+
+def test_empty():
+    keys = np.array([], dtype=np.int64)
+    assert as_lists(group_sum(keys, keys, keys)) == [[], [], []]
+
+
+def test_by_month(ledger):
+    frame = TransactionFrame.load(ledger)
+    months, income, outcome = frame.by_month()
+
+    expected = sql_split(ledger, "STRFTIME('%Y-%m', date * 86400, 'unixepoch')", "date IS NOT NULL")
+    assert [str(month) for month in months] == expected[0]
+    assert [income.tolist(), outcome.tolist()] == expected[1:]
+
+    # Те же суммы лежат в итогах по месяцам
+    totals = ledger.execute("SELECT SUM(income), SUM(outcome) FROM monthly_totals WHERE month != -1 "
+                            "GROUP BY month ORDER BY month").fetchall()
+    assert [list(column) for column in zip(*totals)] == [income.tolist(), outcome.tolist()]
+
+
+def test_between(ledger):
+    frame = TransactionFrame.load(ledger)
+    start = (date(2019, 6, 1) - date(1970, 1, 1)).days
+    end = start + 90
+
+    assert as_lists(frame.between(start, end).by_category()) == \
+        sql_split(ledger, f"IFNULL(category_id, {no_category})", "date BETWEEN ? AND ?", (start, end))
+
+
+def test_running_balance(ledger):
+    frame = TransactionFrame.load(ledger, 1)
+    days, balance = frame.running_balance(opening=1000)
+
+    expected = ledger.execute("SELECT date, 1000 + SUM(SUM(money)) OVER (ORDER BY date) FROM 'transaction' "
+                              "WHERE account_id = 1 AND date IS NOT NULL GROUP BY date ORDER BY date").fetchall()
+    assert [days.tolist(), balance.tolist()] == [list(column) for column in zip(*expected)]
+
+
+def test_net_worth(ledger):
+    frame = TransactionFrame.load(ledger)
+    converter = CurrencyConverter.load(ledger)
+    accounts = AccountRepository(ledger).all()
+    days, total = frame.net_worth(converter, accounts, "RUB")
+
+    assert days.tolist() == [row[0] for row in ledger.execute(
+        "SELECT DISTINCT date FROM 'transaction' WHERE date IS NOT NULL ORDER BY date")]
+
+    # Для нескольких дней - суммы на счетах по SQL, переведённые по курсу дня
+    for day in days[::len(days) // 5].tolist() + [days[-1]]:
+        expected = 0.0
+        for account in accounts:
+            after = ledger.execute("SELECT COALESCE(SUM(money), 0) FROM 'transaction' "
+                                   "WHERE account_id = ? AND date > ?", (account.id, day)).fetchone()[0]
+            expected += (account.money - after) * converter.rate(account.currency, "RUB", day)
+        assert total[days.tolist().index(day)] == round(expected)
@@ -0,0 +1,103 @@
+import io
+
+import numpy as np
+import pytest
+
+from core.analytics import no_date
+from core.currency import CurrencyConverter, RateError, load_rates, read_rates
+from core.database import CurrencyRateRepository, Money, Repository, connect
+from core.importer import StatementError
+
+
+rates = [
+    (10, "USD", "RUB", 60.0),
+    (20, "USD", "RUB", 70.0),
+    (15, "EUR", "USD", 1.5),
+]
+
+
+@pytest.fixture
+def converter():
+    return CurrencyConverter(rates)
+
+
+def test_direct_rate(converter):
+    assert converter.rate("USD", "RUB", 10) == 60.0
+    assert converter.rate("USD", "RUB", 19) == 60.0
+    assert converter.rate("USD", "RUB", 20) == 70.0
+    assert converter.rate("USD", "RUB") == 70.0  # последний известный курс
+    assert converter.rate("USD", "RUB", 0) == 60.0  # до первого курса действует первый
+    assert converter.rate("RUB", "RUB", 15) == 1.0
+
+
+def test_inverse_rate(converter):
+    assert converter.rate("RUB", "USD", 15) == pytest.approx(1 / 60)
+
+
+def test_cross_rate(converter):
+    # EUR -> USD -> RUB, курс меняется, когда меняется любой из двух курсов
+    assert converter.rate("EUR", "RUB", 12) == pytest.approx(1.5 * 60)
+    assert converter.rate("EUR", "RUB", 20) == pytest.approx(1.5 * 70)
+    assert converter.rate("RUB", "EUR", 20) == pytest.approx(1 / (1.5 * 70))
+
+
+def test_missing_rate(converter):
+    with pytest.raises(RateError) as error:
+        converter.rate("JPY", "RUB")
+
+    assert (error.value.from_currency, error.value.to_currency) == ("JPY", "RUB")
+    assert isinstance(error.value, LookupError)
+
+
+def test_convert(converter):
+    converted = converter.convert(Money(1001), "USD", "RUB", 10)
+    assert converted == 60060
+    assert type(converted) is Money
+    assert converter.convert(Money(333), "RUB", "USD", 10) == 6  # 5.55 копейки округляются до целых
+
+
+def test_convert_many(converter):
+    money = np.array([100, -100, 100], dtype=np.int64)
+    days = np.array([10, 20, no_date], dtype=np.int64)
+
+    converted = converter.convert_many(money, days, "USD", "RUB")
+
+    assert converted.tolist() == [6000, -7000, 7000]
+    assert converted.dtype == np.int64
+
+
+def test_total(converter):
+    assert converter.total({"RUB": Money(500), "USD": Money(100), "EUR": Money(10)}, "RUB") == \
+        500 + 7000 + round(10 * 1.5 * 70)
+    assert converter.total({}, "RUB") == 0
+
+
+def test_read_rates():
+    file = io.StringIO("Дата;Из;В;Курс\n15.01.2020;usd;rub;61,5\n\n16.01.2020;EUR;RUB;1 068,25\n")
+
+    assert list(read_rates(file)) == [(18276, "USD", "RUB", 61.5), (18277, "EUR", "RUB", 1068.25)]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("15.01.2020;USD;RUB\n", "нужны"),
+    ("15.01.2020;USD;RUB;61\n16.01.2020;USD;RUB;много\n", "курс"),
+    ("15.01.2020;USD;RUB;0\n", "больше нуля"),
+])
+def test_read_rates_errors(text, message):
+    with pytest.raises(StatementError, match=message):
+        list(read_rates(io.StringIO(text)))
+
+
+def test_load_rates(database_path, tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("date,from,to,rate\n2020-01-15,USD,RUB,61.5\n2020-01-15,XXX,RUB,1\n2020-01-22,USD,RUB,62\n"
+                    "2020-01-15,USD,RUB,61.6\n", encoding="utf-8")
+
+    db = connect(database_path)
+    with Repository(db).atomic():
+        load_rates(db, str(path))
+
+    # Неизвестная валюта пропускается, а курс на ту же дату заменяется
+    assert sorted(CurrencyRateRepository(db).all()) == [(18276, "USD", "RUB", 61.6), (18283, "USD", "RUB", 62.0)]
+    assert CurrencyConverter.load(db).rate("RUB", "USD", 18280) == pytest.approx(1 / 61.6)
+    db.close()
@@ -0,0 +1,134 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from core import exporter
+from core.database import AccountRepository, Repository, connect
+from core.exporter import ExportError, export_file
+from core.importer import import_file
+
+
+transactions = [
+    (15, 8, -25025, 18276, "кофе, «у дома»"),
+    (15, None, 10000000, 18293, 'зарплата "январь"'),
+    (15, 1, -1, None, None),
+    (15, 3, -999, -40, "до 1970\nвторая строка"),
+    (16, 8, 5, 18300, "кофе"),
+    (15, 8, -123456789012, 18400, None),
+    (15, 8, -25025, 18276, "кофе, «у дома»"),
+]
+
+
+@pytest.fixture
+def db(database_path):
+    db = connect(database_path)
+    with db:
+        db.execute("INSERT INTO account(id, name, color, currency, money) VALUES (16, 'Доллары', 'a1a1a1', 'USD', 0)")
+        db.execute("INSERT INTO account(id, name, color, currency, money) VALUES (17, 'Импорт', 'a1a1a1', 'RUB', 0)")
+        db.executemany("INSERT INTO 'transaction'(account_id, category_id, money, date, note) VALUES (?, ?, ?, ?, ?)",
+                       transactions)
+    yield db
+    db.close()
+
+
+def history(db, account_id):
+    return sorted(db.execute("SELECT category_id, money, date, note FROM 'transaction' WHERE account_id = ?",
+                             (account_id,)).fetchall(), key=repr)
+
+
+def test_csv_round_trip(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "chunk_size", 2)
+    path = str(tmp_path / "history.csv")
+
+    assert export_file(db, path, [15]) == 6
+
+    categories = {name.lower(): id for id, name in db.execute("SELECT id, name FROM category")}
+    with Repository(db).atomic():
+        assert import_file(db, 17, path, categories) == (6, 6)
+    with Repository(db).atomic():
+        assert import_file(db, 17, path, categories) == (6, 0)
+
+    assert history(db, 17) == history(db, 15)
+    balances = AccountRepository(db).balances([15, 17])
+    assert balances[17] == balances[15] == sum(money for account_id, _, money, *_ in transactions if account_id == 15)
+
+
+def test_csv_format(db, tmp_path):
+    path = str(tmp_path / "history.csv")
+    export_file(db, path, [16])
+
+    with open(path, encoding="utf-8", newline="") as file:
+        assert file.read() == "id,date,account,currency,category,amount,note\r\n" \
+                              "5,2020-02-08,Доллары,USD,Еда,0.05,кофе\r\n"
+
+
+def test_ndjson(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "chunk_size", 3)
+    path = str(tmp_path / "history.ndjson")
+
+    assert export_file(db, path) == len(transactions)
+
+    with open(path, encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    assert len(lines) == len(transactions)
+
+    rows = [json.loads(line) for line in lines]
+    assert rows[0] == {"id": 3, "date": None, "account": "Мой кошелёк", "currency": "RUB", "category": "Развлечения",
+                       "amount": -0.01, "note": None}
+    assert rows[1]["date"] == "1969-11-22" and rows[1]["note"] == "до 1970\nвторая строка"
+    assert sorted(round(row["amount"] * 100) for row in rows) == sorted(money for _, _, money, *_ in transactions)
+
+
+def test_parquet(db, tmp_path, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(exporter, "chunk_size", 3)
+    path = str(tmp_path / "history.parquet")
+
+    assert export_file(db, path) == len(transactions)
+
+    file = pq.ParquetFile(path)
+    assert file.schema_arrow == pa.schema([
+        ("id", pa.int64()), ("date", pa.date32()), ("account", pa.string()), ("currency", pa.string()),
+        ("category", pa.string()), ("amount", pa.decimal128(18, 2)), ("note", pa.string())])
+    assert file.metadata.num_rows == len(transactions)
+    assert file.metadata.num_row_groups == 3
+
+    rows = file.read().to_pylist()
+    assert rows[0]["date"] is None and rows[0]["amount"] == Decimal("-0.01")
+    assert rows[1]["date"] == date(1969, 11, 22)
+    assert {row["id"]: row["amount"] for row in rows}[6] == Decimal("-1234567890.12")
+    assert sorted(row["amount"] for row in rows) == sorted(Decimal(money) / 100 for _, _, money, *_ in transactions)
+
+
+@pytest.mark.parametrize("account_ids, start, end", [
+    (None, None, None),
+    ([15], None, None),
+    ([15, 16], 18276, 18300),
+    (None, -100, 0),
+    (None, 18300, None),
+    ([], None, None),
+])
+def test_filters(db, tmp_path, account_ids, start, end):
+    path = str(tmp_path / "history.ndjson")
+    count = export_file(db, path, account_ids, start, end)
+
+    with open(path, encoding="utf-8") as file:
+        ids = [json.loads(line)["id"] for line in file]
+
+    expected = [id for id, account_id, day in db.execute("SELECT id, account_id, date FROM 'transaction' "
+                                                         "ORDER BY date, id")
+                if (account_ids is None or account_id in account_ids) and
+                (start is None or day is not None and day >= start) and (end is None or day is not None and day <= end)]
+    assert ids == expected
+    assert count == len(expected)
+
+
+def test_unknown_format(db, tmp_path):
+    with pytest.raises(ExportError, match=".xlsx"):
+        export_file(db, str(tmp_path / "history.xlsx"))
+
+    assert not (tmp_path / "history.xlsx").exists()
+    assert not (tmp_path / "history.xlsx.part").exists()
@@ -0,0 +1,141 @@
+import io
+
+import pytest
+
+from core.database import Money, Repository, connect
+from core.importer import StatementError, import_file, parse_date, parse_money, read_csv, read_ofx, read_qif
+
+
+@pytest.mark.parametrize("text, minor", [
+    ("850.54", 85054),
+    ("850,54", 85054),
+    ("-1 234,50", -123450),
+    ("1\xa0234,5", 123450),
+    ("1,234.56", 123456),
+    ("1.234,56", 123456),
+    ("1'234.56", 123456),
+    ("(99.99)", -9999),
+    ("-.4", -40),
+    ("12", 1200),
+])
+def test_parse_money(text, minor):
+    money = parse_money(text)
+    assert money == minor
+    assert type(money) is Money
+
+
+def test_parse_money_error():
+    with pytest.raises(StatementError, match="сумму"):
+        parse_money("двенадцать")
+
+
+@pytest.mark.parametrize("text, days", [
+    ("15.01.2020", 18276),
+    ("2020-01-15", 18276),
+    ("15.01.20", 18276),
+    ("15/01/2020", 18276),
+    ("15.01.2020 12:30", 18276),
+    ("2020-01-15T12:30:00", 18276),
+    ("20200115", 18276),  # OFX
+    ("31.12.1969", -1),
+    ("", None),
+])
+def test_parse_date(text, days):
+    assert parse_date(text) == days
+
+
+def test_parse_date_error():
+    with pytest.raises(StatementError, match="дату"):
+        parse_date("вчера")
+
+
+def test_read_csv_semicolons_and_russian_header():
+    file = io.StringIO("Дата операции;Сумма операции;Описание;Категория\n"
+                       "15.01.2020;-250,25;Кофе у дома;Еда\n"
+                       "\n"
+                       "01.02.2020;1 000,00;Зарплата;\n")
+
+    assert list(read_csv(file)) == [
+        {"date": "15.01.2020", "money": "-250,25", "note": "Кофе у дома", "category": "Еда"},
+        {"date": "01.02.2020", "money": "1 000,00", "note": "Зарплата", "category": ""},
+    ]
+
+
+def test_read_csv_income_and_outcome_columns():
+    file = io.StringIO("date,credit,debit,memo\n2020-01-15,,250.25,coffee\n2020-02-01,1000,,salary\n")
+
+    assert [(record["money"], record["note"]) for record in read_csv(file)] == [(-25025, "coffee"), (100000, "salary")]
+
+
+def test_read_csv_custom_columns():
+    file = io.StringIO("когда;сколько\n15.01.2020;-1\n")
+
+    with pytest.raises(StatementError):
+        list(read_csv(file))
+
+    file.seek(0)
+    assert list(read_csv(file, {"date": "Когда", "money": "Сколько"})) == \
+        [{"date": "15.01.2020", "money": "-1", "note": "", "category": ""}]
+
+
+def test_read_ofx():
+    file = io.StringIO("OFXHEADER:100\n<OFX><BANKTRANLIST>\n"
+                       "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20200115120000[+3:MSK]\n<TRNAMT>-250.25\n"
+                       "<FITID>A1\n<NAME>Кофейня\n<MEMO>кофе\n</STMTTRN>\n"
+                       "<STMTTRN><DTPOSTED>20200201</DTPOSTED><TRNAMT>1000</TRNAMT><FITID>A2</FITID></STMTTRN>\n"
+                       "</BANKTRANLIST></OFX>\n")
+
+    assert list(read_ofx(file)) == [
+        {"date": "20200115", "money": "-250.25", "note": "Кофейня кофе", "category": "", "id": "A1"},
+        {"date": "20200201", "money": "1000", "note": "", "category": "", "id": "A2"},
+    ]
+
+
+def test_read_qif():
+    file = io.StringIO("!Type:Bank\nD01/15/2020\nT-250.25\nPКофейня\nLЕда\n^\nD02/01'20\nU1,000.00\nMзарплата\n^\n")
+
+    assert list(read_qif(file)) == [
+        {"date": "01/15/2020", "money": "-250.25", "note": "Кофейня", "category": "Еда"},
+        {"date": "02/01'20", "money": "1,000.00", "note": "зарплата", "category": ""},
+    ]
+
+
+def test_import_file(database_path, tmp_path):
+    path = tmp_path / "statement.csv"
+    # Выписка в cp1251 с двумя одинаковыми покупками за день и строкой с нулевой суммой
+    path.write_bytes("Дата;Сумма;Назначение платежа;Категория\n"
+                     "15.01.2020;-250,25;Кофе;еда\n"
+                     "15.01.2020;-250,25;Кофе;еда\n"
+                     "16.01.2020;0;Проверка карты;\n"
+                     "01.02.2020;1000;Зарплата;Неизвестная\n".encode("cp1251"))
+
+    db = connect(database_path)
+    with Repository(db).atomic():
+        assert import_file(db, 15, str(path), {"еда": 8}) == (3, 3)
+    with Repository(db).atomic():
+        assert import_file(db, 15, str(path), {"еда": 8}) == (3, 0)  # повторный импорт ничего не добавляет
+
+    assert db.execute("SELECT category_id, money, date, note FROM 'transaction' ORDER BY id").fetchall() == [
+        (8, -25025, 18276, "Кофе"), (8, -25025, 18276, "Кофе"), (None, 100000, 18293, "Зарплата")]
+    assert db.execute("SELECT money FROM account WHERE id = 15").fetchone() == (100000 - 2 * 25025,)
+    db.close()
+
+
+def test_import_file_is_atomic(database_path, tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("date,amount\n2020-01-15,-1\n2020-01-16,много\n", encoding="utf-8")
+
+    db = connect(database_path)
+    with pytest.raises(StatementError):
+        with Repository(db).atomic():
+            import_file(db, 15, str(path))
+
+    assert db.execute("SELECT COUNT(*) FROM 'transaction'").fetchone() == (0,)
+    db.close()
+
+
+def test_import_unknown_format(database_path, tmp_path):
+    db = connect(database_path)
+    with pytest.raises(StatementError, match="формат"):
+        import_file(db, 15, str(tmp_path / "statement.xlsx"))
+    db.close()
@@ -0,0 +1,112 @@
+import pytest
+
+from core import database
+from core.database import AccountRepository, migrate, migrations
+
+
+def add_legacy_transactions(db):
+    """Транзакции в виде, в котором их хранила программа до миграций: дата строкой dd.MM.yyyy и сумма REAL"""
+    with db:
+        db.execute("UPDATE account SET money = 850.54")
+        db.executemany("INSERT INTO 'transaction'(account_id, category_id, money, date) VALUES (15, ?, ?, ?)",
+                       ((1, -250.25, "15.01.2020"), (None, 99.99, "01.02.2020"), (8, 0.1 + 0.2, None)))
+
+
+def test_upgrade_legacy_database(legacy_db):
+    add_legacy_transactions(legacy_db)
+
+    migrate(legacy_db)
+
+    assert legacy_db.execute("PRAGMA user_version").fetchone()[0] == len(migrations) == 10
+    assert legacy_db.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert legacy_db.execute("PRAGMA foreign_key_check").fetchall() == []
+
+    rows = legacy_db.execute("SELECT category_id, money, date FROM 'transaction' ORDER BY id").fetchall()
+    assert rows == [(1, -25025, 18276), (None, 9999, 18293), (8, 30, None)]
+
+    # Сумма на счету не изменилась, а начальная сумма счёта сходится с историей транзакций
+    assert legacy_db.execute("SELECT money, opening_money FROM account WHERE id = 15").fetchone() == \
+        (85054, 85054 + 25025 - 9999 - 30)
+    assert AccountRepository(legacy_db).money(15) == 85054
+
+    assert legacy_db.execute("SELECT SUM(income), SUM(outcome), SUM(count) FROM monthly_totals").fetchone() == \
+        (9999 + 30, -25025, 3)
+
+
+def test_migrate_is_idempotent(legacy_db):
+    migrate(legacy_db)
+    schema = legacy_db.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+
+    migrate(legacy_db)
+
+    assert legacy_db.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall() == schema
+
+
+def test_failed_migration_is_rolled_back(legacy_db, monkeypatch):
+    migrate(legacy_db)
+    monkeypatch.setattr(database, "migrations", [*migrations, """
+        CREATE TABLE half_done (id INTEGER);
+        UPDATE account SET name = 'Изменён';
+        SELECT * FROM no_such_table;
+    """])
+
+    with pytest.raises(Exception, match="no_such_table"):
+        migrate(legacy_db)
+
+    assert not legacy_db.in_transaction
+    assert legacy_db.execute("PRAGMA user_version").fetchone()[0] == len(migrations)
+    assert legacy_db.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+    assert legacy_db.execute("SELECT name FROM account").fetchall() == [("Мой кошелёк",)]
+    assert legacy_db.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
+def test_failed_migration_keeps_earlier_migrations(legacy_db, monkeypatch):
+    monkeypatch.setattr(database, "migrations", [*migrations[:2], "SELECT * FROM no_such_table;", *migrations[3:]])
+
+    with pytest.raises(Exception, match="no_such_table"):
+        migrate(legacy_db)
+
+    # Первые две миграции зафиксированы, а остальные не начинались
+    assert legacy_db.execute("PRAGMA user_version").fetchone()[0] == 2
+    assert legacy_db.execute("SELECT type FROM pragma_table_info('transaction') WHERE name = 'money'").fetchone() == \
+        ("REAL",)
+
+
+def test_newer_schema(legacy_db):
+    legacy_db.execute(f"PRAGMA user_version = {len(migrations) + 1}")
+
+    with pytest.raises(RuntimeError, match="более новой версией"):
+        migrate(legacy_db)
+
+    assert legacy_db.execute("SELECT type FROM pragma_table_info('transaction') WHERE name = 'date'").fetchone() == \
+        ("TEXT",)
+
+
+def test_account_colors_become_text(legacy_db):
+    # Колонка account.color до миграций INTEGER, поэтому такие цвета SQLite хранил числами
+    with legacy_db:
+        legacy_db.executemany("INSERT INTO account(name, color, currency, money) VALUES (?, ?, 'RUB', 0)",
+                              (("Цифры", "012345"), ("Ноль", "00e000"), ("Бесконечность", "12e345"),
+                               ("Тоже бесконечность", "1e1000"), ("Буквы", "a1b2c3")))
+    assert legacy_db.execute("SELECT typeof(color) FROM account WHERE name = 'Бесконечность'").fetchone() == ("real",)
+
+    migrate(legacy_db)
+
+    assert legacy_db.execute("SELECT type FROM pragma_table_info('account') WHERE name = 'color'").fetchone() == \
+        ("TEXT",)
+    assert legacy_db.execute("SELECT name, color, typeof(color) FROM account ORDER BY id").fetchall() == [
+        ("Мой кошелёк", "00c896", "text"),
+        ("Цифры", "012345", "text"),
+        ("Ноль", "000000", "text"),
+        ("Бесконечность", "a1a1a1", "text"),
+        ("Тоже бесконечность", "a1a1a1", "text"),
+        ("Буквы", "a1b2c3", "text"),
+    ]
+
+    # После миграции такие цвета хранятся как есть и читаются программой
+    with legacy_db:
+        legacy_db.execute("UPDATE account SET color = '00e000' WHERE name = 'Ноль'")
+    colors = {account.name: account.color.name() for account in AccountRepository(legacy_db).all()}
+    assert colors["Цифры"] == "#012345"
+    assert colors["Ноль"] == "#00e000"
+    assert colors["Бесконечность"] == "#a1a1a1"
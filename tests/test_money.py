@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+import pytest
+
+from core.database import Money
+
+
+def test_from_major_rounds_to_minor_units():
+    assert Money.from_major(850.54) == 85054
+    assert Money.from_major(0.1 + 0.2) == 30
+    assert Money.from_major(-19.99) == -1999
+    assert Money.from_major(1.005) == 100  # 1.005 в float чуть меньше 1.005
+    assert type(Money.from_major(1)) is Money
+
+
+def test_major():
+    assert Money(85054).major == 850.54
+    assert Money(-5).major == -0.05
+
+
+def test_arithmetic_stays_integer():
+    total = sum((Money(10) for _ in range(10)), Money(0))
+    assert total == 100
+    assert type(total) is Money
+
+    for value in (Money(250) + 50, 50 + Money(250), Money(350) - 50, 300 - Money(0), -Money(-300)):
+        assert value == 300
+        assert type(value) is Money
+
+    # 0.1 + 0.2 в копейках складывается точно
+    assert Money.from_major(0.1) + Money.from_major(0.2) == Money.from_major(0.3)
+
+
+def test_arithmetic_with_other_types():
+    assert Money(100) * 1.5 == 150.0
+    assert type(Money(100) + Decimal("0.5")) is Decimal
+    with pytest.raises(TypeError):
+        Money(100) + "1"
+
+
+@pytest.mark.parametrize("minor, spec, text", [
+    (85054, ".2f", "850.54"),
+    (-5, ".2f", "-0.05"),
+    (0, ".2f", "0.00"),
+    (123456789, ",.2f", "1,234,567.89"),
+    (-150, "+.2f", "-1.50"),
+    (150, "", "1.50"),
+    (10 ** 20 + 1, ".2f", "1000000000000000000.01"),
+])
+def test_format(minor, spec, text):
+    assert format(Money(minor), spec) == text
+
+
+def test_str_and_repr():
+    assert str(Money(85054)) == "85054"
+    assert repr(Money(-5)) == "Money(-5)"
@@ -0,0 +1,150 @@
+import shutil
+
+import pytest
+
+from core.database import AccountRepository, Money, Repository, SummaryRepository, Transaction, TransactionRepository, \
+    connect, period_bounds
+
+
+def test_balances(database_path):
+    db = connect(database_path)
+    with db:
+        db.execute("UPDATE account SET money = 85054 WHERE id = 15")
+        db.execute("INSERT INTO account(id, name, color, currency, money) VALUES (16, 'Второй', 'a1a1a1', 'RUB', -5)")
+
+    queries = []
+    db.set_trace_callback(queries.append)
+    balances = AccountRepository(db).balances([15, 16, 15, 404])
+    db.set_trace_callback(None)
+
+    assert balances == {15: 85054, 16: -5}
+    assert all(type(money) is Money for money in balances.values())
+    assert len(queries) == 1
+    assert AccountRepository(db).balances(()) == {}
+    db.close()
+
+
+def test_week_periods_before_1970(database_path):
+    db = connect(database_path)
+    with db:
+        # 29.12.1969 - понедельник, 04.01.1970 - воскресенье той же недели, 05.01.1970 - понедельник следующей
+        db.executemany("INSERT INTO 'transaction'(account_id, money, date) VALUES (15, ?, ?)",
+                       ((-100, -3), (-200, -1), (300, 0), (-400, 3), (-500, 4), (-600, -4)))
+
+    periods = SummaryRepository(db).periods(15, "week", -30)
+
+    assert periods == [(4, 0, -500, 1), (-3, 300, -700, 4), (-10, 0, -600, 1)]
+    assert all(period_bounds("week", start)[0] == start for start, *_ in periods)
+    db.close()
+
+
+def test_monthly_periods_before_1970(database_path):
+    db = connect(database_path)
+    with db:
+        # 05.11.1968, 01.12.1969, 31.12.1969, 01.01.1970, 01.02.1970 и транзакция без даты
+        db.executemany("INSERT INTO 'transaction'(account_id, category_id, money, date) VALUES (15, ?, ?, ?)",
+                       ((1, -100, -422), (1, -200, -31), (None, 300, -1), (1, -400, 0), (None, -500, 31),
+                        (1, -600, None)))
+    repository = SummaryRepository(db)
+
+    # Месяц -1 в monthly_totals - это транзакции без даты, а 31.12.1969 попадает в декабрь, который начинается с -31
+    assert db.execute("SELECT month, SUM(income), SUM(outcome), SUM(count) FROM monthly_totals "
+                      "GROUP BY month ORDER BY month").fetchall() == \
+        [(-426, 0, -100, 1), (-31, 300, -200, 2), (-1, 0, -600, 1), (0, 0, -400, 1), (31, 0, -500, 1)]
+
+    for account_id, rates in ((15, None), (None, {"RUB": 1})):
+        assert repository.periods(account_id, "month", -500, rates) == \
+            [(31, 0, -500, 1), (0, 0, -400, 1), (-31, 300, -200, 2), (-426, 0, -100, 1)]
+        assert repository.periods(account_id, "year", -500, rates) == \
+            [(0, 0, -900, 2), (-365, 300, -200, 2), (-731, 0, -100, 1)]
+        assert repository.period(account_id, "month", -1, rates) == (-31, 300, -200, 2)
+        assert repository.period(account_id, "year", -200, rates) == (-365, 300, -200, 2)
+        assert sorted(repository.categories(account_id, "year", -1, rates), key=lambda row: row[0] or 0) == \
+            [(None, 300, 0, 1), (1, 0, -200, 1)]
+
+    assert all(period_bounds(period, start)[0] == start
+               for period in ("month", "year") for start, *_ in repository.periods(15, period, -500))
+    db.close()
+
+
+def add_second_account(db):
+    with db:
+        db.execute("INSERT INTO account(id, name, color, currency, money, opening_money) "
+                   "VALUES (16, 'Второй', 'a1a1a1', 'RUB', 1000, 1000)")
+
+
+def ledger(db):
+    """Всё, что поддерживается триггерами: суммы на счетах, итоги по месяцам и индекс заметок"""
+    return (db.execute("SELECT id, money FROM account ORDER BY id").fetchall(),
+            db.execute("SELECT * FROM monthly_totals ORDER BY account_id, month, category_id").fetchall(),
+            db.execute("SELECT id, account_id, category_id, money, date, note FROM 'transaction' ORDER BY id")
+            .fetchall(),
+            db.execute("SELECT rowid FROM transaction_note WHERE transaction_note MATCH 'кофе' ORDER BY rowid")
+            .fetchall())
+
+
+@pytest.fixture
+def twin_databases(database_path, tmp_path):
+    """Две одинаковые базы данных: в одну изменения пишутся пачками, в другую - по одной транзакции"""
+    path = str(tmp_path / "twin.sqlite")
+    shutil.copyfile(database_path, path)
+    databases = connect(database_path), connect(path)
+    for db in databases:
+        add_second_account(db)
+    yield databases
+    for db in databases:
+        db.close()
+
+
+def sample_transactions():
+    return [Transaction(None, 15, 1, -25025, 18276, "кофе у дома"),
+            Transaction(None, 16, None, 100000, 18293, "зарплата"),
+            Transaction(None, 15, 8, -999, None, None),
+            Transaction(None, 16, 8, -1, -40, "кофе")]
+
+
+def test_bulk_calls_match_single_calls(twin_databases):
+    bulk, single = twin_databases
+    bulk_repository, single_repository = TransactionRepository(bulk), TransactionRepository(single)
+
+    # Добавление
+    with Repository(bulk).atomic():
+        added = sample_transactions()
+        ids = bulk_repository.add_many(added)
+    with Repository(single).atomic():
+        for transaction in sample_transactions():
+            single_repository.add(transaction)
+
+    assert ids == [transaction.id for transaction in added] == [1, 2, 3, 4]
+    assert ledger(bulk) == ledger(single)
+
+    # Изменение: другой счёт, категория, сумма, дата и заметка
+    def changed():
+        return [Transaction(1, 16, None, -30000, 18300, "кофе и торт"),
+                Transaction(2, 16, 8, 50000, None, None),
+                Transaction(3, 15, 1, 999, -1, "кофе")]
+
+    with Repository(bulk).atomic():
+        bulk_repository.update_many(changed())
+    with Repository(single).atomic():
+        for transaction in changed():
+            single_repository.update(transaction)
+
+    assert ledger(bulk) == ledger(single)
+
+    # Удаление
+    with Repository(bulk).atomic():
+        bulk_repository.delete_many([1, 4])
+    with Repository(single).atomic():
+        for transaction_id in (1, 4):
+            single_repository.delete(transaction_id)
+
+    assert ledger(bulk) == ledger(single)
+    assert AccountRepository(bulk).verify_balances() == []
+
+    # Итоги по месяцам совпадают с пересчитанными по истории
+    totals = ledger(bulk)[1]
+    with Repository(bulk).atomic():
+        SummaryRepository(bulk).rebuild_monthly_totals()
+    assert ledger(bulk)[1] == totals
+    assert bulk.execute("SELECT id, money FROM account ORDER BY id").fetchall() == [(15, 999), (16, 1000 + 50000)]
@@ -0,0 +1,131 @@
+import pytest
+
+from core.database import Money, TransactionFilter, TransactionRepository, connect, page_queries
+
+
+@pytest.fixture
+def db(database_path):
+    db = connect(database_path)
+    with db:
+        db.execute("INSERT INTO account(id, name, color, currency, money) VALUES (16, 'Второй', 'a1a1a1', 'RUB', 0)")
+        db.executemany("INSERT INTO 'transaction'(account_id, category_id, money, date, note) VALUES (?, ?, ?, ?, ?)",
+                       ((15, 1, -25000, 18000, "Кофе у дома"), (15, 2, -150000, 18001, "кофейня «Зёрна»"),
+                        (15, None, 500000, 18002, "зарплата"), (15, 1, -30000, None, "кофе"),
+                        (16, 1, -27000, 18003, "кофе"), (15, 3, -99, 18004, None)))
+    yield db
+    db.close()
+
+
+def matches(db, query):
+    return [row[0] for row in db.execute("SELECT rowid FROM transaction_note WHERE transaction_note MATCH ? "
+                                         "ORDER BY rowid", (query,))]
+
+
+def test_empty_filter():
+    search = TransactionFilter()
+
+    assert not search
+    assert not TransactionFilter(text="  ")
+    assert search.sql() == ("", ())
+
+
+def test_sql():
+    search = TransactionFilter(Money(100), Money(20000), 18000, 18030, {3, None}, 'кофе "дома')
+
+    assert search
+    assert search.match_query() == '"кофе"* """дома"*'
+    assert search.sql() == (
+        " AND ABS(money) >= ? AND ABS(money) <= ? AND date >= ? AND date <= ? AND (category_id IN (?) OR "
+        "category_id IS NULL) AND id IN (SELECT rowid FROM transaction_note WHERE transaction_note MATCH ?)",
+        (100, 20000, 18000, 18030, 3, '"кофе"* """дома"*'))
+
+    # Для индекса сумм условия по модулю становятся промежутком money своего знака
+    assert search.sql(1)[0].startswith(" AND money BETWEEN ? AND ? AND date >= ?")
+    assert search.sql(1)[1][:2] == (100, 20000)
+    assert search.sql(-1)[1][:2] == (-20000, -100)
+    assert TransactionFilter(money_from=Money(5)).money_bounds(-1) == (-(2 ** 63 - 1), -5)
+    assert TransactionFilter(category_ids={None}).sql() == (" AND (category_id IN () OR category_id IS NULL)", ())
+
+
+def test_note_index_follows_transactions(db):
+    assert matches(db, '"кофе"*') == [1, 2, 4, 5]
+    assert matches(db, '"кофе"') == [1, 4, 5]
+    assert matches(db, '"ЗЁРНА"') == [2]
+
+    with db:
+        db.execute("INSERT INTO 'transaction'(account_id, money, date, note) VALUES (15, -1, 18005, 'кофе с собой')")
+        db.execute("UPDATE 'transaction' SET note = 'чай' WHERE id = 1")
+        db.execute("UPDATE 'transaction' SET note = NULL WHERE id = 5")
+        db.execute("UPDATE 'transaction' SET note = 'кофе' WHERE id = 6")
+        db.execute("UPDATE 'transaction' SET money = -2 WHERE id = 4")  # заметка не меняется
+        db.execute("DELETE FROM 'transaction' WHERE id = 2")
+
+    assert matches(db, '"кофе"*') == [4, 6, 7]
+    assert matches(db, '"чай"') == [1]
+    assert matches(db, '"зёрна"') == []
+
+    # Индекс совпадает с заметками в таблице. FTS5 integrity-check здесь не подходит: транзакции без заметки в индекс
+    # не попадают, и количество строк индекса меньше, чем в таблице
+    notes = db.execute("SELECT id, note FROM 'transaction' WHERE note IS NOT NULL").fetchall()
+    for word in ("кофе", "чай", "зарплата", "дома", "собой"):
+        assert matches(db, f'"{word}"') == sorted(id for id, note in notes if word in note.lower().split())
+
+
+def pages(repository, account_id, sign, search, count=1):
+    """Вся история постранично"""
+    result = []
+    while True:
+        page = repository.page(account_id, sign, result[-1] if result else None, count, search)
+        result += page
+        if len(page) < count:
+            return [transaction.id for transaction in result]
+
+
+@pytest.mark.parametrize("limit, narrow", [(5000, True), (1, False)])
+def test_note_plan(db, monkeypatch, limit, narrow):
+    repository = TransactionRepository(db)
+    monkeypatch.setattr(repository, "NOTE_SCAN_LIMIT", limit)
+    search = TransactionFilter(text="коф")
+    queries = []
+    db.set_trace_callback(queries.append)
+
+    assert pages(repository, 15, -1, search) == [2, 1, 4]
+
+    db.set_trace_callback(None)
+    assert search.note_matches == 4
+    assert sum(query.startswith("SELECT COUNT(*) FROM transaction_note") for query in queries) == 1
+    assert any("+account_id" in query for query in queries) == narrow
+
+    # В общей истории SQLite сам выбирает индекс заметок
+    assert pages(repository, None, -1, search) == [5, 2, 1, 4]
+
+
+@pytest.mark.parametrize("limit, narrow", [(5000, True), (0, False)])
+def test_money_plan(db, monkeypatch, limit, narrow):
+    repository = TransactionRepository(db)
+    monkeypatch.setattr(repository, "MONEY_SCAN_LIMIT", limit)
+    search = TransactionFilter(money_from=Money(25000), money_to=Money(500000))
+    queries = []
+    db.set_trace_callback(queries.append)
+
+    assert pages(repository, 15, -1, search) == [2, 1, 4]
+    assert pages(repository, 15, 1, search) == [3]
+    assert pages(repository, None, -1, search) == [5, 2, 1, 4]
+
+    db.set_trace_callback(None)
+    assert search.money_matches == {-1: min(4, limit + 1), 1: min(1, limit + 1)}
+    assert sum(query.startswith("SELECT COUNT(*) FROM (SELECT 1") for query in queries) == 2
+    selects = [query for query in queries if "ORDER BY" in query]
+    assert all(("money BETWEEN" in query) == narrow for query in selects)
+    assert all(("ABS(money)" in query) != narrow for query in selects)
+
+
+def test_plan_uses_money_index(db):
+    repository = TransactionRepository(db)
+    search = TransactionFilter(money_from=Money(25000), money_to=Money(500000))
+    conditions, parameters = search.sql(-1)
+
+    plan = db.execute("EXPLAIN QUERY PLAN " + page_queries(-1, conditions, True)["first"],
+                      (15, *parameters, 10)).fetchall()
+    assert "transaction_money_account_id_index" in str(plan)
+    assert [transaction.id for transaction in repository.page(15, -1, None, 10, search)] == [2, 1, 4]
@@ -0,0 +1,73 @@
+import sqlite3
+import time
+
+from PyQt5.QtCore import QCoreApplication
+
+from core.worker import DatabaseExecutor
+
+
+def add_category(name):
+    """Запрос, который добавляет категорию и фиксирует изменения"""
+    def add(db):
+        with db:
+            db.execute("INSERT INTO category(name) VALUES (?)", (name,))
+    return add
+
+
+def slow_read(db):
+    time.sleep(0.2)
+    return db.execute("SELECT COUNT(*) FROM category").fetchone()[0]
+
+
+def categories(path):
+    db = sqlite3.connect(path)
+    try:
+        return [row[0] for row in db.execute("SELECT name FROM category WHERE id > 8 ORDER BY id")]
+    finally:
+        db.close()
+
+
+def test_close_runs_submitted_write(application, database_path):
+    executor = DatabaseExecutor(database_path)
+    executor.submit(add_category("Сохранена"))
+    executor.close()
+
+    assert categories(database_path) == ["Сохранена"]
+    assert not executor.thread.isRunning()
+    assert executor.worker.db is None
+
+
+def test_close_waits_for_queued_requests(application, database_path):
+    executor = DatabaseExecutor(database_path)
+    executor.submit(slow_read)
+    for number in range(1, 4):
+        executor.submit(add_category(f"Категория {number}"))
+    executor.close()
+
+    assert categories(database_path) == ["Категория 1", "Категория 2", "Категория 3"]
+
+
+def test_close_skips_cancelled_requests(application, database_path):
+    executor = DatabaseExecutor(database_path)
+    executor.submit(slow_read)
+    executor.submit(add_category("Устарела"), key="category")
+    executor.submit(add_category("Актуальна"), key="category")
+    executor.close()
+
+    assert categories(database_path) == ["Актуальна"]
+
+
+def test_callbacks(application, database_path):
+    results, errors = [], []
+    executor = DatabaseExecutor(database_path)
+    executor.submit(add_category("Новая"))
+    executor.submit(lambda db: db.execute("SELECT name FROM category WHERE id = 9").fetchone()[0], results.append)
+    executor.submit(add_category("Новая"), error_callback=errors.append)
+
+    deadline = time.monotonic() + 5
+    while (not results or not errors) and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+    executor.close()
+
+    assert results == ["Новая"]
+    assert [type(error) for error in errors] == [sqlite3.IntegrityError]